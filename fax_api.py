@@ -0,0 +1,393 @@
+"""팩스 문서 생성/전송 HTTP API (Streamlit 없이 실행)
+
+예약 시스템 등 다른 프로그램이 JSON으로 신고서/변경·취소 신청서를 만들고
+전송을 맡길 수 있다. 전송은 화면과 같은 전송 대기열(fax_queue)로 들어간다.
+
+    POST /render          {"kind": "report"|"fix", "data": {...}}  → 문서 ID
+    POST /send            {"kind": ..., "data": {...}, "urgent": false} → 전송 작업 번호 (false면 야간 예약)
+    GET  /jobs/<번호>     전송 작업 상태와 전달 결과
+    GET  /documents/<ID>  생성한 PDF 내려받기
+    GET  /health, /metrics
+
+요청 본문의 data (문서 생성에 쓰는 data 키와 같은 이름):
+    report  purpose, checkup_date(YYYY-MM-DD), start_time/end_time(HH:MM), location,
+            target, count, doctor_name, receiver_org
+            (일정 파일 열 이름 "검진 일시", "담당 의사", date, doctor 등도 허용)
+    fix     type(change|cancel), {date,place,target,count,items,etc}_before/_after,
+            staff_before, staff_after, cancel_reason, receiver_org
+    공통    receiver_fax(없으면 수신처로 팩스 주소록 검색), sender_fax
+본문의 다른 항목: profile, engine, filename, urgent (/send만)
+filename은 경로 없는 한글/영문/숫자/공백 _ - . ( ) 이름만 받고, .pdf가 없으면 붙인다.
+
+문서 생성은 정해진 수의 작업 스레드에서만 하고(대기 건수가 넘치면 503),
+요청마다 제한 시간을 넘기면 504로 응답한다.
+
+사용법:
+    python fax_api.py --port 8700 --workers 4
+    python fax_api.py --local-stubs     # 로컬 FTP/SOAP 대역으로 시험
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import ExitStack
+from contextvars import ContextVar, copy_context
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fax_archive import record_filing
+from fax_assets import OUTPUT_PROFILES, PROFILE_COLOR, warm_up_attachments, warm_up_fonts, warm_up_templates
+from fax_batch import DEFAULT_SENDER_FAX, parse_schedule_row
+from fax_book import lookup_fax, org_names
+from fax_documents import (
+    DOCTOR_MAP, TEMPLATE_FIX_PATH, TEMPLATE_PATH, build_document, get_attachment_paths,
+    make_fix_filename, make_report_filename, set_error_reporter, warm_up_recipient_layouts
+)
+from fax_metrics import configure_metrics_log, metric_tags, render_prometheus
+from fax_queue import STATUS_LABELS, enqueue_send, get_job, list_jobs, start_dispatcher
+from fax_store import document_path, document_size, open_document
+from fax_tracker import STATE_LABELS, get_status, start_tracker
+from fax_transport import get_secrets
+from fax_vector import COVER_ENGINES, ENGINE_RASTER
+
+logger = logging.getLogger(__name__)
+
+# --- 설정 및 상수 ---
+API_HOST = "127.0.0.1"
+API_PORT = 8700
+API_WORKERS = 4                # 동시에 문서를 만드는 작업 스레드 수
+API_MAX_PENDING = 64           # 생성 대기 최대 건수 (넘으면 503)
+API_REQUEST_TIMEOUT = 30       # 요청당 문서 생성 제한 시간(초, 넘으면 504)
+API_SOCKET_TIMEOUT = 15        # 요청을 보내다 멈춘 연결을 끊는 시간(초)
+API_MAX_BODY = 64 * 1024       # 요청 본문 최대 크기
+API_MAX_FILENAME = 100         # 요청에서 지정하는 파일명 최대 길이
+
+# 요청에서 지정하는 FTP 파일명: 경로 없이 한글/영문/숫자와 공백 _ - . ( ) 만
+SAFE_FILENAME = re.compile(r"[\w\- .()]+")
+
+# 변경/취소 신청서 항목 (변경 전/후)
+FIX_TEXT_FIELDS = ('date', 'place', 'target', 'count', 'items', 'etc')
+FIX_TYPES = {'change': 'change', '변경': 'change', '변경 신청': 'change',
+             'cancel': 'cancel', '취소': 'cancel', '취소 신청': 'cancel'}
+
+_request_errors = ContextVar("fax_api_errors", default=None)
+_executor = None
+_slots = None
+
+class ApiError(Exception):
+    """HTTP 상태 코드와 함께 JSON 오류로 응답할 예외"""
+    def __init__(self, status, message, errors=()):
+        super().__init__(message)
+        self.status = status
+        self.errors = list(errors)
+
+# --- 요청 해석 ---
+def _report_error(message):
+    # 문서 생성/병합 오류를 요청별로 모아서 응답에 포함
+    errors = _request_errors.get()
+    if errors is not None:
+        errors.append(message)
+    logger.error(message)
+
+def parse_fix_request(raw):
+    """변경/취소 신청 JSON → (신청서 data, 수신 팩스번호, 발신 팩스번호)"""
+    type_code = FIX_TYPES.get(str(raw.get('type', 'change')))
+    if type_code is None:
+        raise ValueError(f"알 수 없는 신청 구분: {raw.get('type')}")
+
+    data = {'type': type_code}
+    for field in FIX_TEXT_FIELDS:
+        data[f'{field}_before'] = str(raw.get(f'{field}_before') or "")
+        data[f'{field}_after'] = str(raw.get(f'{field}_after') or "")
+    for field in ('staff_before', 'staff_after'):
+        value = raw.get(field) or "선택안함"
+        if value not in DOCTOR_MAP:
+            raise ValueError(f"알 수 없는 수행 인력: {value}")
+        data[field] = value
+    data['cancel_reason'] = str(raw.get('cancel_reason') or "")
+    data['receiver_org'] = str(raw.get('receiver_org') or "")
+    data['issue_date'] = date.today()
+
+    receiver_fax = raw.get('receiver_fax') or lookup_fax(data['receiver_org'])
+    if not receiver_fax:
+        raise ValueError(f"수신 팩스번호를 찾을 수 없습니다: {data['receiver_org']}")
+    return data, str(receiver_fax), str(raw.get('sender_fax') or DEFAULT_SENDER_FAX)
+
+def parse_request(body):
+    """요청 JSON → (kind, data, 수신, 발신, 출력 형식, 표지 방식, 파일명)"""
+    kind = body.get('kind', 'report')
+    raw = body.get('data')
+    if not isinstance(raw, dict):
+        raise ApiError(400, "'data' 객체가 필요합니다.")
+    profile = body.get('profile', PROFILE_COLOR)
+    engine = body.get('engine', ENGINE_RASTER)
+    if profile not in OUTPUT_PROFILES or engine not in COVER_ENGINES:
+        raise ApiError(400, f"알 수 없는 출력 형식/표지 방식: {profile}/{engine}")
+
+    try:
+        if kind == 'report':
+            # 일정 파일 한 행과 같은 규칙으로 해석 (data 키와 열 이름 모두 허용)
+            data, receiver, sender = parse_schedule_row(raw)
+            filename = make_report_filename(data['target'])
+        elif kind == 'fix':
+            data, receiver, sender = parse_fix_request(raw)
+            filename = make_fix_filename(data['target_before'])
+        else:
+            raise ApiError(400, f"알 수 없는 문서 종류: {kind}")
+    except (ValueError, TypeError) as e:
+        raise ApiError(400, str(e))
+    return kind, data, receiver, sender, profile, engine, parse_filename(body.get('filename')) or filename
+
+def parse_filename(value):
+    """요청의 filename → FTP에 올릴 파일명 (없으면 None, .pdf가 없으면 붙임)"""
+    if value in (None, ""):
+        return None
+    if not isinstance(value, str):
+        raise ApiError(400, "'filename'은 문자열이어야 합니다.")
+    filename = value.strip()
+    if not filename.lower().endswith(".pdf"):
+        filename += ".pdf"
+    if (len(filename) > API_MAX_FILENAME or filename.startswith(".") or ".." in filename
+            or not SAFE_FILENAME.fullmatch(filename)):
+        raise ApiError(400, f"사용할 수 없는 파일명: {value}")
+    try:
+        filename.encode("cp949")    # 바로빌 FTP 파일명 인코딩
+    except UnicodeEncodeError:
+        raise ApiError(400, f"사용할 수 없는 파일명: {value}")
+    return filename
+
+# --- 작업 스레드 ---
+def _build(kind, data, profile, engine):
+    errors = []
+    _request_errors.set(errors)
+    with metric_tags(tab="api"):
+        doc_id = build_document(kind, data, profile, engine)
+    return doc_id, errors
+
+def render(kind, data, profile, engine, timeout=API_REQUEST_TIMEOUT):
+    """작업 스레드에서 문서 생성 → 문서 ID (대기 초과 503, 시간 초과 504, 실패 500)"""
+    if not _slots.acquire(blocking=False):
+        raise ApiError(503, "요청이 많습니다. 잠시 후 다시 시도하세요.")
+    future = _executor.submit(copy_context().run, _build, kind, data, profile, engine)
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        doc_id, errors = future.result(timeout=timeout)
+    except FutureTimeout:
+        # 생성은 계속 진행되어 보관소에 남으므로 같은 요청을 다시 보내면 바로 응답
+        raise ApiError(504, f"문서 생성이 {timeout}초 안에 끝나지 않았습니다.")
+    if doc_id is None:
+        raise ApiError(500, "문서 생성 실패", errors)
+    return doc_id
+
+def _job_summary(job):
+    summary = {**job, 'status_label': STATUS_LABELS[job['status']]}
+    if job['receipt']:
+        delivery = get_status(job['receipt'])
+        if delivery:
+            summary['delivery'] = {
+                'state': delivery['state'],
+                'state_label': STATE_LABELS[delivery['state']],
+                'result_code': delivery['result_code'],
+                'pages': delivery['pages'],
+                'updated_at': delivery['updated_at'],
+            }
+    return summary
+
+# --- HTTP ---
+class _ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"    # keep-alive (연결 재사용)
+    timeout = API_SOCKET_TIMEOUT
+    request_timeout = API_REQUEST_TIMEOUT
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorize(self):
+        token = get_secrets().get("FAX_API_TOKEN")
+        if token and self.headers.get("Authorization") != f"Bearer {token}":
+            raise ApiError(401, "인증 토큰이 올바르지 않습니다.")
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise ApiError(400, "Content-Length 값이 올바르지 않습니다.")
+        if length < 0:
+            raise ApiError(400, "Content-Length 값이 올바르지 않습니다.")
+        if length > API_MAX_BODY:
+            raise ApiError(413, "요청 본문이 너무 큽니다.")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ApiError(400, "JSON 형식 오류")
+        if not isinstance(body, dict):
+            raise ApiError(400, "JSON 객체가 필요합니다.")
+        return body
+
+    def _handle(self, method):
+        try:
+            path = self.path.split("?")[0].rstrip("/")
+            if method == "GET" and path == "/health":
+                return self._send_json(200, {'ok': True})
+            self._authorize()
+            if method == "GET":
+                self._route_get(path)
+            else:
+                self._route_post(path)
+        except ApiError as e:
+            self._send_json(e.status, {'error': str(e), 'errors': e.errors})
+        except Exception as e:
+            logger.exception("API 요청 처리 오류")
+            self._send_json(500, {'error': f"서버 오류: {e}"})
+
+    def _route_get(self, path):
+        parts = path.strip("/").split("/")
+        if path == "/metrics":
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == "/jobs":
+            self._send_json(200, {'jobs': [_job_summary(job) for job in list_jobs(limit=50)]})
+        elif len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            job = get_job(int(parts[1]))
+            if job is None:
+                raise ApiError(404, "작업을 찾을 수 없습니다.")
+            self._send_json(200, _job_summary(job))
+        elif len(parts) == 2 and parts[0] == "documents":
+            f = open_document(parts[1])
+            if f is None:
+                raise ApiError(404, "문서가 없거나 보관 시간이 지났습니다.")
+            with f:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(document_size(parts[1])))
+                self.end_headers()
+                shutil.copyfileobj(f, self.wfile)
+        else:
+            raise ApiError(404, "없는 주소입니다.")
+
+    def _route_post(self, path):
+        if path not in ("/render", "/send"):
+            raise ApiError(404, "없는 주소입니다.")
+        body = self._read_json()
+        kind, data, receiver, sender, profile, engine, filename = parse_request(body)
+        doc_id = render(kind, data, profile, engine, self.request_timeout)
+        result = {'doc_id': doc_id, 'filename': filename, 'size': document_size(doc_id),
+                  'document': f"/documents/{doc_id}"}
+        if path == "/render":
+            return self._send_json(200, result)
+
+        pdf_path = document_path(doc_id)
+        if pdf_path is None:
+            raise ApiError(500, "생성한 문서를 찾을 수 없습니다.")
+        doctor = data['doctor_name'] if kind == 'report' else data['staff_after']
+        job_id = enqueue_send(pdf_path, filename, receiver, sender, tab="api", receiver_org=data['receiver_org'],
+                              doctor=doctor, urgent=body.get('urgent', True) is not False)
+        filing_id = record_filing(kind, data, doc_id, filename, receiver, sender, profile, engine,
+                                  tab="api", job_id=job_id)
+        self._send_json(202, {**result, 'job_id': job_id, 'filing_id': filing_id, 'receiver': receiver,
+                              'job': f"/jobs/{job_id}"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+def create_api_server(host=API_HOST, port=API_PORT, workers=API_WORKERS, request_timeout=API_REQUEST_TIMEOUT):
+    """API 서버 생성 (serve_forever는 호출한 쪽에서) 및 전송 워커/결과 조회 시작"""
+    global _executor, _slots
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fax-api")
+        _slots = threading.BoundedSemaphore(API_MAX_PENDING)
+    set_error_reporter(_report_error)
+    start_dispatcher()
+    start_tracker()
+
+    handler = type("ApiHandler", (_ApiHandler,), {'request_timeout': request_timeout})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def warm_up():
+    """폰트/배경/첨부 묶음/수신처 문구 미리 로드"""
+    warm_up_fonts()
+    warm_up_templates([TEMPLATE_PATH, TEMPLATE_FIX_PATH])
+    warm_up_attachments(get_attachment_paths(name) for name in DOCTOR_MAP)
+    warm_up_recipient_layouts(org_names())
+
+def use_local_stubs(stack):
+    """로컬 FTP/SOAP 대역과 임시 폴더의 대기열/추적/기록/업로드 색인 DB 사용 (DB를 열기 전에 호출)
+
+    운영 DB를 같이 쓰면 화면의 전송 워커가 시험 작업을 실제 계정으로 보내거나,
+    반대로 이 서버가 실제 작업을 대역으로 '접수'해 버린다.
+    """
+    import tempfile
+    import fax_archive
+    import fax_queue
+    import fax_tracker
+    import fax_transport
+    from fax_bench import BENCH_FTP_PWD, BENCH_FTP_USER, local_ftp_server, local_soap_stub
+
+    data_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="fax_api_data_", ignore_cleanup_errors=True))
+    fax_queue.QUEUE_DB_PATH = os.path.join(data_dir, "fax_queue.sqlite3")
+    fax_tracker.TRACKER_DB_PATH = os.path.join(data_dir, "fax_status.sqlite3")
+    fax_archive.ARCHIVE_DB_PATH = os.path.join(data_dir, "fax_archive.sqlite3")
+    fax_transport.UPLOAD_INDEX_PATH = os.path.join(data_dir, "fax_uploads.sqlite3")
+
+    root = stack.enter_context(tempfile.TemporaryDirectory(prefix="fax_api_ftp_"))
+    ftp_host, ftp_port = stack.enter_context(local_ftp_server(root))
+    wsdl_url, _ = stack.enter_context(local_soap_stub())
+    fax_transport.set_secrets_override({
+        'BAROBILL_FTP_HOST': ftp_host, 'BAROBILL_FTP_PORT': ftp_port,
+        'BAROBILL_FTP_ID': BENCH_FTP_USER, 'BAROBILL_FTP_PWD': BENCH_FTP_PWD,
+        'BAROBILL_CERT_KEY': "LOCAL", 'BAROBILL_CORP_NUM': "0000000000", 'BAROBILL_ID': "local",
+    })
+    fax_transport.set_wsdl_override(wsdl_url)
+    print(f"로컬 대역 사용: FTP {ftp_host}:{ftp_port}, WSDL {wsdl_url}, DB {data_dir}")
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="팩스 문서 생성/전송 HTTP API")
+    parser.add_argument("--host", default=API_HOST, help="받을 주소")
+    parser.add_argument("--port", type=int, default=API_PORT, help="포트")
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="문서 생성 작업 스레드 수")
+    parser.add_argument("--timeout", type=float, default=API_REQUEST_TIMEOUT, help="요청당 문서 생성 제한 시간(초)")
+    parser.add_argument("--local-stubs", action="store_true", help="로컬 FTP/SOAP 대역으로 전송 (시험용)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    with ExitStack() as stack:
+        if args.local_stubs:
+            use_local_stubs(stack)
+        configure_metrics_log()
+        warm_up()
+
+        server = create_api_server(args.host, args.port, args.workers, args.timeout)
+        print(f"팩스 API: http://{args.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
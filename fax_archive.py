@@ -0,0 +1,400 @@
+"""전송 기록 보관 (감사용)
+
+보낸 팩스마다 PDF 대신 문서를 다시 만들 수 있는 입력값만 SQLite에 남긴다.
+(신고서/신청서 입력값, 작성일, 배경·첨부·글꼴 파일 해시, 출력 형식, 접수번호, 상태)
+문서 생성은 같은 입력이면 같은 바이트가 나오므로, 필요할 때 다시 만들어
+원본 PDF 해시(문서 ID)와 비교해 그대로인지 확인한다. 한 건에 수 KB 정도만 쓴다.
+
+대상/장소/수신처는 FTS5(trigram) 색인으로 부분 검색하고, 작성일/검진일은
+일반 색인으로 찾는다.
+
+사용법:
+    python fax_archive.py search 가나상사 --from 2026-10-01 --to 2026-10-31
+    python fax_archive.py show 123
+    python fax_archive.py regenerate 123 --out 123.pdf
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from datetime import date, datetime, time as dt_time
+from importlib.metadata import PackageNotFoundError, version
+
+# --- 설정 및 상수 ---
+ARCHIVE_DB_PATH = "fax_archive.sqlite3"
+SEARCH_LIMIT = 50
+FTS_MIN_QUERY = 3              # trigram 색인은 3글자부터, 그보다 짧으면 LIKE로 검색
+
+# 입력값 JSON에서 날짜/시간으로 되돌릴 항목
+DATE_FIELDS = ('checkup_date', 'issue_date')
+TIME_FIELDS = ('start_time', 'end_time')
+
+# 기록 상태는 전송 대기열(fax_queue)/전달 결과(fax_tracker)의 상태 값을 그대로 사용
+STATUS_QUEUED = "queued"
+
+# 문서 바이트에 영향을 주는 라이브러리
+RENDER_PACKAGES = ("pillow", "pypdf", "reportlab")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS filing_inputs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    digest TEXT NOT NULL UNIQUE,
+    inputs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS filings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    tab TEXT NOT NULL DEFAULT '',
+    target TEXT NOT NULL DEFAULT '',
+    location TEXT NOT NULL DEFAULT '',
+    receiver_org TEXT NOT NULL DEFAULT '',
+    receiver TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    checkup_date TEXT NOT NULL DEFAULT '',
+    issue_date TEXT NOT NULL,
+    data TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    inputs_id INTEGER NOT NULL REFERENCES filing_inputs (id),
+    doc_id TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    job_id INTEGER,
+    receipt TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_filings_target ON filings (target);
+CREATE INDEX IF NOT EXISTS idx_filings_issue_date ON filings (issue_date);
+CREATE INDEX IF NOT EXISTS idx_filings_checkup_date ON filings (checkup_date);
+CREATE INDEX IF NOT EXISTS idx_filings_receipt ON filings (receipt);
+CREATE INDEX IF NOT EXISTS idx_filings_job ON filings (job_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS filings_fts USING fts5(
+    target, location, receiver_org, content='filings', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS filings_fts_insert AFTER INSERT ON filings BEGIN
+    INSERT INTO filings_fts (rowid, target, location, receiver_org)
+    VALUES (new.id, new.target, new.location, new.receiver_org);
+END;
+CREATE TRIGGER IF NOT EXISTS filings_fts_delete AFTER DELETE ON filings BEGIN
+    INSERT INTO filings_fts (filings_fts, rowid, target, location, receiver_org)
+    VALUES ('delete', old.id, old.target, old.location, old.receiver_org);
+END;
+CREATE TRIGGER IF NOT EXISTS filings_fts_update AFTER UPDATE OF target, location, receiver_org ON filings BEGIN
+    INSERT INTO filings_fts (filings_fts, rowid, target, location, receiver_org)
+    VALUES ('delete', old.id, old.target, old.location, old.receiver_org);
+    INSERT INTO filings_fts (rowid, target, location, receiver_org)
+    VALUES (new.id, new.target, new.location, new.receiver_org);
+END;
+"""
+
+# 목록 조회 시 입력값 JSON은 읽지 않음
+_LIST_COLUMNS = (
+    "id, kind, tab, target, location, receiver_org, receiver, filename, checkup_date, issue_date, "
+    "profile, engine, doc_id, size, job_id, receipt, status, created_at, updated_at"
+)
+
+_init_lock = threading.Lock()
+_initialized = False
+_digest_lock = threading.Lock()
+_digests = {}        # 경로 -> (mtime, 크기, sha256)
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _connect():
+    conn = sqlite3.connect(ARCHIVE_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _ensure_db():
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        _initialized = True
+
+# --- 입력값 ---
+def _json_default(value):
+    if isinstance(value, (date, dt_time)):
+        return value.isoformat()
+    raise TypeError(f"저장할 수 없는 값: {value!r}")
+
+def encode_data(data):
+    """문서 입력값 → 짧은 JSON 문자열"""
+    return json.dumps(data, default=_json_default, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+def decode_data(text):
+    """encode_data의 반대 (날짜/시간 항목은 date/time으로)"""
+    data = json.loads(text)
+    for field in DATE_FIELDS:
+        if data.get(field):
+            data[field] = date.fromisoformat(data[field])
+    for field in TIME_FIELDS:
+        if data.get(field):
+            data[field] = dt_time.fromisoformat(data[field])
+    return data
+
+def _file_digest(path):
+    """파일 sha256 (수정 시각/크기가 같으면 다시 읽지 않음, 없으면 None)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _digest_lock:
+        entry = _digests.get(path)
+    if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+        return entry[2]
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    with _digest_lock:
+        _digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+def _package_version(name):
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return ""
+
+def collect_inputs(kind, data):
+    """문서를 다시 만들 때 같아야 하는 파일 해시와 라이브러리 버전"""
+    from fax_assets import FONT_PATH
+    from fax_documents import COVER_KINDS, get_attachment_paths
+
+    doctor = data['doctor_name'] if kind == 'report' else data['staff_after']
+    paths = (COVER_KINDS[kind][0], FONT_PATH, *get_attachment_paths(doctor))
+    return {
+        'files': {path: _file_digest(path) for path in paths},
+        'versions': {name: _package_version(name) for name in RENDER_PACKAGES},
+    }
+
+def _inputs_id(conn, inputs):
+    # 같은 배경/첨부 조합은 한 번만 저장하고 번호로 참조
+    text = json.dumps(inputs, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    conn.execute("INSERT OR IGNORE INTO filing_inputs (digest, inputs) VALUES (?, ?)", (digest, text))
+    return conn.execute("SELECT id FROM filing_inputs WHERE digest = ?", (digest,)).fetchone()[0]
+
+# --- 기록 ---
+def record_filing(kind, data, doc_id, filename, receiver, sender, profile, engine,
+                  tab="", job_id=None, receipt=None, status=STATUS_QUEUED, receiver_org=None):
+    """보낸(또는 대기열에 넣은) 문서 한 건 기록 → 기록 번호
+
+    data에 issue_date(표지 하단 작성일)가 있어야 같은 문서를 다시 만들 수 있다.
+    """
+    from fax_store import document_size
+
+    _ensure_db()
+    issue_date = data.get('issue_date') or date.today()
+    if kind == 'report':
+        target, location = data.get('target', ""), data.get('location', "")
+        checkup_date = data['checkup_date'].isoformat() if data.get('checkup_date') else ""
+    else:
+        target, location, checkup_date = data.get('target_before', ""), data.get('place_before', ""), ""
+    now = _now()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute(
+                "INSERT INTO filings (kind, tab, target, location, receiver_org, receiver, sender, filename, "
+                "checkup_date, issue_date, data, profile, engine, inputs_id, doc_id, size, job_id, receipt, status, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, tab, str(target), str(location),
+                 data.get('receiver_org', "") if receiver_org is None else receiver_org,
+                 receiver, sender, filename, checkup_date, issue_date.isoformat(),
+                 encode_data(dict(data, issue_date=issue_date)), profile, engine,
+                 _inputs_id(conn, collect_inputs(kind, data)), doc_id, document_size(doc_id) or 0,
+                 job_id, receipt, status, now, now)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.lastrowid
+    finally:
+        conn.close()
+
+def update_job_filing(job_id, status, receipt=None):
+    """전송 대기열 작업 결과 반영 (접수번호가 생겼거나 실패)"""
+    _ensure_db()
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE filings SET status = ?, receipt = COALESCE(?, receipt), updated_at = ? WHERE job_id = ?",
+            (status, receipt, _now(), job_id)
+        )
+    finally:
+        conn.close()
+
+def update_filing_states(changes):
+    """전달 결과 반영 [(접수번호, 상태), ...]"""
+    changes = list(changes)
+    if not changes:
+        return
+    _ensure_db()
+    now = _now()
+    conn = _connect()
+    try:
+        conn.executemany(
+            "UPDATE filings SET status = ?, updated_at = ? WHERE receipt = ?",
+            [(state, now, receipt) for receipt, state in changes]
+        )
+    finally:
+        conn.close()
+
+def relink_resent(receipt, status, job_id=None, new_receipt=None):
+    """다시 보낸 건은 같은 기록이 새 작업 번호/접수번호를 따라가도록 변경"""
+    _ensure_db()
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE filings SET status = ?, job_id = COALESCE(?, job_id), receipt = ?, updated_at = ? "
+            "WHERE receipt = ?",
+            (status, job_id, new_receipt, _now(), receipt)
+        )
+    finally:
+        conn.close()
+
+# --- 조회 ---
+def get_filing(filing_id):
+    """기록 한 건 (입력값 data, 입력 파일 해시 inputs 포함, 없으면 None)"""
+    _ensure_db()
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT filings.*, filing_inputs.inputs AS inputs FROM filings "
+            "JOIN filing_inputs ON filing_inputs.id = filings.inputs_id WHERE filings.id = ?",
+            (filing_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    filing = dict(row)
+    filing['data'] = decode_data(filing['data'])
+    filing['inputs'] = json.loads(filing['inputs'])
+    return filing
+
+def search_filings(query="", date_from=None, date_to=None, date_field="issue_date", limit=SEARCH_LIMIT):
+    """대상/장소/수신처 검색 + 날짜 범위 → 최근 순 기록 목록
+
+    date_field: 'issue_date'(작성일) 또는 'checkup_date'(검진일), 날짜는 date 또는 'YYYY-MM-DD'
+    """
+    if date_field not in ('issue_date', 'checkup_date'):
+        raise ValueError(f"알 수 없는 날짜 항목: {date_field}")
+    _ensure_db()
+    conditions, params = [], []
+    query = (query or "").strip()
+    if len(query) >= FTS_MIN_QUERY:
+        conditions.append("id IN (SELECT rowid FROM filings_fts WHERE filings_fts MATCH ?)")
+        params.append('"' + query.replace('"', '""') + '"')
+    elif query:
+        # 두 글자 회사명 등: 색인 대신 LIKE (대상은 앞부분 일치면 색인 사용)
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append(
+            "(target LIKE ? ESCAPE '\\' OR location LIKE ? ESCAPE '\\' OR receiver_org LIKE ? ESCAPE '\\')"
+        )
+        params += [pattern] * 3
+    if date_from:
+        conditions.append(f"{date_field} >= ?")
+        params.append(str(date_from))
+    if date_to:
+        conditions.append(f"{date_field} <= ?")
+        params.append(str(date_to))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT {_LIST_COLUMNS} FROM filings {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+# --- 다시 만들기 ---
+def changed_inputs(filing):
+    """기록 이후 내용이 바뀐 입력 파일/라이브러리 목록"""
+    changed = [path for path, digest in filing['inputs']['files'].items() if _file_digest(path) != digest]
+    changed += [f"{name} {recorded} → {_package_version(name)}"
+                for name, recorded in filing['inputs']['versions'].items() if _package_version(name) != recorded]
+    return changed
+
+def regenerate_filing(filing_id):
+    """기록된 입력값으로 문서를 다시 만들어 보관소에 저장 → (원본과 같은지, 메시지, 문서 ID)"""
+    from fax_documents import render_document
+    from fax_store import write_document
+
+    filing = get_filing(filing_id)
+    if filing is None:
+        return False, "기록을 찾을 수 없습니다.", None
+
+    doc_id = write_document(lambda output: render_document(
+        filing['kind'], filing['data'], output, filing['profile'], filing['engine']
+    ))
+    if doc_id is None:
+        return False, "문서 생성 실패", None
+    if doc_id == filing['doc_id']:
+        return True, "원본과 같은 문서를 다시 만들었습니다.", doc_id
+
+    changed = changed_inputs(filing)
+    reason = f" (바뀐 입력: {', '.join(changed)})" if changed else ""
+    return False, f"다시 만든 문서가 원본과 다릅니다{reason}", doc_id
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="팩스 전송 기록 검색/문서 다시 만들기")
+    commands = parser.add_subparsers(dest="command", required=True)
+    search = commands.add_parser("search", help="대상/장소/수신처 검색")
+    search.add_argument("query", nargs="?", default="")
+    search.add_argument("--from", dest="date_from", help="시작일 (YYYY-MM-DD)")
+    search.add_argument("--to", dest="date_to", help="종료일 (YYYY-MM-DD)")
+    search.add_argument("--checkup", action="store_true", help="작성일 대신 검진일로 날짜 범위 적용")
+    search.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    show = commands.add_parser("show", help="기록 한 건의 입력값 보기")
+    show.add_argument("id", type=int)
+    regenerate = commands.add_parser("regenerate", help="문서 다시 만들기 (원본과 같은지 확인)")
+    regenerate.add_argument("id", type=int)
+    regenerate.add_argument("--out", help="저장할 PDF 경로")
+    args = parser.parse_args(argv)
+
+    if args.command == "search":
+        rows = search_filings(args.query, args.date_from, args.date_to,
+                              "checkup_date" if args.checkup else "issue_date", args.limit)
+        for row in rows:
+            print(f"{row['id']:>6}  {row['issue_date']}  {row['target']}  {row['receiver_org']}  "
+                  f"{row['receipt'] or '-'}  {row['status']}")
+        return 0
+
+    if args.command == "show":
+        filing = get_filing(args.id)
+        if filing is None:
+            print("기록을 찾을 수 없습니다.")
+            return 1
+        print(json.dumps(filing, default=_json_default, ensure_ascii=False, indent=2))
+        return 0
+
+    ok, msg, doc_id = regenerate_filing(args.id)
+    print(msg)
+    if doc_id and args.out:
+        from fax_store import document_path
+        shutil.copyfile(document_path(doc_id), args.out)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
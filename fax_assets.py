@@ -0,0 +1,240 @@
+"""출장검진 팩스 시스템 공용 리소스 캐시
+
+Streamlit은 위젯 조작마다 streamlit_app.py를 다시 실행하므로,
+프로세스 전체에서 재사용할 리소스는 import 되는 이 모듈에 보관한다.
+"""
+import hashlib
+import os
+import threading
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageFont
+
+# --- 설정 및 상수 ---
+FONT_PATH = "NanumGothic.ttf"
+
+# 크기별 폰트 객체 캐시 상한 (실제로 쓰는 크기는 10개 남짓)
+FONT_CACHE_MAX_SIZES = 32
+
+# 배경 이미지 리사이즈 기준 크기 (A4, 150 dpi)
+PAGE_SIZE = (1240, 1754)
+
+# 출력 프로필: 컬러(기존 150 dpi RGB) / 팩스용 1비트 흑백(CCITT G4)
+PROFILE_COLOR = "color"
+PROFILE_FAX = "fax"
+OUTPUT_PROFILES = (PROFILE_COLOR, PROFILE_FAX)
+
+FAX_DPI = (204, 196)    # 팩스 표준 Fine 해상도 (가로, 세로)
+FAX_THRESHOLD = 170     # 이 밝기 미만은 검정
+FAX_RED_MARGIN = 80     # R이 G/B보다 이만큼 크면 빨간 표시로 보고 검정 처리
+
+# 시작 시 미리 로드할 크기: 본문(20), 하단 날짜(18, 22), 체크표시(22, 30), 수신처(18~26)
+WARM_UP_FONT_SIZES = (18, 19, 20, 21, 22, 23, 24, 25, 26, 30)
+
+# --- 폰트 레지스트리 ---
+_font_lock = threading.Lock()
+_font_bytes = None
+
+def _load_font_bytes():
+    """TTF 파일을 프로세스당 한 번만 읽어서 보관"""
+    global _font_bytes
+    if _font_bytes is None:
+        with _font_lock:
+            if _font_bytes is None:
+                with open(FONT_PATH, "rb") as f:
+                    _font_bytes = f.read()
+    return _font_bytes
+
+@lru_cache(maxsize=FONT_CACHE_MAX_SIZES)
+def get_font(font_size):
+    """크기별 FreeTypeFont 반환 (폰트 파일이 없으면 기본 폰트)"""
+    try:
+        return ImageFont.truetype(BytesIO(_load_font_bytes()), font_size)
+    except Exception:
+        return ImageFont.load_default()
+
+def warm_up_fonts(sizes=WARM_UP_FONT_SIZES):
+    """자주 쓰는 크기의 폰트를 미리 로드"""
+    for font_size in sizes:
+        get_font(font_size)
+
+# --- 팩스용 흑백 변환 ---
+def to_fax_bilevel(image, src_dpi=(150, 150), dither=False):
+    """페이지 이미지를 팩스 해상도의 1비트 흑백으로 변환
+
+    빨간 체크표시(V)는 안티앨리어싱된 가장자리가 밝기 기준으로는
+    흰색이 되므로, 빨간 계열 픽셀은 따로 골라 검정으로 찍는다.
+    문서는 단순 임계값이 G4 압축률이 훨씬 좋아서 기본은 dither=False.
+    """
+    rgb = image.convert("RGB")
+    r, g, b = rgb.split()
+    red_mask = ImageChops.subtract(r, ImageChops.lighter(g, b)).point(
+        lambda v: 255 if v >= FAX_RED_MARGIN else 0
+    )
+    gray = rgb.convert("L")
+    gray.paste(0, mask=red_mask)
+
+    # 1채널로 줄인 뒤 리사이즈 (RGB 리사이즈보다 3배 가까이 빠름)
+    size = (
+        max(1, round(gray.width * FAX_DPI[0] / src_dpi[0])),
+        max(1, round(gray.height * FAX_DPI[1] / src_dpi[1]))
+    )
+    if size != gray.size:
+        gray = gray.resize(size, Image.Resampling.BILINEAR)
+
+    if dither:
+        return gray.convert("1")
+    return gray.point(lambda v: 255 if v >= FAX_THRESHOLD else 0, mode="1")
+
+def save_page_pdf(image, output, profile=PROFILE_COLOR, src_dpi=(150, 150)):
+    """페이지 이미지를 PDF로 저장 (팩스 프로필이면 1비트 G4)"""
+    if profile == PROFILE_FAX:
+        to_fax_bilevel(image, src_dpi).save(output, format="PDF", dpi=FAX_DPI)
+    else:
+        image.save(output, format="PDF", resolution=float(src_dpi[0]))
+
+def _to_fax_pdf_images(writer):
+    """PDF 첨부에 들어 있는 컬러/회색 이미지를 1비트로 재압축 (픽셀 크기 유지)"""
+    for page in writer.pages:
+        for image_file in page.images:
+            try:
+                if image_file.image.mode == "1":
+                    continue
+                gray = image_file.image.convert("L")
+                image_file.replace(gray.point(lambda v: 255 if v >= FAX_THRESHOLD else 0, mode="1"))
+            except Exception:
+                # 변환할 수 없는 이미지(마스크 등)는 원본 유지
+                continue
+
+# --- 배경 템플릿 캐시 ---
+# 경로별 (mtime, 파일크기, sha256, 디코딩+리사이즈 완료 이미지)
+_template_lock = threading.Lock()
+_template_cache = {}
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _load_template(path, size):
+    """배경 이미지를 캐시에서 꺼내고, 파일이 바뀌었으면 다시 디코딩"""
+    stat = os.stat(path)
+    key = (path, size)
+    with _template_lock:
+        entry = _template_cache.get(key)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[3]
+
+        digest = _file_sha256(path)
+        if entry and entry[2] == digest:
+            # 내용은 같고 mtime만 바뀐 경우 (복사/배포 등)
+            _template_cache[key] = (stat.st_mtime_ns, stat.st_size, digest, entry[3])
+            return entry[3]
+
+        with Image.open(path) as src:
+            image = src.convert("RGB").resize(size)
+        _template_cache[key] = (stat.st_mtime_ns, stat.st_size, digest, image)
+        return image
+
+def get_template(path, size=PAGE_SIZE):
+    """그리기용 배경 이미지 사본 반환 (캐시 원본은 수정하지 않음)"""
+    return _load_template(path, size).copy()
+
+def warm_up_templates(paths, size=PAGE_SIZE):
+    """배경 이미지를 미리 디코딩 (파일이 없으면 건너뜀)"""
+    for path in paths:
+        if os.path.exists(path):
+            _load_template(path, size)
+
+# --- 첨부 파일 묶음 캐시 ---
+# (첨부 경로 묶음, 출력 프로필)별 (파일 시그니처, 미리 병합한 PDF 바이트)
+_bundle_lock = threading.Lock()
+_bundle_cache = {}
+_attachment_cache = {}    # (파일 경로, 출력 프로필) -> (파일 시그니처, 변환된 PDF 바이트)
+
+def files_signature(paths):
+    """파일별 (mtime, 크기) 묶음 (없는 파일은 None), 파일이 바뀌었는지 비교할 때 사용"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def _convert_attachment(path, profile):
+    """첨부 파일 하나를 PDF 바이트로 변환 (이미지는 PDF로, 팩스 프로필은 흑백으로)"""
+    if path.lower().endswith(".pdf"):
+        if profile != PROFILE_FAX:
+            with open(path, "rb") as f:
+                return f.read()
+        from pypdf import PdfWriter
+
+        writer = PdfWriter(clone_from=path)
+        _to_fax_pdf_images(writer)
+    else:
+        img_pdf_buffer = BytesIO()
+        with Image.open(path) as img:
+            if profile == PROFILE_FAX:
+                save_page_pdf(img, img_pdf_buffer, profile, src_dpi=img.info.get("dpi", (72, 72)))
+            else:
+                img.convert("RGB").save(img_pdf_buffer, format="PDF")
+        return img_pdf_buffer.getvalue()
+
+    output_buffer = BytesIO()
+    writer.write(output_buffer)
+    return output_buffer.getvalue()
+
+def _attachment_pdf(path, profile):
+    """파일별 변환 결과 캐시 (여러 의사 묶음이 같은 첨부를 공유)"""
+    signature = files_signature([path])
+    key = (path, profile)
+    entry = _attachment_cache.get(key)
+    if entry and entry[0] == signature:
+        return entry[1]
+    pdf_bytes = _convert_attachment(path, profile)
+    _attachment_cache[key] = (signature, pdf_bytes)
+    return pdf_bytes
+
+def _compile_attachments(paths, profile):
+    """첨부 파일(PDF/이미지)을 순서대로 하나의 PDF로 병합"""
+    # pypdf는 처음 병합할 때 불러옴 (화면 시작 속도)
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        writer.append(PdfReader(BytesIO(_attachment_pdf(path, profile))))
+
+    if not writer.pages:
+        return None
+    output_buffer = BytesIO()
+    writer.write(output_buffer)
+    return output_buffer.getvalue()
+
+def get_attachment_bundle(paths, profile=PROFILE_COLOR):
+    """첨부 묶음 PDF 바이트 반환 (첨부가 하나도 없으면 None)
+
+    파일이 추가/수정/삭제되면 다음 호출 시 다시 병합한다.
+    """
+    paths = tuple(paths)
+    signature = files_signature(paths)
+    key = (paths, profile)
+    with _bundle_lock:
+        entry = _bundle_cache.get(key)
+        if entry and entry[0] == signature:
+            return entry[1]
+        bundle = _compile_attachments(paths, profile)
+        _bundle_cache[key] = (signature, bundle)
+        return bundle
+
+def warm_up_attachments(path_groups, profiles=OUTPUT_PROFILES):
+    """첨부 묶음을 미리 병합"""
+    for paths in path_groups:
+        for profile in profiles:
+            get_attachment_bundle(paths, profile)
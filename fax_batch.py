@@ -0,0 +1,346 @@
+"""출장검진 신고서 일괄 생성/전송
+
+일정 파일(CSV/Excel)의 한 행이 한 건의 출장검진 신고서가 된다.
+표지는 프로세스 풀에서 병렬로 생성하고 첨부 묶음과 병합한다.
+전송은 전송 대기열(fax_queue)에 등록하며, CLI는 등록한 작업이 끝날 때까지 기다린다.
+
+사용법:
+    python fax_batch.py 일정.csv --workers 4 --out-dir batch_out
+    python fax_batch.py 일정.xlsx --profile fax --send
+    python fax_batch.py 일정.xlsx --send --off-peak    # 야간 예약 전송
+    python fax_batch.py 일정.csv --compare-profiles
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time as dt_time
+from io import BytesIO, StringIO
+
+from fax_archive import record_filing
+from fax_assets import (
+    OUTPUT_PROFILES, PROFILE_COLOR, warm_up_attachments, warm_up_fonts, warm_up_templates
+)
+from fax_book import lookup_fax, org_names
+from fax_documents import (
+    DOCTOR_MAP, PURPOSE_OPTIONS, TEMPLATE_PATH, compare_output_profiles,
+    get_attachment_paths, make_report_filename, render_document,
+    set_error_reporter, warm_up_recipient_layouts
+)
+from fax_queue import STATUS_DONE, STATUS_FAILED, STATUS_LABELS, enqueue_send, get_job, process_jobs
+from fax_store import document_path, document_size, write_document
+from fax_vector import COVER_ENGINES, ENGINE_RASTER
+
+DEFAULT_SENDER_FAX = "031-987-7777"
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# 일정 파일 열 이름 (한글/영문 모두 허용, API 요청의 data 키와 같은 이름도 허용)
+SCHEDULE_COLUMNS = {
+    'purpose': ("검진 목적", "purpose"),
+    'checkup_date': ("검진 일시", "검진일", "date", "checkup_date"),
+    'start_time': ("시작 시간", "start_time"),
+    'end_time': ("종료 시간", "end_time"),
+    'location': ("장소", "location"),
+    'target': ("대상", "target"),
+    'count': ("인원 수", "인원", "count"),
+    'doctor_name': ("담당 의사", "doctor", "doctor_name"),
+    'receiver_org': ("수신처", "수신처(보건소)", "receiver_org"),
+}
+OPTIONAL_COLUMNS = {
+    'receiver_fax': ("수신 팩스번호", "receiver_fax"),
+    'sender_fax': ("발신 팩스번호", "sender_fax"),
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y.%m.%d", "%Y/%m/%d", "%Y%m%d")
+TIME_FORMATS = ("%H:%M", "%H:%M:%S")
+
+# --- 일정 파일 읽기 ---
+def _read_csv_rows(raw):
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = raw.decode("cp949")  # 한글 Excel에서 저장한 CSV
+    return list(csv.DictReader(StringIO(text)))
+
+def _read_excel_rows(raw):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Excel 일정 파일을 읽으려면 openpyxl 패키지가 필요합니다.")
+
+    sheet = load_workbook(BytesIO(raw), read_only=True, data_only=True).active
+    rows = sheet.iter_rows(values_only=True)
+    header = [str(h).strip() if h is not None else "" for h in next(rows, [])]
+    return [
+        dict(zip(header, values)) for values in rows
+        if any(v not in (None, "") for v in values)
+    ]
+
+def load_schedule(source, filename=None):
+    """일정 파일을 행(dict) 목록으로 읽기 (source: 경로 또는 파일 객체)"""
+    if isinstance(source, (str, os.PathLike)):
+        filename = filename or os.fspath(source)
+        with open(source, "rb") as f:
+            raw = f.read()
+    else:
+        raw = source.read()
+
+    if (filename or "").lower().endswith((".xlsx", ".xlsm")):
+        return _read_excel_rows(raw)
+    return _read_csv_rows(raw)
+
+def _pick(raw_row, names):
+    for name in names:
+        value = raw_row.get(name)
+        if value not in (None, ""):
+            return value.strip() if isinstance(value, str) else value
+    return None
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value), fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"날짜 형식 오류: {value}")
+
+def _parse_time(value):
+    if isinstance(value, datetime):
+        return value.time()
+    if isinstance(value, dt_time):
+        return value
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(str(value), fmt).time()
+        except ValueError:
+            pass
+    raise ValueError(f"시간 형식 오류: {value}")
+
+def parse_schedule_row(raw_row):
+    """일정 한 행 → (신고서 data, 수신 팩스번호, 발신 팩스번호)"""
+    values = {}
+    for key, names in SCHEDULE_COLUMNS.items():
+        value = _pick(raw_row, names)
+        if value is None:
+            raise ValueError(f"'{names[0]}' 값이 없습니다.")
+        values[key] = value
+
+    if values['purpose'] not in PURPOSE_OPTIONS:
+        raise ValueError(f"알 수 없는 검진 목적: {values['purpose']}")
+    if values['doctor_name'] not in DOCTOR_MAP:
+        raise ValueError(f"알 수 없는 담당 의사: {values['doctor_name']}")
+
+    data = {
+        'purpose': values['purpose'],
+        'checkup_date': _parse_date(values['checkup_date']),
+        'start_time': _parse_time(values['start_time']),
+        'end_time': _parse_time(values['end_time']),
+        'location': str(values['location']),
+        'target': str(values['target']),
+        'count': int(float(values['count'])),
+        'doctor_name': values['doctor_name'],
+        'receiver_org': str(values['receiver_org']),
+        'issue_date': date.today()
+    }
+
+    receiver_fax = _pick(raw_row, OPTIONAL_COLUMNS['receiver_fax']) or (lookup_fax(data['receiver_org']) or "")
+    if not receiver_fax:
+        raise ValueError(f"수신 팩스번호를 찾을 수 없습니다: {data['receiver_org']}")
+    sender_fax = _pick(raw_row, OPTIONAL_COLUMNS['sender_fax']) or DEFAULT_SENDER_FAX
+    return data, str(receiver_fax), str(sender_fax)
+
+def build_jobs(raw_rows):
+    """일정 행 목록 → 작업 목록 (행 오류는 작업의 error에 기록)"""
+    jobs = []
+    used_names = set()
+    for row_no, raw_row in enumerate(raw_rows, start=1):
+        job = {'row': row_no, 'data': None, 'receiver': "", 'sender': "",
+               'filename': "", 'doc_id': None, 'size': 0, 'error': "", 'result': "",
+               'job_id': None, 'job_status': ""}
+        try:
+            job['data'], job['receiver'], job['sender'] = parse_schedule_row(raw_row)
+        except (ValueError, TypeError) as e:
+            job['error'] = str(e)
+            jobs.append(job)
+            continue
+
+        # 같은 날 같은 업체가 여러 건이면 FTP에서 덮어쓰지 않도록 번호를 붙임
+        filename = make_report_filename(job['data']['target'])
+        stem, suffix = os.path.splitext(filename)
+        seq = 2
+        while filename in used_names:
+            filename = f"{stem}_{seq}{suffix}"
+            seq += 1
+        used_names.add(filename)
+        job['filename'] = filename
+        jobs.append(job)
+    return jobs
+
+# --- 병렬 생성 ---
+def _init_worker(profile):
+    """워커 프로세스 시작 시 폰트/배경/첨부 묶음/수신처 문구 미리 로드"""
+    warm_up_fonts()
+    warm_up_templates([TEMPLATE_PATH])
+    warm_up_attachments((get_attachment_paths(name) for name in DOCTOR_MAP), profiles=(profile,))
+    warm_up_recipient_layouts(org_names())
+
+def _render_job(data, profile, engine):
+    """워커에서 생성한 PDF는 보관소에 바로 저장하고 문서 ID만 돌려보냄"""
+    errors = []
+    set_error_reporter(errors.append)
+    doc_id = write_document(lambda output: render_document('report', data, output, profile, engine))
+    return doc_id, document_size(doc_id) or 0, "; ".join(errors)
+
+def render_jobs(jobs, workers=DEFAULT_WORKERS, profile=PROFILE_COLOR, engine=ENGINE_RASTER):
+    """작업 목록의 신고서를 병렬 생성, 처리량 통계 반환"""
+    pending = [job for job in jobs if job['data'] and not job['error']]
+    started = time.perf_counter()
+    if pending:
+        # Streamlit 서버 프로세스에서 fork 하지 않도록 spawn 사용
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(profile,)) as pool:
+            results = pool.map(
+                _render_job, [job['data'] for job in pending],
+                [profile] * len(pending), [engine] * len(pending)
+            )
+            for job, (doc_id, size, error) in zip(pending, results):
+                job['doc_id'], job['size'] = doc_id, size
+                job['profile'], job['engine'] = profile, engine
+                job['error'] = error or ("" if doc_id else "문서 생성 실패")
+    elapsed = time.perf_counter() - started
+
+    rendered = sum(1 for job in pending if job['doc_id'])
+    return {
+        'workers': workers,
+        'rendered': rendered,
+        'seconds': elapsed,
+        'docs_per_second': rendered / elapsed if elapsed > 0 else 0.0
+    }
+
+# --- 전송 ---
+def send_jobs(jobs, urgent=True):
+    """생성된 신고서를 한 건씩 전송 대기열에 등록
+
+    업로드, 재시도, 같은 수신처로 가는 건의 간격(예약 전송)은 대기열이 다른 화면/API에서
+    넣은 작업과 합쳐서 조절한다. urgent가 False면 모두 야간 예약 전송.
+    """
+    for job in jobs:
+        if not job['doc_id'] or job['job_id']:
+            continue
+        pdf_path = document_path(job['doc_id'])
+        if pdf_path is None:
+            job['error'] = "보관 시간이 지나 문서가 삭제되었습니다. 다시 생성하세요."
+            continue
+        job['job_id'] = enqueue_send(pdf_path, job['filename'], job['receiver'], job['sender'], tab="tab3",
+                                     receiver_org=job['data']['receiver_org'], doctor=job['data']['doctor_name'],
+                                     urgent=urgent)
+        record_filing('report', job['data'], job['doc_id'], job['filename'], job['receiver'], job['sender'],
+                      job['profile'], job['engine'], tab="tab3", job_id=job['job_id'])
+        job['result'] = f"대기열 등록 (작업 #{job['job_id']})"
+
+def sync_job_results(jobs):
+    """대기열 작업 상태를 작업 목록에 반영 → 아직 끝나지 않은 작업 수"""
+    pending = 0
+    for job in jobs:
+        if not job['job_id']:
+            continue
+        queued = get_job(job['job_id'])
+        if queued is None:
+            continue
+        job['job_status'] = queued['status']
+        if queued['status'] == STATUS_FAILED:
+            job['error'] = queued['message']
+        elif queued['status'] == STATUS_DONE:
+            job['result'] = queued['message']
+        else:
+            job['result'] = queued['message'] or job['result']
+            pending += 1
+    return pending
+
+def wait_for_jobs(jobs):
+    """CLI: 이번에 등록한 작업만 이 프로세스에서 처리하고 모두 끝나면 결과 반영
+
+    다른 화면/API의 작업은 가져가지 않으므로 CLI가 끝날 때 처리 중인 작업을 남기지 않는다.
+    """
+    process_jobs([job['job_id'] for job in jobs if job['job_id']])
+    sync_job_results(jobs)
+
+def job_table(jobs):
+    """결과 표 (행 단위)"""
+    table = []
+    for job in jobs:
+        data = job['data'] or {}
+        if job['error']:
+            status = "실패"
+        elif job['job_status']:
+            status = STATUS_LABELS[job['job_status']]
+        elif job['result']:
+            status = "전송"
+        else:
+            status = "생성" if job['doc_id'] else "대기"
+        table.append({
+            '행': job['row'],
+            '대상': data.get('target', ""),
+            '검진일': data['checkup_date'].strftime("%Y-%m-%d") if data else "",
+            '수신처': data.get('receiver_org', ""),
+            '수신 팩스번호': job['receiver'],
+            '파일명': job['filename'],
+            '크기(KB)': round(job['size'] / 1024, 1) if job['doc_id'] else None,
+            '상태': status,
+            '메시지': job['error'] or job['result']
+        })
+    return table
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="출장검진 신고서 일괄 생성/전송")
+    parser.add_argument("schedule", help="일정 파일 (.csv / .xlsx)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="생성 워커 프로세스 수")
+    parser.add_argument("--out-dir", help="생성된 PDF를 저장할 폴더")
+    parser.add_argument("--profile", choices=OUTPUT_PROFILES, default=PROFILE_COLOR, help="출력 형식")
+    parser.add_argument("--engine", choices=COVER_ENGINES, default=ENGINE_RASTER, help="표지 생성 방식")
+    parser.add_argument("--send", action="store_true", help="생성 후 바로빌로 팩스 전송")
+    parser.add_argument("--off-peak", action="store_true", help="급하지 않은 건: 야간 시간대로 예약 전송")
+    parser.add_argument("--compare-profiles", action="store_true",
+                        help="첫 번째 정상 행으로 컬러/팩스 프로필 크기·시간 비교만 출력")
+    args = parser.parse_args(argv)
+
+    jobs = build_jobs(load_schedule(args.schedule))
+
+    if args.compare_profiles:
+        sample = next((job for job in jobs if job['data']), None)
+        if sample is None:
+            print("비교할 정상 행이 없습니다.")
+            return 1
+        for row in compare_output_profiles(sample['data']):
+            print("  ".join(f"{key}={value}" for key, value in row.items()))
+        return 0
+
+    stats = render_jobs(jobs, workers=args.workers, profile=args.profile, engine=args.engine)
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        for job in jobs:
+            if job['doc_id']:
+                shutil.copyfile(document_path(job['doc_id']), os.path.join(args.out_dir, job['filename']))
+
+    if args.send:
+        send_jobs(jobs, urgent=not args.off_peak)
+        wait_for_jobs(jobs)
+
+    for row in job_table(jobs):
+        print(f"{row['행']:>3}  {row['상태']}  {row['대상']}  {row['수신처']}  {row['파일명']}  {row['메시지']}")
+    print(f"생성 {stats['rendered']}/{len(jobs)}건, {stats['seconds']:.2f}초 "
+          f"({stats['docs_per_second']:.2f}건/초, workers={stats['workers']})")
+    return 0 if all(not job['error'] for job in jobs) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,510 @@
+"""생성 → 병합 → FTP 업로드 → 전송 요청 단계별 성능 측정
+
+FTP는 로컬 FTP 서버(pyftpdlib), 바로빌 API는 SendFaxFromFTP/GetFaxSendStates만
+흉내 내는 로컬 SOAP 대역을 띄워서 측정하므로 실제 팩스는 나가지 않는다.
+단계별 지연 백분위수, 최대 메모리, 출력 크기를 출력하고, 저장해 둔
+기준 결과와 비교할 수 있다.
+
+사용법:
+    python fax_bench.py --iterations 30 --save bench_baseline.json
+    python fax_bench.py --profile fax --compare bench_baseline.json
+"""
+import argparse
+import json
+import logging
+import re
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, time as dt_time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fax_assets import OUTPUT_PROFILES, PROFILE_COLOR, warm_up_attachments, warm_up_fonts, warm_up_templates
+from fax_documents import (
+    TEMPLATE_FIX_PATH, TEMPLATE_PATH, create_fix_pdf, create_report_pdf,
+    get_attachment_paths, merge_documents_fix, merge_documents_report, render_document
+)
+from fax_scheduler import SEND_BURST, SEND_RATE, set_send_rate
+from fax_tracker import BAROBILL_BUSY_RESULTS, BAROBILL_PENDING_STATES, BAROBILL_SUCCESS_RESULTS
+from fax_transport import (
+    close_ftp_sessions, reset_barobill_client, send_fax_from_ftp_real,
+    set_secrets_override, set_wsdl_override, upload_file_to_ftp
+)
+from fax_vector import COVER_ENGINES, ENGINE_RASTER
+
+# --- 설정 및 상수 ---
+DEFAULT_ITERATIONS = 20
+DEFAULT_WARMUP = 2
+DEFAULT_THRESHOLD = 10.0     # 기준 대비 이 비율(%) 이상 느려지면 표시
+PERCENTILES = (50, 90, 95, 99)
+
+BENCH_FTP_USER = "bench"
+BENCH_FTP_PWD = "bench"
+BENCH_RECEIVER = "031-000-0000"
+BENCH_SENDER = "031-987-7777"
+
+SAMPLE_REPORT = {
+    'purpose': "출장 일반검진+특수검진",
+    'checkup_date': date(2026, 3, 2),
+    'start_time': dt_time(7, 30), 'end_time': dt_time(12, 0),
+    'location': "경기도 김포시 대곶면 대명항로 123",
+    'target': "가나상사", 'count': 50, 'doctor_name': "김우진",
+    'receiver_org': "김포시 보건소"
+}
+
+SAMPLE_FIX = {
+    'type': 'change',
+    'date_before': "2026-03-02 07:30", 'date_after': "2026-03-09 07:30",
+    'place_before': "가나상사 본사", 'place_after': "가나상사 2공장",
+    'target_before': "가나상사", 'target_after': "가나상사",
+    'count_before': "50", 'count_after': "60",
+    'staff_before': "김우진", 'staff_after': "최윤범",
+    'items_before': "일반검진", 'items_after': "일반검진+특수검진",
+    'etc_before': "", 'etc_after': "",
+    'cancel_reason': "",
+    'receiver_org': "김포시 보건소"
+}
+
+# --- 로컬 FTP 서버 ---
+@contextmanager
+def local_ftp_server(root):
+    """업로드만 받는 로컬 FTP 서버 → (호스트, 포트)"""
+    try:
+        from pyftpdlib.authorizers import DummyAuthorizer
+        from pyftpdlib.handlers import FTPHandler
+        from pyftpdlib.servers import ThreadedFTPServer
+    except ImportError:
+        raise SystemExit("로컬 FTP 서버에 pyftpdlib가 필요합니다: pip install pyftpdlib")
+
+    # 핸들러가 없으면 pyftpdlib가 자체 로그 출력을 켜므로 미리 막아 둠
+    ftp_logger = logging.getLogger("pyftpdlib")
+    ftp_logger.setLevel(logging.WARNING)
+    ftp_logger.addHandler(logging.NullHandler())
+    authorizer = DummyAuthorizer()
+    authorizer.add_user(BENCH_FTP_USER, BENCH_FTP_PWD, root, perm="elradfmw")
+
+    # 바로빌 FTP처럼 한글 파일명을 CP949로 주고받음
+    handler = type("BenchFTPHandler", (FTPHandler,), {'authorizer': authorizer, 'encoding': "cp949"})
+    server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={'timeout': 0.5, 'handle_exit': False},
+        name="bench-ftp", daemon=True
+    )
+    thread.start()
+    try:
+        yield server.address[:2]
+    finally:
+        close_ftp_sessions()
+        server.close_all()
+
+# --- 로컬 SOAP 대역 ---
+# 바로빌 FAX.asmx 중 SendFaxFromFTP, GetFaxSendStates만 흉내 냄
+_WSDL_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:s="http://www.w3.org/2001/XMLSchema"
+    xmlns:tns="http://ws.baroservice.com/"
+    targetNamespace="http://ws.baroservice.com/">
+  <wsdl:types>
+    <s:schema elementFormDefault="qualified" targetNamespace="http://ws.baroservice.com/">
+      <s:complexType name="ArrayOfString"><s:sequence>
+        <s:element minOccurs="0" maxOccurs="unbounded" name="string" nillable="true" type="s:string"/>
+      </s:sequence></s:complexType>
+      <s:complexType name="FaxMessage"><s:sequence>
+        <s:element minOccurs="0" maxOccurs="1" name="SendKey" type="s:string"/>
+        <s:element minOccurs="1" maxOccurs="1" name="SendState" type="s:int"/>
+        <s:element minOccurs="0" maxOccurs="1" name="SendResult" type="s:string"/>
+        <s:element minOccurs="1" maxOccurs="1" name="TotalPageCount" type="s:int"/>
+        <s:element minOccurs="1" maxOccurs="1" name="SuccessPageCount" type="s:int"/>
+      </s:sequence></s:complexType>
+      <s:complexType name="ArrayOfFaxMessage"><s:sequence>
+        <s:element minOccurs="0" maxOccurs="unbounded" name="FaxMessage" nillable="true" type="tns:FaxMessage"/>
+      </s:sequence></s:complexType>
+      {elements}
+    </s:schema>
+  </wsdl:types>
+  {messages}
+  <wsdl:portType name="BaroService_FAXSoap">{port_operations}
+  </wsdl:portType>
+  <wsdl:binding name="BaroService_FAXSoap" type="tns:BaroService_FAXSoap">
+    <soap:binding transport="http://schemas.xmlsoap.org/soap/http"/>{binding_operations}
+  </wsdl:binding>
+  <wsdl:service name="BaroService_FAX">
+    <wsdl:port name="BaroService_FAXSoap" binding="tns:BaroService_FAXSoap">
+      <soap:address location="{address}"/>
+    </wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>
+"""
+
+# 작업명 -> (입력 (이름, 형식) 목록, 결과 형식)
+_OPERATIONS = {
+    "SendFaxFromFTP": (
+        [(name, "s:string") for name in (
+            "CERTKEY", "CorpNum", "SenderID", "FileName", "FromNumber", "ToNumber",
+            "ReceiveCorp", "ReceiveName", "SendDT", "RefKey"
+        )],
+        "s:string"
+    ),
+    "GetFaxSendStates": (
+        [("CERTKEY", "s:string"), ("CorpNum", "s:string"), ("ID", "s:string"), ("SendKeyList", "tns:ArrayOfString")],
+        "tns:ArrayOfFaxMessage"
+    ),
+}
+
+_RESPONSE_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <{operation}Response xmlns="http://ws.baroservice.com/">
+      <{operation}Result>{result}</{operation}Result>
+    </{operation}Response>
+  </soap:Body>
+</soap:Envelope>
+"""
+
+def _build_wsdl(address):
+    elements, messages, port_operations, binding_operations = [], [], [], []
+    for operation, (params, result_type) in _OPERATIONS.items():
+        inputs = "".join(
+            f'<s:element minOccurs="0" maxOccurs="1" name="{name}" type="{param_type}"/>' for name, param_type in params
+        )
+        elements.append(
+            f'<s:element name="{operation}"><s:complexType><s:sequence>{inputs}</s:sequence></s:complexType></s:element>'
+            f'<s:element name="{operation}Response"><s:complexType><s:sequence>'
+            f'<s:element minOccurs="0" maxOccurs="1" name="{operation}Result" type="{result_type}"/>'
+            f'</s:sequence></s:complexType></s:element>'
+        )
+        messages.append(
+            f'<wsdl:message name="{operation}SoapIn"><wsdl:part name="parameters" element="tns:{operation}"/></wsdl:message>'
+            f'<wsdl:message name="{operation}SoapOut"><wsdl:part name="parameters" element="tns:{operation}Response"/></wsdl:message>'
+        )
+        port_operations.append(
+            f'\n    <wsdl:operation name="{operation}"><wsdl:input message="tns:{operation}SoapIn"/>'
+            f'<wsdl:output message="tns:{operation}SoapOut"/></wsdl:operation>'
+        )
+        binding_operations.append(
+            f'\n    <wsdl:operation name="{operation}">'
+            f'<soap:operation soapAction="http://ws.baroservice.com/{operation}" style="document"/>'
+            f'<wsdl:input><soap:body use="literal"/></wsdl:input><wsdl:output><soap:body use="literal"/></wsdl:output>'
+            f'</wsdl:operation>'
+        )
+    return _WSDL_TEMPLATE.format(
+        elements="\n      ".join(elements), messages="\n  ".join(messages),
+        port_operations="".join(port_operations), binding_operations="".join(binding_operations),
+        address=address
+    )
+
+def stub_fax_outcome(receipt, polls):
+    """대역이 돌려줄 전달 결과 → (SendState, SendResult)
+
+    첫 조회는 전송 중, 이후 접수번호 끝자리 기준으로 5의 배수는 통화 중,
+    7의 배수는 코드표에 없는 결과(확인 불가), 나머지는 성공.
+    """
+    if polls <= 1:
+        return BAROBILL_PENDING_STATES[-1], ""
+    number = int(receipt)
+    if number % 5 == 0:
+        return 3, BAROBILL_BUSY_RESULTS[0]
+    if number % 7 == 0:
+        return 3, "999"
+    return 3, BAROBILL_SUCCESS_RESULTS[0]
+
+class _SoapStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"    # keep-alive (실제 클라이언트의 연결 재사용과 같게)
+    disable_nagle_algorithm = True   # 헤더/본문 분할 전송 시 지연 ACK로 40ms씩 늘어나는 것 방지
+
+    def _reply(self, body, content_type):
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        address = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}/FAX.asmx"
+        self._reply(_build_wsdl(address), "text/xml; charset=utf-8")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        operation = self.headers.get("SOAPAction", "").strip('"').rsplit("/", 1)[-1]
+        with self.server.lock:
+            if operation == "GetFaxSendStates":
+                items = []
+                for receipt in re.findall(r"<(?:\w+:)?string>([^<]*)</", body):
+                    polls = self.server.polls[receipt] = self.server.polls.get(receipt, 0) + 1
+                    send_state, send_result = stub_fax_outcome(receipt, polls)
+                    items.append(
+                        f"<FaxMessage><SendKey>{receipt}</SendKey><SendState>{send_state}</SendState>"
+                        f"<SendResult>{send_result}</SendResult><TotalPageCount>4</TotalPageCount>"
+                        f"<SuccessPageCount>{4 if send_result in BAROBILL_SUCCESS_RESULTS else 0}</SuccessPageCount>"
+                        f"</FaxMessage>"
+                    )
+                result = "".join(items)
+            else:
+                operation = "SendFaxFromFTP"
+                self.server.receipt += 1
+                result = self.server.receipt
+            self.server.calls[operation] = self.server.calls.get(operation, 0) + 1
+        self._reply(_RESPONSE_TEMPLATE.format(operation=operation, result=result), "text/xml; charset=utf-8")
+
+    def log_message(self, format, *args):
+        pass
+
+@contextmanager
+def local_soap_stub(delay=0.0):
+    """바로빌 팩스 API 일부만 응답하는 로컬 SOAP 서버 → (WSDL 주소, 서버)
+
+    delay: 바로빌 응답 지연을 흉내 낼 대기 시간(초)
+    서버의 calls에 작업별 호출 수가 쌓인다.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SoapStubHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.lock = threading.Lock()
+    server.receipt = 202600000000
+    server.polls = {}
+    server.calls = {}
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={'poll_interval': 0.5}, name="bench-soap", daemon=True
+    )
+    thread.start()
+    try:
+        yield f"http://{server.server_address[0]}:{server.server_address[1]}/FAX.asmx?WSDL", server
+    finally:
+        reset_barobill_client()
+        server.shutdown()
+        server.server_close()
+
+# --- 측정 ---
+def _percentile(sorted_values, pct):
+    """선형 보간 백분위수"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+def _max_rss_kb():
+    # 리눅스는 KB 단위 (macOS는 바이트)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measure_stage(func, iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP):
+    """단계 하나를 반복 실행해서 지연/메모리/출력 크기 측정
+
+    func(i)는 출력 바이트(없으면 None)를 반환하고, 실패하면 예외를 낸다.
+    최대 메모리는 tracemalloc으로 따로 한 번 더 실행해서 잰다 (Pillow 픽셀
+    버퍼처럼 파이썬 할당자를 거치지 않는 메모리는 RSS 증가분으로만 드러남).
+    """
+    for i in range(warmup):
+        func(-1 - i)
+
+    rss_before = _max_rss_kb()
+    latencies = []
+    output_bytes = 0
+    for i in range(iterations):
+        start = time.perf_counter()
+        output = func(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if output:
+            output_bytes = len(output)
+    rss_growth = _max_rss_kb() - rss_before
+
+    tracemalloc.start()
+    try:
+        func(iterations)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    result = {
+        'iterations': iterations,
+        'mean_ms': sum(latencies) / len(latencies),
+        'max_ms': latencies[-1],
+        'peak_kb': peak / 1024,
+        'rss_growth_kb': rss_growth,
+        'output_kb': output_bytes / 1024,
+    }
+    for pct in PERCENTILES:
+        result[f'p{pct}_ms'] = _percentile(latencies, pct)
+    return result
+
+def _check(value, message):
+    if not value:
+        raise RuntimeError(message)
+    return value
+
+def build_stages(profile=PROFILE_COLOR, engine=ENGINE_RASTER):
+    """측정할 (단계 이름, 함수) 목록"""
+    report = dict(SAMPLE_REPORT)
+    fix = dict(SAMPLE_FIX)
+    cover = _check(create_report_pdf(report, profile, engine), "신고서 표지 생성 실패")
+    fix_cover = _check(create_fix_pdf(fix, profile, engine), "변경/취소 신청서 표지 생성 실패")
+    merged = _check(merge_documents_report(cover, report['doctor_name'], profile), "신고서 병합 실패")
+
+    def upload(i, pdf_bytes=merged):
+        # 같은 내용을 반복해서 올리므로 중복 업로드 생략 없이 실제 전송 시간을 잼
+        ok, msg, _ = upload_file_to_ftp(pdf_bytes, f"벤치_{i:+05d}.pdf", dedup=False)
+        _check(ok, msg)
+        return pdf_bytes
+
+    def send(i):
+        ok, msg = send_fax_from_ftp_real(f"벤치_{i:+05d}.pdf", BENCH_RECEIVER, BENCH_SENDER)
+        _check(ok, msg)
+
+    def end_to_end(i):
+        # 매번 인원 수를 바꿔서 같은 표지를 재사용하지 않게 함
+        data = dict(report, count=report['count'] + i)
+        pdf_bytes = _check(create_report_pdf(data, profile, engine), "신고서 표지 생성 실패")
+        pdf_bytes = _check(merge_documents_report(pdf_bytes, data['doctor_name'], profile), "신고서 병합 실패")
+        upload(i, pdf_bytes)
+        send(i)
+        return pdf_bytes
+
+    def end_to_end_streamed(i):
+        # 운영 경로와 같이 병합본을 임시 파일에 바로 쓰고 파일에서 바로 업로드
+        data = dict(report, count=report['count'] + i)
+        with tempfile.TemporaryFile() as f:
+            _check(render_document('report', data, f, profile, engine), "신고서 생성 실패")
+            ok, msg, _ = upload_file_to_ftp(f, f"벤치_{i:+05d}.pdf", dedup=False)
+            _check(ok, msg)
+        send(i)
+
+    return [
+        ("create_report_pdf", lambda i: _check(create_report_pdf(report, profile, engine), "신고서 표지 생성 실패")),
+        ("create_fix_pdf", lambda i: _check(create_fix_pdf(fix, profile, engine), "변경/취소 신청서 표지 생성 실패")),
+        ("merge_documents_report", lambda i: merge_documents_report(cover, report['doctor_name'], profile)),
+        ("merge_documents_fix", lambda i: merge_documents_fix(fix_cover, fix['staff_after'], profile)),
+        ("upload_file_to_ftp", upload),
+        ("send_fax_from_ftp_real", send),
+        ("end_to_end", end_to_end),
+        ("end_to_end_streamed", end_to_end_streamed),
+    ]
+
+def run_benchmark(profile=PROFILE_COLOR, engine=ENGINE_RASTER, iterations=DEFAULT_ITERATIONS,
+                  warmup=DEFAULT_WARMUP, soap_delay=0.0, stages=None):
+    """로컬 FTP/SOAP 대역을 띄우고 단계별 측정 → 결과 딕셔너리"""
+    warm_up_fonts()
+    warm_up_templates([TEMPLATE_PATH, TEMPLATE_FIX_PATH])
+    warm_up_attachments(
+        [get_attachment_paths(SAMPLE_REPORT['doctor_name']), get_attachment_paths(SAMPLE_FIX['staff_after'])],
+        profiles=(profile,)
+    )
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="fax_bench_") as root, \
+            local_ftp_server(root) as (host, port), \
+            local_soap_stub(soap_delay) as (wsdl_url, _):
+        set_secrets_override({
+            'BAROBILL_FTP_HOST': host, 'BAROBILL_FTP_PORT': port,
+            'BAROBILL_FTP_ID': BENCH_FTP_USER, 'BAROBILL_FTP_PWD': BENCH_FTP_PWD,
+            'BAROBILL_CERT_KEY': "BENCH", 'BAROBILL_CORP_NUM': "0000000000", 'BAROBILL_ID': "bench",
+        })
+        set_wsdl_override(wsdl_url)
+        # 전송 요청 속도 제한은 끄고 전송 경로 자체만 측정
+        set_send_rate(None)
+        try:
+            for name, func in build_stages(profile, engine):
+                if stages and name not in stages:
+                    continue
+                results[name] = measure_stage(func, iterations, warmup)
+        finally:
+            set_send_rate(SEND_RATE, SEND_BURST)
+            set_wsdl_override(None)
+            set_secrets_override(None)
+
+    return {
+        'profile': profile,
+        'engine': engine,
+        'iterations': iterations,
+        'soap_delay_ms': soap_delay * 1000,
+        'max_rss_kb': _max_rss_kb(),
+        'stages': results,
+    }
+
+# --- 기준 결과 비교 ---
+def compare_with_baseline(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """단계별 기준 대비 변화율(%) 목록 → (행 목록, 느려진 단계 이름 목록)"""
+    rows = []
+    regressions = []
+    for name, stats in current['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if not base:
+            continue
+        row = {'단계': name}
+        for key in ('p50_ms', 'p95_ms', 'peak_kb', 'output_kb'):
+            row[key] = (stats[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+        if row['p50_ms'] > threshold or row['p95_ms'] > threshold:
+            regressions.append(name)
+        rows.append(row)
+    return rows, regressions
+
+def format_results(result):
+    lines = [
+        f"프로필={result['profile']}  엔진={result['engine']}  반복={result['iterations']}  "
+        f"SOAP 지연={result['soap_delay_ms']:.0f}ms  최대 RSS={result['max_rss_kb'] / 1024:.1f}MB",
+        f"{'단계':<24}" + "".join(f"{f'p{pct}(ms)':>10}" for pct in PERCENTILES)
+        + f"{'최대(ms)':>10}{'메모리(KB)':>12}{'RSS+(KB)':>10}{'출력(KB)':>10}",
+    ]
+    for name, stats in result['stages'].items():
+        lines.append(
+            f"{name:<24}" + "".join(f"{stats[f'p{pct}_ms']:>10.1f}" for pct in PERCENTILES)
+            + f"{stats['max_ms']:>10.1f}{stats['peak_kb']:>12.0f}{stats['rss_growth_kb']:>10}{stats['output_kb']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+def format_comparison(rows, regressions):
+    lines = [f"{'단계':<24}{'p50':>9}{'p95':>9}{'메모리':>9}{'출력':>9}"]
+    for row in rows:
+        mark = "  ← 느려짐" if row['단계'] in regressions else ""
+        lines.append(
+            f"{row['단계']:<24}" + "".join(f"{row[key]:>+8.1f}%" for key in ('p50_ms', 'p95_ms', 'peak_kb', 'output_kb'))
+            + mark
+        )
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="팩스 문서 생성/전송 단계별 성능 측정 (로컬 FTP/SOAP 대역 사용)")
+    parser.add_argument("--profile", choices=OUTPUT_PROFILES, default=PROFILE_COLOR, help="출력 형식")
+    parser.add_argument("--engine", choices=COVER_ENGINES, default=ENGINE_RASTER, help="표지 생성 방식")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="단계별 반복 횟수")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="측정 전 예열 횟수")
+    parser.add_argument("--soap-delay", type=float, default=0.0, help="SOAP 대역 응답 지연(ms)")
+    parser.add_argument("--stage", action="append", help="이 단계만 측정 (여러 번 지정 가능)")
+    parser.add_argument("--save", help="결과를 기준 파일(JSON)로 저장")
+    parser.add_argument("--compare", help="기준 파일(JSON)과 비교")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="느려짐으로 표시할 p50/p95 증가율(%%)")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(
+        profile=args.profile, engine=args.engine, iterations=args.iterations,
+        warmup=args.warmup, soap_delay=args.soap_delay / 1000, stages=args.stage
+    )
+    print(format_results(result))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"기준 결과 저장: {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline.get('profile'), baseline.get('engine')) != (result['profile'], result['engine']):
+            print(f"주의: 기준 파일은 프로필={baseline.get('profile')} 엔진={baseline.get('engine')} 결과입니다.")
+        rows, regressions = compare_with_baseline(result, baseline, args.threshold)
+        print(f"\n기준 대비 변화 ({args.compare})")
+        print(format_comparison(rows, regressions))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
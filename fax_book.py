@@ -0,0 +1,207 @@
+"""수신처(보건소) 팩스 주소록
+
+주소록은 코드가 아니라 파일(CSV 또는 SQLite)에 두고, 프로세스당 한 번 읽어
+검색 색인과 함께 메모리에 보관한다. 파일이 바뀌면 다음 조회 때 다시 읽는다.
+검색은 앞부분 일치, 부분 일치, 초성(ㄱㅍㅅ → 김포시) 모두 지원한다.
+"""
+import csv
+import logging
+import os
+import sqlite3
+import threading
+import time
+from io import StringIO
+
+logger = logging.getLogger(__name__)
+
+# --- 설정 및 상수 ---
+FAX_BOOK_PATH = "fax_book.csv"     # CSV(기관명, 팩스번호) 또는 SQLite(.sqlite3/.db, fax_book 테이블)
+FAX_BOOK_CHECK_INTERVAL = 5        # 파일 변경 확인 최소 간격(초)
+SEARCH_LIMIT = 50                  # 검색 결과 최대 개수
+
+DIRECT_INPUT = "직접 입력"
+
+# CSV 열 이름 (한글/영문 모두 허용)
+ORG_COLUMNS = ("기관명", "수신처", "org")
+FAX_COLUMNS = ("팩스번호", "fax")
+
+SQLITE_EXTENSIONS = (".sqlite3", ".sqlite", ".db")
+
+# 한글 초성 (유니코드 음절 순서)
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+_HANGUL_FIRST, _HANGUL_LAST = 0xAC00, 0xD7A3
+_SYLLABLES_PER_CHOSEONG = 21 * 28
+
+_lock = threading.Lock()
+_book = None          # 현재 주소록과 검색 색인 (_build_book 결과)
+_checked_at = 0.0
+
+# --- 검색 키 ---
+def normalize(text):
+    """검색용 키: 공백 제거 + 소문자"""
+    return "".join(str(text).split()).lower()
+
+def to_choseong(text):
+    """한글 음절을 초성으로 바꾼 검색 키 (김포시 → ㄱㅍㅅ, 한글 외 글자는 그대로)"""
+    chars = []
+    for char in normalize(text):
+        code = ord(char)
+        if _HANGUL_FIRST <= code <= _HANGUL_LAST:
+            chars.append(CHOSEONG[(code - _HANGUL_FIRST) // _SYLLABLES_PER_CHOSEONG])
+        else:
+            chars.append(char)
+    return "".join(chars)
+
+def _is_choseong_query(query):
+    return all(char in CHOSEONG for char in query)
+
+def _grams(key):
+    """한 글자/두 글자 조각 (부분 일치 색인용)"""
+    return set(key) | {key[i:i + 2] for i in range(len(key) - 1)}
+
+# --- 파일 읽기 ---
+def _pick(row, names):
+    for name in names:
+        value = row.get(name)
+        if value:
+            return value.strip()
+    return ""
+
+def _read_csv(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = raw.decode("cp949")  # 한글 Excel에서 저장한 CSV
+    return [(_pick(row, ORG_COLUMNS), _pick(row, FAX_COLUMNS)) for row in csv.DictReader(StringIO(text))]
+
+def _read_sqlite(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT org, fax FROM fax_book ORDER BY rowid").fetchall()
+    finally:
+        conn.close()
+    return [((org or "").strip(), (fax or "").strip()) for org, fax in rows]
+
+def read_entries(path=FAX_BOOK_PATH):
+    """주소록 파일 → [(기관명, 팩스번호), ...] (파일 순서 유지, 이름이 같으면 나중 것 사용)"""
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        entries = _read_sqlite(path)
+    else:
+        entries = _read_csv(path)
+    book = {}
+    for org, fax in entries:
+        if org and org != DIRECT_INPUT:
+            book[org] = fax
+    return list(book.items())
+
+# --- 색인 ---
+def _build_book(entries, signature):
+    names = [org for org, _ in entries]
+    keys = [normalize(org) for org in names]
+    choseong_keys = [to_choseong(org) for org in names]
+
+    # 조각 -> 해당 조각이 들어 있는 수신처 번호 집합
+    index = {}
+    choseong_index = {}
+    for i, (key, choseong_key) in enumerate(zip(keys, choseong_keys)):
+        for gram in _grams(key):
+            index.setdefault(gram, set()).add(i)
+        for gram in _grams(choseong_key):
+            choseong_index.setdefault(gram, set()).add(i)
+
+    return {
+        'signature': signature,
+        'fax': {DIRECT_INPUT: "", **dict(entries)},
+        'names': (DIRECT_INPUT, *names),
+        'dialable': tuple(org for org, fax in entries if fax),
+        'list': names,
+        'keys': keys,
+        'choseong_keys': choseong_keys,
+        'index': index,
+        'choseong_index': choseong_index,
+    }
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _current_book():
+    """현재 주소록 (파일이 바뀌었으면 다시 읽음, 확인은 FAX_BOOK_CHECK_INTERVAL마다)"""
+    global _book, _checked_at
+    book = _book
+    if book is not None and time.monotonic() - _checked_at < FAX_BOOK_CHECK_INTERVAL:
+        return book
+
+    with _lock:
+        if _book is not None and time.monotonic() - _checked_at < FAX_BOOK_CHECK_INTERVAL:
+            return _book
+        signature = _file_signature(FAX_BOOK_PATH)
+        if _book is None or signature != _book['signature']:
+            try:
+                entries = read_entries(FAX_BOOK_PATH) if signature else []
+            except Exception:
+                # 편집 중인 파일 등 읽기 실패: 기존 주소록 유지
+                logger.exception("주소록 읽기 오류: %s", FAX_BOOK_PATH)
+                if _book is None:
+                    _book = _build_book([], None)
+            else:
+                _book = _build_book(entries, signature)
+        _checked_at = time.monotonic()
+        return _book
+
+def reload_fax_book():
+    """변경 확인 간격과 관계없이 주소록 파일을 다시 확인"""
+    global _checked_at
+    _checked_at = 0.0
+    return _current_book()
+
+# --- 조회 ---
+def get_fax_book():
+    """{기관명: 팩스번호} ('직접 입력' 포함, 읽기 전용으로 사용)"""
+    return _current_book()['fax']
+
+def org_names(dialable_only=False):
+    """수신처 이름 목록 (기본은 '직접 입력'이 맨 앞, dialable_only면 팩스번호가 있는 곳만)"""
+    book = _current_book()
+    return book['dialable'] if dialable_only else book['names']
+
+def lookup_fax(org_name):
+    """수신처의 팩스번호 (주소록에 없으면 None)"""
+    return _current_book()['fax'].get(org_name)
+
+def search_orgs(query, limit=SEARCH_LIMIT):
+    """이름/초성 검색 → 수신처 이름 목록
+
+    순서: 전체 일치 → 앞부분 일치 → 부분 일치 (같은 순위면 일치 위치가 앞인 것, 주소록 순서)
+    """
+    book = _current_book()
+    query = normalize(query)
+    if not query:
+        return list(book['list'][:limit])
+
+    if _is_choseong_query(query):
+        keys, index = book['choseong_keys'], book['choseong_index']
+    else:
+        keys, index = book['keys'], book['index']
+
+    # 검색어의 모든 조각이 들어 있는 수신처만 후보로 좁힌 뒤 확인
+    postings = [index.get(gram) for gram in _grams(query)]
+    if not all(postings):
+        return []
+    postings.sort(key=len)
+    candidates = postings[0].intersection(*postings[1:])
+
+    ranked = []
+    for i in candidates:
+        position = keys[i].find(query)
+        if position < 0:
+            continue
+        rank = 0 if keys[i] == query else 1 if position == 0 else 2
+        ranked.append((rank, position, i))
+    ranked.sort()
+    return [book['list'][i] for _, _, i in ranked[:limit]]
@@ -0,0 +1,67 @@
+"""여러 보건소 동시 발송
+
+수신처마다 표지의 보건소장 문구만 다르므로 첨부 묶음은 한 번만 만들고(캐시),
+표지 문구가 같은 수신처끼리는 문서 한 부를 같이 쓴다. 수신처마다 전송 대기열
+(fax_queue)에 작업을 넣으므로 화면을 닫아도 전송은 계속되고, 같은 문서는 한 번만
+업로드되며, 팩스번호가 같은 수신처는 대기열이 간격을 두고 예약 전송한다.
+"""
+import os
+
+from fax_archive import record_filing
+from fax_assets import PROFILE_COLOR
+from fax_documents import build_document, format_recipient_title
+from fax_queue import enqueue_send
+from fax_store import document_path
+from fax_vector import ENGINE_RASTER
+
+def plan_broadcast(recipients, filename):
+    """수신처 [(기관명, 팩스번호), ...]를 표지 문구별로 묶음
+
+    → [{'title', 'org', 'filename', 'recipients'}, ...] (문구가 같으면 같은 문서 사용)
+    """
+    groups = {}
+    for org, receiver in recipients:
+        title = format_recipient_title(org)
+        if title not in groups:
+            groups[title] = {'title': title, 'org': org, 'recipients': []}
+        groups[title]['recipients'].append((org, receiver))
+
+    groups = list(groups.values())
+    stem, ext = os.path.splitext(filename)
+    for i, group in enumerate(groups, 1):
+        group['filename'] = filename if len(groups) == 1 else f"{stem}_{i:02d}{ext}"
+    return groups
+
+def build_broadcast(kind, data, recipients, filename, profile=PROFILE_COLOR, engine=ENGINE_RASTER):
+    """표지 문구별 최종 PDF 생성 → 묶음마다 문서 ID (실패한 묶음은 doc_id가 None)
+
+    묶음에는 전송 기록에 남길 입력값(kind, data, profile, engine)도 같이 담는다.
+    """
+    groups = plan_broadcast(recipients, filename)
+    for group in groups:
+        group.update(kind=kind, data=dict(data, receiver_org=group['org']), profile=profile, engine=engine)
+        group['doc_id'] = build_document(kind, group['data'], profile, engine)
+    return groups
+
+def send_broadcast(groups, sender, tab="", urgent=True):
+    """수신처마다 전송 대기열에 작업 등록 (문서를 만들지 못한 묶음은 건너뜀)
+
+    → 수신처 순서대로 [{'org', 'receiver', 'filename', 'job_id', 'message'}, ...]
+    같은 문서는 업로드 색인으로 한 번만 올라가고, 재시도와 수신번호별 간격/동시 전송 수는
+    대기열이 맡는다. 진행 상황은 작업 번호로 조회한다 (fax_queue.get_job).
+    """
+    results = []
+    for group in groups:
+        pdf_path = document_path(group['doc_id'])
+        doctor = group['data']['doctor_name'] if group['kind'] == 'report' else group['data']['staff_after']
+        for org, receiver in group['recipients']:
+            result = {'org': org, 'receiver': receiver, 'filename': group['filename'], 'job_id': None,
+                      'message': "문서 생성 실패"}
+            if pdf_path:
+                result['job_id'] = enqueue_send(pdf_path, group['filename'], receiver, sender, tab=tab,
+                                                receiver_org=org, doctor=doctor, urgent=urgent)
+                result['message'] = ""
+                record_filing(group['kind'], group['data'], group['doc_id'], group['filename'], receiver, sender,
+                              group['profile'], group['engine'], tab=tab, job_id=result['job_id'], receiver_org=org)
+            results.append(result)
+    return results
@@ -0,0 +1,521 @@
+"""출장검진 신고서 / 변경·취소 신청서 문서 생성 및 병합
+
+Streamlit 화면, 일괄 생성(fax_batch) 등에서 공통으로 사용한다.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+from itertools import islice, product
+from datetime import datetime
+
+from PIL import Image, ImageDraw, features
+
+from fax_assets import (
+    FONT_PATH, PROFILE_COLOR, PROFILE_FAX, files_signature, get_attachment_bundle, get_font,
+    get_template, save_page_pdf
+)
+from fax_metrics import metric_tags, span
+from fax_store import document_path, write_document
+from fax_vector import ENGINE_RASTER, ENGINE_VECTOR, stamp_cover
+
+logger = logging.getLogger(__name__)
+
+# --- 설정 및 상수 ---
+TEMPLATE_PATH = "background-001.png"             # 건강검진 신고서 배경
+TEMPLATE_FIX_PATH = "background_fix001-001.png"  # 변경/취소 신청서 배경
+
+# 배경 이미지에 고정 인쇄된 '김포시 보건소장 귀하'를 지우고
+# 선택된 수신처명을 입력할 영역(이미지 리사이즈 후 1240 x 1754 기준)
+REPORT_RECIPIENT_CLEAR_BOX = (115, 1190, 700, 1229)
+REPORT_RECIPIENT_TEXT_POS = (130, 1191)
+FIX_RECIPIENT_CLEAR_BOX = (115, 1510, 800, 1553)
+FIX_RECIPIENT_TEXT_POS = (250, 1512)
+RECIPIENT_FONT_SIZE = 26
+RECIPIENT_MIN_FONT_SIZE = 18
+RECIPIENT_LAYOUT_CACHE_SIZE = 256   # 직접 입력한 수신처 문구 배치 캐시 개수
+RECIPIENT_WARM_UP_LIMIT = 64        # 미리 계산할 주소록 수신처 수 (주소록 앞쪽부터, 나머지는 LRU 캐시)
+
+# 고정 첨부 파일
+FILE_LICENSE = "개설허가증.pdf"
+FILE_SPECIAL_CERT = "특수의료기관지정서.jpg"
+
+# 의사별 면허증 매칭
+DOCTOR_MAP = {
+    "선택안함": None,
+    "김우진": "김우진.pdf",
+    "최윤범": "최윤범.pdf",
+    "안형숙": "안형숙.pdf"
+}
+
+# 미리보기 (화면 표시용 축소 이미지)
+PREVIEW_WIDTH = 620
+PREVIEW_FORMAT = "WEBP" if features.check("webp") else "PNG"
+PREVIEW_CACHE_SIZE = 64
+DOCUMENT_CACHE_SIZE = 256  # 최근 병합한 최종 PDF의 문서 ID 보관 개수 (PDF 자체는 fax_store에 보관)
+
+# 검진 목적 선택지 (체크박스 자동 표시 기준)
+PURPOSE_OPTIONS = [
+    "출장 일반검진+특수검진",
+    "출장 일반검진",
+    "출장 특수검진",
+    "보건예방사업검진(초음파,골밀도,맥파,심전도)"
+]
+
+# --- 오류 보고 ---
+# 기본은 로그 기록, Streamlit 화면에서는 st.error로 교체해서 사용
+_error_reporter = logger.error
+
+def set_error_reporter(reporter):
+    """문서 생성/병합 오류 메시지를 받을 함수 지정"""
+    global _error_reporter
+    _error_reporter = reporter
+
+def report_error(message):
+    _error_reporter(message)
+
+def format_recipient_title(org_name):
+    """선택된 수신처를 'OO 보건소장 귀하' 형식으로 변환"""
+    if not org_name or org_name == "직접 입력":
+        return "보건소장 귀하"
+
+    org_name = str(org_name).strip()
+    if org_name.endswith("보건소"):
+        return f"{org_name}장 귀하"
+    return f"{org_name} 보건소장 귀하"
+
+def fit_recipient_font_size(title, clear_box, text_position):
+    """수신처 문구가 지울 영역 안에 들어가는 가장 큰 글자 크기"""
+    max_width = clear_box[2] - text_position[0] - 10
+    for font_size in range(RECIPIENT_FONT_SIZE, RECIPIENT_MIN_FONT_SIZE - 1, -1):
+        text_box = get_font(font_size).getbbox(title)
+        if text_box[2] - text_box[0] <= max_width:
+            return font_size
+    return RECIPIENT_MIN_FONT_SIZE
+
+# --- 수신처 문구 배치 캐시 ---
+# (문구, 지울 영역, 위치) -> (글자 크기, 흰 바탕에 문구를 그려 둔 띠 이미지, 영역을 넘으면 None)
+# 주소록 수신처는 시작 시 미리 계산해 두고, 직접 입력한 수신처는 LRU로 보관
+_recipient_lock = threading.Lock()
+_recipient_layouts = {}
+_recipient_recent = OrderedDict()
+
+_document_lock = threading.Lock()
+_document_cache = OrderedDict()
+
+def _build_recipient_layout(title, clear_box, text_position):
+    font_size = fit_recipient_font_size(title, clear_box, text_position)
+    left, top, right, bottom = get_font(font_size).getbbox(title)
+    if (text_position[0] + left < clear_box[0] or text_position[1] + top < clear_box[1]
+            or text_position[0] + right > clear_box[2] + 1 or text_position[1] + bottom > clear_box[3] + 1):
+        # 가장 작은 글자로도 영역을 넘는 긴 문구는 띠에 다 담기지 않음 (직접 그림)
+        return font_size, None
+    strip = Image.new("RGB", (clear_box[2] - clear_box[0] + 1, clear_box[3] - clear_box[1] + 1), "white")
+    ImageDraw.Draw(strip).text(
+        (text_position[0] - clear_box[0], text_position[1] - clear_box[1]),
+        title, fill="black", font=get_font(font_size)
+    )
+    return font_size, strip
+
+def get_recipient_layout(title, clear_box, text_position):
+    """수신처 문구의 글자 크기와 붙여 넣을 띠 이미지 (캐시)"""
+    key = (title, tuple(clear_box), tuple(text_position))
+    layout = _recipient_layouts.get(key)
+    if layout:
+        return layout
+
+    with _recipient_lock:
+        layout = _recipient_recent.get(key)
+        if layout:
+            _recipient_recent.move_to_end(key)
+            return layout
+
+    layout = _build_recipient_layout(*key)
+    with _recipient_lock:
+        _recipient_recent[key] = layout
+        while len(_recipient_recent) > RECIPIENT_LAYOUT_CACHE_SIZE:
+            _recipient_recent.popitem(last=False)
+    return layout
+
+def warm_up_recipient_layouts(org_names):
+    """주소록 수신처의 문구 배치를 두 양식 모두 미리 계산
+
+    전국 주소록처럼 수신처가 많으면 띠 이미지 메모리가 커지므로 앞쪽
+    RECIPIENT_WARM_UP_LIMIT곳만 계산한다.
+    """
+    boxes = (
+        (REPORT_RECIPIENT_CLEAR_BOX, REPORT_RECIPIENT_TEXT_POS),
+        (FIX_RECIPIENT_CLEAR_BOX, FIX_RECIPIENT_TEXT_POS)
+    )
+    for org_name in islice(org_names, RECIPIENT_WARM_UP_LIMIT):
+        title = format_recipient_title(org_name)
+        for clear_box, text_position in boxes:
+            key = (title, clear_box, text_position)
+            if key not in _recipient_layouts:
+                _recipient_layouts[key] = _build_recipient_layout(*key)
+
+def draw_recipient_title(draw, org_name, clear_box, text_position):
+    """배경의 기존 수신처 문구를 지우고 선택된 수신처명을 입력"""
+    title = format_recipient_title(org_name)
+    draw.rectangle(clear_box, fill="white")
+
+    font_size, _ = get_recipient_layout(title, clear_box, text_position)
+    draw.text(text_position, title, fill="black", font=get_font(font_size))
+
+def paste_recipient_title(image, org_name, clear_box, text_position):
+    """draw_recipient_title과 같은 결과를 미리 그려 둔 띠 이미지로 붙여 넣기
+
+    문구가 지울 영역을 넘으면 띠로는 잘리므로 draw_recipient_title로 직접 그린다.
+    """
+    _, strip = get_recipient_layout(format_recipient_title(org_name), clear_box, text_position)
+    if strip is None:
+        draw_recipient_title(ImageDraw.Draw(image), org_name, clear_box, text_position)
+        return
+    image.paste(strip, clear_box[:2])
+
+def add_text_to_image(draw, text, position, font_size=20, color="black"):
+    if not text: return
+    font = get_font(font_size)
+    draw.text(position, str(text), fill=color, font=font)
+
+def report_fields(data):
+    """(탭1) 표지에 넣을 글자 목록 [(글자, 위치, 크기, 색), ...]"""
+    fields = []
+    def add(text, position, font_size=20, color="black"):
+        if text: fields.append((str(text), position, font_size, color))
+
+    # 1. 목적 (일시 바로 위)
+    add(data['purpose'], (320, 455))
+
+    # 2. 일시/시간/장소/대상/인원/의사
+    target_date_str = data['checkup_date'].strftime("%Y년 %m월 %d일")
+    add(target_date_str, (320, 490))
+    time_str = f"{data['start_time'].strftime('%H:%M')} ~ {data['end_time'].strftime('%H:%M')}"
+    add(time_str, (320, 530))
+    add(data['location'], (750, 490))
+    add(data['target'], (320, 565))
+    add(f"{data['count']}명", (930, 565))
+    add(data['doctor_name'], (620, 755))
+
+    # 3. 체크박스 자동화
+    purpose = data['purpose']
+    check_national = False
+    check_other = False
+
+    if purpose == "출장 일반검진":
+        check_national = True
+    elif purpose == "출장 일반검진+특수검진":
+        check_national = True
+        check_other = True
+    else: # 특수검진 or 보건예방
+        check_other = True
+
+    if check_national:
+        add("V", (252, 665), font_size=22, color="red")
+    if check_other:
+        add("V", (252, 695), font_size=22, color="red")
+
+    # 4. 하단 날짜 (유태전 서명 위), 작성일이 정해져 있으면 그 날짜 (전송 기록에서 다시 만들 때)
+    today = data.get('issue_date') or datetime.now()
+    add(str(today.year), (870, 1032), font_size=18)
+    add(str(today.month), (980, 1032), font_size=18)
+    add(str(today.day), (1070, 1032), font_size=18)
+    return fields
+
+def fix_fields(data):
+    """(탭2) 신청서에 넣을 글자 목록 [(글자, 위치, 크기, 색), ...]"""
+    fields = []
+    def add(text, position, font_size=20, color="black"):
+        if text: fields.append((str(text), position, font_size, color))
+
+    # [체크박스] - 위치 수정하려면 여기 좌표를 변경하세요
+    if data['type'] == 'change':
+        add("V", (685, 165), font_size=30, color="red")
+    else:
+        add("V", (685, 218), font_size=30, color="red")
+
+    # [테이블 행 좌표]
+    rows_y = {
+        'date': 700,
+        'place': 775,
+        'target': 845,
+        'count': 905,
+        'staff': 970,
+        'items': 1050,
+        'etc': 1120
+    }
+
+    col_before_x = 400
+    col_after_x = 850
+
+    # 일반 항목 입력
+    items = ['date', 'place', 'target', 'count', 'items', 'etc']
+    for item in items:
+        y_pos = rows_y[item]
+        add(data.get(f'{item}_before', ''), (col_before_x, y_pos))
+        add(data.get(f'{item}_after', ''), (col_after_x, y_pos))
+
+    # 수행 인력 (Staff)
+    staff_y = rows_y['staff']
+    if data['staff_before'] and data['staff_before'] != "선택안함":
+        add(data['staff_before'], (col_before_x, staff_y))
+
+    if data['staff_after'] and data['staff_after'] != "선택안함":
+        add(data['staff_after'], (col_after_x, staff_y))
+
+    # 취소 사유
+    if data['type'] == 'cancel':
+        add(data['cancel_reason'], (300, 1260))
+
+    # [하단 날짜]
+    today = data.get('issue_date') or datetime.now()
+    add(str(today.year), (870, 1430), font_size=22)
+    add(str(today.month), (990, 1430), font_size=22)
+    add(str(today.day), (1060, 1430), font_size=22)
+    return fields
+
+def _draw_cover_image(template_path, org_name, clear_box, text_position, fields):
+    image = get_template(template_path)
+
+    # 선택된 수신처 보건소장 문구 적용
+    paste_recipient_title(image, org_name, clear_box, text_position)
+    draw = ImageDraw.Draw(image)
+    for text, position, font_size, color in fields:
+        add_text_to_image(draw, text, position, font_size, color)
+    return image
+
+def _render_cover(output, template_path, org_name, clear_box, text_position, fields, profile, engine):
+    """표지 PDF를 output 스트림에 기록"""
+    with span("render_cover", org=org_name, profile=profile, engine=engine) as record:
+        start = output.tell()
+        if engine == ENGINE_VECTOR:
+            title = format_recipient_title(org_name)
+            font_size, _ = get_recipient_layout(title, clear_box, text_position)
+            stamp_cover(template_path, (title, clear_box, text_position, font_size), fields, profile, output)
+        else:
+            image = _draw_cover_image(template_path, org_name, clear_box, text_position, fields)
+            save_page_pdf(image, output, profile)
+        record['bytes'] = output.tell() - start
+
+def create_report_pdf(data, profile=PROFILE_COLOR, engine=ENGINE_RASTER):
+    """(탭1) 건강검진 신고서 생성"""
+    try:
+        pdf_buffer = BytesIO()
+        _render_cover(
+            pdf_buffer,
+            TEMPLATE_PATH,
+            data.get('receiver_org', ''),
+            REPORT_RECIPIENT_CLEAR_BOX,
+            REPORT_RECIPIENT_TEXT_POS,
+            report_fields(data),
+            profile,
+            engine
+        )
+        return pdf_buffer.getvalue()
+    except Exception as e:
+        report_error(f"신고서 표지 생성 오류: {e}")
+        return None
+
+def create_fix_pdf(data, profile=PROFILE_COLOR, engine=ENGINE_RASTER):
+    """(탭2) 변경/취소 신청서 생성"""
+    try:
+        pdf_buffer = BytesIO()
+        _render_cover(
+            pdf_buffer,
+            TEMPLATE_FIX_PATH,
+            data.get('receiver_org', ''),
+            FIX_RECIPIENT_CLEAR_BOX,
+            FIX_RECIPIENT_TEXT_POS,
+            fix_fields(data),
+            profile,
+            engine
+        )
+        return pdf_buffer.getvalue()
+    except Exception as e:
+        report_error(f"변경신청서 생성 오류: {e}")
+        return None
+
+# --- 미리보기 / 최종 문서 ---
+# 양식별 (배경, 수신처 지울 영역, 수신처 위치, 글자 목록 함수)
+COVER_KINDS = {
+    'report': (TEMPLATE_PATH, REPORT_RECIPIENT_CLEAR_BOX, REPORT_RECIPIENT_TEXT_POS, report_fields),
+    'fix': (TEMPLATE_FIX_PATH, FIX_RECIPIENT_CLEAR_BOX, FIX_RECIPIENT_TEXT_POS, fix_fields)
+}
+
+# 양식별 (표지 생성 오류, 병합 오류) 메시지
+DOCUMENT_ERRORS = {
+    'report': ("신고서 표지 생성 오류", "문서 병합 오류"),
+    'fix': ("변경신청서 생성 오류", "문서 병합 오류(변경신청)")
+}
+
+@lru_cache(maxsize=PREVIEW_CACHE_SIZE)
+def _cover_preview(template_path, template_mtime, org_name, clear_box, text_position, fields):
+    # 캐시에 없을 때만 실행되므로 실제로 그린 경우만 계측됨
+    with span("preview", org=org_name) as record:
+        image = _draw_cover_image(template_path, org_name, clear_box, text_position, fields)
+        image.thumbnail((PREVIEW_WIDTH, image.height))
+        preview_buffer = BytesIO()
+        image.save(preview_buffer, format=PREVIEW_FORMAT)
+        record['bytes'] = preview_buffer.tell()
+    return preview_buffer.getvalue()
+
+def create_cover_preview(kind, data):
+    """표지 미리보기용 축소 이미지 (WebP, 미지원 시 PNG)
+
+    표지에 찍히는 글자와 수신처가 같으면 다시 그리지 않고 캐시를 사용한다.
+    """
+    template_path, clear_box, text_position, make_fields = COVER_KINDS[kind]
+    try:
+        return _cover_preview(
+            template_path,
+            os.stat(template_path).st_mtime_ns,
+            data.get('receiver_org', ''),
+            clear_box,
+            text_position,
+            tuple(make_fields(data))
+        )
+    except Exception as e:
+        report_error(f"미리보기 생성 오류: {e}")
+        return None
+
+def _document_doctor(kind, data):
+    return data['doctor_name'] if kind == 'report' else data['staff_after']
+
+def render_document(kind, data, output, profile=PROFILE_COLOR, engine=ENGINE_RASTER):
+    """표지 생성 + 첨부 병합 결과를 output 스트림(파일 등)에 바로 기록 → 성공 여부
+
+    표지는 메모리 버퍼 하나에만 그리고, 그 버퍼를 그대로 읽어 병합한 결과를
+    output에 쓰므로 중간 바이트 복사본이 생기지 않는다.
+    """
+    template_path, clear_box, text_position, make_fields = COVER_KINDS[kind]
+    cover = BytesIO()
+    try:
+        _render_cover(cover, template_path, data.get('receiver_org', ''), clear_box, text_position,
+                      make_fields(data), profile, engine)
+    except Exception as e:
+        report_error(f"{DOCUMENT_ERRORS[kind][0]}: {e}")
+        return False
+
+    cover.seek(0)
+    try:
+        _merge_into(output, cover, _document_doctor(kind, data), profile)
+    except Exception as e:
+        report_error(f"{DOCUMENT_ERRORS[kind][1]}: {e}")
+        return False
+    return True
+
+def build_document(kind, data, profile=PROFILE_COLOR, engine=ENGINE_RASTER):
+    """표지 생성 + 첨부 병합 → 전송할 PDF의 문서 ID (실패 시 None)
+
+    미리보기 단계에서는 병합하지 않고, 다운로드/전송할 때 호출한다.
+    병합본은 fax_store의 디스크 보관소 파일에 바로 쓰고, 같은 내용이면 보관 중인 문서를 재사용한다.
+    """
+    template_path, _, _, make_fields = COVER_KINDS[kind]
+    doctor_name = _document_doctor(kind, data)
+    # 배경/글꼴/첨부 파일이 바뀌면 fax_assets가 다시 읽으므로 병합본도 새로 만들도록 키에 포함
+    sources = files_signature((template_path, FONT_PATH, *get_attachment_paths(doctor_name)))
+    key = (kind, data.get('receiver_org', ''), tuple(make_fields(data)), doctor_name, profile, engine, sources)
+    with _document_lock:
+        doc_id = _document_cache.get(key)
+        if doc_id is not None:
+            _document_cache.move_to_end(key)
+    # 보관 시간이 지나 파일이 지워졌으면 다시 만든다
+    if doc_id is not None and document_path(doc_id):
+        return doc_id
+
+    with metric_tags(kind=kind, org=data.get('receiver_org', ''), doctor=doctor_name):
+        doc_id = write_document(lambda output: render_document(kind, data, output, profile, engine))
+
+    if doc_id is None:
+        return None
+    with _document_lock:
+        _document_cache[key] = doc_id
+        while len(_document_cache) > DOCUMENT_CACHE_SIZE:
+            _document_cache.popitem(last=False)
+    return doc_id
+
+def get_attachment_paths(doctor_name):
+    """첨부 순서: 의사 면허증 → 개설허가증 → 특수의료기관지정서"""
+    doc_file = DOCTOR_MAP.get(doctor_name)
+    paths = [doc_file] if doc_file else []
+    return tuple(paths + [FILE_LICENSE, FILE_SPECIAL_CERT])
+
+def _merge_into(output, cover, doctor_name, profile):
+    """표지(읽기 스트림) + 첨부 묶음 → 병합본을 output 스트림에 기록"""
+    from pypdf import PdfReader, PdfWriter
+
+    merger = PdfWriter()
+    with span("merge", doctor=doctor_name, profile=profile) as record:
+        merger.append(PdfReader(cover))
+
+        bundle = get_attachment_bundle(get_attachment_paths(doctor_name), profile)
+        if bundle:
+            # BytesIO(bytes)는 캐시된 묶음을 복사하지 않고 그대로 읽음
+            merger.append(PdfReader(BytesIO(bundle)))
+
+        start = output.tell()
+        merger.write(output)
+        record['bytes'] = output.tell() - start
+
+def merge_documents_report(cover_pdf_bytes, doctor_name, profile=PROFILE_COLOR):
+    """(탭1) 신고서용 병합"""
+    try:
+        output_buffer = BytesIO()
+        _merge_into(output_buffer, BytesIO(cover_pdf_bytes), doctor_name, profile)
+        return output_buffer.getvalue()
+    except Exception as e:
+        report_error(f"문서 병합 오류: {e}")
+        return None
+
+def merge_documents_fix(cover_pdf_bytes, doctor_name_after, profile=PROFILE_COLOR):
+    """(탭2) 변경신청서용 병합"""
+    try:
+        output_buffer = BytesIO()
+        _merge_into(output_buffer, BytesIO(cover_pdf_bytes), doctor_name_after, profile)
+        return output_buffer.getvalue()
+    except Exception as e:
+        report_error(f"문서 병합 오류(변경신청): {e}")
+        return None
+
+def make_report_filename(target, when=None):
+    """(탭1) FTP 업로드용 파일명"""
+    target_name = target.replace(" ", "_") if target else "Unknown"
+    return f"{target_name}_출장신고서_{(when or datetime.now()).strftime('%Y%m%d')}.pdf"
+
+def make_fix_filename(target_before, when=None):
+    """(탭2) FTP 업로드용 파일명"""
+    target_name = target_before.replace(" ", "_") if target_before else "Unknown"
+    return f"{target_name}_변경취소신청서_{(when or datetime.now()).strftime('%Y%m%d')}.pdf"
+
+def compare_output_profiles(data, kind="report", repeat=3):
+    """출력 프로필 x 표지 엔진별 표지·병합본 크기와 생성 시간 비교표
+
+    kind: 'report'(탭1) 또는 'fix'(탭2). 시간은 repeat회 중 최솟값(ms).
+    """
+    if kind == "report":
+        create, merge, doctor = create_report_pdf, merge_documents_report, data['doctor_name']
+    else:
+        create, merge, doctor = create_fix_pdf, merge_documents_fix, data['staff_after']
+
+    rows = []
+    for profile, engine in product((PROFILE_COLOR, PROFILE_FAX), (ENGINE_RASTER, ENGINE_VECTOR)):
+        render_ms = merge_ms = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cover_bytes = create(data, profile, engine)
+            rendered = time.perf_counter()
+            merged_bytes = merge(cover_bytes, doctor, profile) if cover_bytes else None
+            render_ms = min(render_ms, (rendered - started) * 1000)
+            merge_ms = min(merge_ms, (time.perf_counter() - rendered) * 1000)
+        rows.append({
+            '프로필': profile,
+            '엔진': engine,
+            '표지(KB)': round(len(cover_bytes or b"") / 1024, 1),
+            '병합본(KB)': round(len(merged_bytes or b"") / 1024, 1),
+            '표지 생성(ms)': round(render_ms, 1),
+            '병합(ms)': round(merge_ms, 1)
+        })
+    return rows
@@ -0,0 +1,191 @@
+"""단계별 소요 시간 계측
+
+문서 생성, 병합, FTP 접속/업로드, 바로빌 API 호출 등 각 단계를 span으로
+감싸서 시간을 잰다. 측정값은
+  - JSON 한 줄 로그 (logger "fax.metrics", 파일로도 남길 수 있음)
+  - Prometheus 텍스트 형식 (/metrics HTTP 엔드포인트)
+  - 화면용 최근 p50/p95 요약
+으로 내보낸다. 탭/수신처/의사 같은 태그는 metric_tags()로 한 번 지정하면
+그 안에서 기록되는 모든 span에 붙는다.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("fax.metrics")
+
+# --- 설정 및 상수 ---
+METRICS_LOG_PATH = "fax_metrics.jsonl"
+METRICS_HOST = "127.0.0.1"     # 받을 주소 (다른 서버에서 수집하려면 해당 인터페이스 주소로 변경)
+METRICS_PORT = 9108            # Prometheus 수집 주소 http://<서버>:9108/metrics
+RECENT_SPANS = 500             # 단계별로 보관할 최근 측정값 수 (화면 요약용)
+
+# Prometheus 히스토그램 구간(초)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Prometheus 레이블로 쓰는 태그 (수신처/의사처럼 값이 많은 태그는 JSON 로그에만 남김)
+LABEL_TAGS = ("stage", "tab")
+
+_tags = ContextVar("fax_metric_tags", default={})
+_lock = threading.Lock()
+_recent = {}         # 단계 -> deque[(시각, 소요 초, 성공 여부)]
+_histograms = {}     # 레이블 -> [구간별 건수..., 합계(초), 건수, 실패 건수, 바이트 합계]
+_server = None
+
+@contextmanager
+def metric_tags(**tags):
+    """이 블록 안에서 기록되는 span에 태그 추가 (스레드/요청별로 따로 유지)"""
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+@contextmanager
+def span(stage, **tags):
+    """단계 하나의 소요 시간 기록
+
+    블록 안에서 돌려받은 딕셔너리에 bytes 등 태그를 추가할 수 있고,
+    (ok, msg)로 실패를 알리는 함수는 record['ok'] = False로 표시한다.
+    예외가 나면 실패로 기록하고 예외는 그대로 전달한다.
+    """
+    record = {**_tags.get(), **tags, 'ok': True}
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record['ok'] = False
+        raise
+    finally:
+        _record(stage, time.perf_counter() - start, record)
+
+def _record(stage, seconds, record):
+    ok = bool(record.pop('ok'))
+    labels = (stage, str(record.get('tab', '')))
+    with _lock:
+        _recent.setdefault(stage, deque(maxlen=RECENT_SPANS)).append((time.time(), seconds, ok))
+        histogram = _histograms.get(labels)
+        if histogram is None:
+            histogram = _histograms[labels] = [0] * (len(DURATION_BUCKETS) + 4)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-4] += seconds
+        histogram[-3] += 1
+        histogram[-2] += 0 if ok else 1
+        histogram[-1] += int(record.get('bytes') or 0)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            'ts': datetime.now().isoformat(timespec="milliseconds"),
+            'stage': stage,
+            'ms': round(seconds * 1000, 2),
+            'ok': ok,
+            **record
+        }, ensure_ascii=False, default=str))
+
+# --- 내보내기 ---
+def configure_metrics_log(path=METRICS_LOG_PATH):
+    """span JSON 로그를 파일에 한 줄씩 기록 (프로세스당 한 번)"""
+    if any(getattr(handler, 'baseFilename', None) for handler in logger.handlers):
+        return
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus():
+    """Prometheus 텍스트 형식 (버전 0.0.4)"""
+    with _lock:
+        items = sorted((labels, list(values)) for labels, values in _histograms.items())
+
+    lines = [
+        "# HELP fax_stage_duration_seconds 팩스 처리 단계별 소요 시간",
+        "# TYPE fax_stage_duration_seconds histogram",
+    ]
+    for labels, values in items:
+        label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(LABEL_TAGS, labels))
+        for bound, count in zip(DURATION_BUCKETS, values):
+            lines.append(f'fax_stage_duration_seconds_bucket{{{label_text},le="{bound}"}} {count}')
+        lines.append(f'fax_stage_duration_seconds_bucket{{{label_text},le="+Inf"}} {values[-3]}')
+        lines.append(f"fax_stage_duration_seconds_sum{{{label_text}}} {values[-4]:.6f}")
+        lines.append(f"fax_stage_duration_seconds_count{{{label_text}}} {values[-3]}")
+
+    lines += ["# HELP fax_stage_failures_total 실패한 단계 수", "# TYPE fax_stage_failures_total counter"]
+    for labels, values in items:
+        label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(LABEL_TAGS, labels))
+        lines.append(f"fax_stage_failures_total{{{label_text}}} {values[-2]}")
+
+    lines += ["# HELP fax_stage_bytes_total 단계에서 처리한 문서 바이트 합계", "# TYPE fax_stage_bytes_total counter"]
+    for labels, values in items:
+        label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(LABEL_TAGS, labels))
+        lines.append(f"fax_stage_bytes_total{{{label_text}}} {values[-1]}")
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """/metrics 엔드포인트 시작 (프로세스당 한 번) → (성공 여부, 메시지)"""
+    global _server
+    with _lock:
+        if _server is not None:
+            return True, f"지표 수집 주소: http://{host}:{_server.server_address[1]}/metrics"
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            # 다른 프로세스가 이미 포트를 쓰는 경우 등
+            return False, f"지표 엔드포인트 시작 실패: {e}"
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="fax-metrics", daemon=True).start()
+        _server = server
+    return True, f"지표 수집 주소: http://{host}:{server.server_address[1]}/metrics"
+
+# --- 화면 요약 ---
+def _percentile(sorted_values, pct):
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+def stage_summary(window_seconds=3600):
+    """최근 구간의 단계별 p50/p95 (ms) 목록"""
+    since = time.time() - window_seconds
+    with _lock:
+        recent = {stage: [entry for entry in entries if entry[0] >= since] for stage, entries in _recent.items()}
+
+    rows = []
+    for stage, entries in recent.items():
+        if not entries:
+            continue
+        durations = sorted(seconds * 1000 for _, seconds, _ in entries)
+        rows.append({
+            '단계': stage,
+            '건수': len(durations),
+            'p50(ms)': round(_percentile(durations, 50), 1),
+            'p95(ms)': round(_percentile(durations, 95), 1),
+            '실패': sum(1 for *_, ok in entries if not ok),
+        })
+    return rows
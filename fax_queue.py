@@ -0,0 +1,521 @@
+"""팩스 전송 대기열 (SQLite 저장 + 백그라운드 전송)
+
+화면에서는 전송 작업을 등록만 하고, FTP 업로드와 바로빌 API 호출은
+백그라운드 워커가 처리한다. 작업은 SQLite 파일에 저장되므로 브라우저를
+닫거나 앱이 재시작되어도 남아 있다.
+
+워커는 전체 동시 작업 수와 수신번호별 동시 작업 수(fax_scheduler)를 넘지 않게
+작업을 가져오고, 급한 작업을 먼저 처리한다. 같은 수신번호로 이어지는 작업과
+급하지 않은 작업은 바로빌 예약 전송으로 걸 시각을 나눈다.
+
+가져간 작업에는 처리하는 프로세스와 생존 표시를 남기고, 생존 표시가 멈춘 작업만
+중단된 것으로 보고 복구한다. 전송 요청 후 접수 여부를 알 수 없게 된 작업은 다시
+보내지 않는다. 저장된 PDF는 전달이 확인되거나 보관 기간이 지나면 비운다.
+"""
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from fax_archive import update_job_filing
+from fax_metrics import metric_tags, span
+from fax_scheduler import RECEIVER_CONCURRENCY, RECEIVER_INTERVAL, SEND_CONCURRENCY, plan_dial
+from fax_tracker import STATE_ACCEPTED, STATE_UNKNOWN, track_receipt, track_unknown
+from fax_transport import submit_fax_from_ftp, upload_file_to_ftp
+
+logger = logging.getLogger(__name__)
+
+# --- 설정 및 상수 ---
+QUEUE_DB_PATH = "fax_queue.sqlite3"
+QUEUE_WORKERS = 3              # 동시에 처리할 전송 작업 수
+QUEUE_POLL_INTERVAL = 5        # 대기 작업 확인 주기(초)
+MAX_ATTEMPTS = 5               # 최대 시도 횟수
+RETRY_BASE_DELAY = 10          # 재시도 대기(초): 10, 20, 40, 80 ...
+RETRY_MAX_DELAY = 300
+BLOB_BLOCK_SIZE = 64 * 1024    # 파일을 BLOB에 넣을 때 한 번에 복사하는 크기
+JOB_HEARTBEAT_INTERVAL = 30    # 처리 중인 작업의 생존 표시 갱신 주기(초)
+JOB_STALE_AFTER = 120          # 생존 표시가 이 시간 넘게 멈춘 작업은 중단된 것으로 봄(초)
+PDF_RETENTION = 3 * 24 * 3600  # 끝난 작업의 PDF 보관 기간(초, 전달 결과 확인 후 재전송할 여유)
+JOB_RETENTION = 90 * 24 * 3600 # 끝난 작업 기록 보관 기간(초, 문서는 전송 기록 fax_archive로 다시 만듦)
+PURGE_INTERVAL = 3600          # 보관 기간 정리 주기(초)
+
+# 작업 상태
+STATUS_QUEUED = "queued"       # 대기
+STATUS_RETRY = "retry"         # 재시도 대기
+STATUS_UPLOADING = "uploading" # FTP 업로드 중
+STATUS_SENDING = "sending"     # 바로빌 전송 요청 중
+STATUS_DONE = "done"           # 접수 완료
+STATUS_FAILED = "failed"       # 실패
+
+STATUS_LABELS = {
+    STATUS_QUEUED: "대기",
+    STATUS_RETRY: "재시도 대기",
+    STATUS_UPLOADING: "업로드 중",
+    STATUS_SENDING: "전송 중",
+    STATUS_DONE: "접수 완료",
+    STATUS_FAILED: "실패",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS send_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tab TEXT NOT NULL DEFAULT '',
+    filename TEXT NOT NULL,
+    receiver TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    receiver_org TEXT NOT NULL DEFAULT '',
+    doctor TEXT NOT NULL DEFAULT '',
+    pdf BLOB NOT NULL,
+    status TEXT NOT NULL,
+    uploaded INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    receipt TEXT,
+    urgent INTEGER NOT NULL DEFAULT 1,
+    dial_at REAL NOT NULL DEFAULT 0,
+    send_dt TEXT NOT NULL DEFAULT '',
+    owner TEXT NOT NULL DEFAULT '',
+    heartbeat_at REAL NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_send_jobs_status ON send_jobs (status, next_attempt_at);
+"""
+
+# 목록 조회 시 PDF 본문은 읽지 않음
+_JOB_COLUMNS = (
+    "id, tab, filename, receiver, sender, receiver_org, doctor, status, uploaded, "
+    "attempts, next_attempt_at, message, receipt, urgent, dial_at, send_dt, created_at, updated_at"
+)
+
+_init_lock = threading.Lock()
+_initialized = False
+_wake_event = threading.Event()
+_dispatcher_lock = threading.Lock()
+_dispatcher_threads = []
+
+# 이 프로세스가 가져간 작업 표시 (다른 프로세스가 처리 중인 작업을 가로채지 않도록)
+_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+UNKNOWN_OUTCOME_MESSAGE = "바로빌에서 접수 여부 확인 필요"
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _connect():
+    conn = sqlite3.connect(QUEUE_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _ensure_db():
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            # 새 DB는 지운 PDF 자리를 파일에서도 돌려주도록 (기존 DB는 영향 없음)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # 이전 버전 DB에 없는 열 추가
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(send_jobs)")}
+            if 'doctor' not in columns:
+                conn.execute("ALTER TABLE send_jobs ADD COLUMN doctor TEXT NOT NULL DEFAULT ''")
+            if 'urgent' not in columns:
+                conn.execute("ALTER TABLE send_jobs ADD COLUMN urgent INTEGER NOT NULL DEFAULT 1")
+                conn.execute("ALTER TABLE send_jobs ADD COLUMN dial_at REAL NOT NULL DEFAULT 0")
+                conn.execute("ALTER TABLE send_jobs ADD COLUMN send_dt TEXT NOT NULL DEFAULT ''")
+            if 'owner' not in columns:
+                # 이전 버전에서 처리 중이던 작업은 생존 표시가 0이므로 바로 중단된 것으로 처리됨
+                conn.execute("ALTER TABLE send_jobs ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+                conn.execute("ALTER TABLE send_jobs ADD COLUMN heartbeat_at REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_send_jobs_dial ON send_jobs (dial_at)")
+        finally:
+            conn.close()
+        _initialized = True
+
+def enqueue_send(pdf, filename, receiver, sender, tab="", receiver_org="", doctor="", urgent=True):
+    """전송 작업 등록 → 작업 번호
+
+    pdf: PDF 바이트 또는 파일 경로. 파일은 메모리에 올리지 않고 BLOB에 블록 단위로 복사한다.
+    urgent: False면 야간 시간대로 예약 전송 (업로드는 바로 함)
+    """
+    urgent = 1 if urgent else 0
+    _ensure_db()
+    now = _now()
+    conn = _connect()
+    try:
+        if isinstance(pdf, bytes):
+            cur = conn.execute(
+                "INSERT INTO send_jobs (tab, filename, receiver, sender, receiver_org, doctor, pdf, status, "
+                "urgent, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (tab, filename, receiver, sender, receiver_org, doctor, pdf, STATUS_QUEUED, urgent, now, now)
+            )
+            job_id = cur.lastrowid
+        else:
+            # 빈 BLOB을 만들고 채운 뒤 커밋 (다 채우기 전에는 워커가 가져가지 않음)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = conn.execute(
+                    "INSERT INTO send_jobs (tab, filename, receiver, sender, receiver_org, doctor, pdf, status, "
+                    "urgent, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, zeroblob(?), ?, ?, ?, ?)",
+                    (tab, filename, receiver, sender, receiver_org, doctor, os.path.getsize(pdf),
+                     STATUS_QUEUED, urgent, now, now)
+                )
+                job_id = cur.lastrowid
+                with open(pdf, "rb") as f, conn.blobopen("send_jobs", "pdf", job_id) as blob:
+                    shutil.copyfileobj(f, blob, BLOB_BLOCK_SIZE)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    _wake_event.set()
+    return job_id
+
+def requeue_job(job_id):
+    """기존 작업의 PDF로 새 전송 작업 등록 (재전송용, 바로 전송) → 새 작업 번호
+
+    작업이 없거나 보관 기간이 지나 PDF를 비운 작업이면 None
+    """
+    _ensure_db()
+    now = _now()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute(
+                "INSERT INTO send_jobs (tab, filename, receiver, sender, receiver_org, doctor, pdf, status, "
+                "created_at, updated_at) SELECT tab, filename, receiver, sender, receiver_org, doctor, pdf, ?, ?, ? "
+                "FROM send_jobs WHERE id = ? AND length(pdf) > 0",
+                (STATUS_QUEUED, now, now, job_id)
+            )
+            new_job_id = cur.lastrowid if cur.rowcount else None
+            if new_job_id:
+                # PDF는 새 작업으로 옮겨 갔으므로 원래 작업에서는 비움
+                conn.execute("UPDATE send_jobs SET pdf = zeroblob(0) WHERE id = ?", (job_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    if new_job_id:
+        _wake_event.set()
+    return new_job_id
+
+def get_job(job_id):
+    """작업 상태 조회 (없으면 None)"""
+    _ensure_db()
+    conn = _connect()
+    try:
+        row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM send_jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def list_jobs(limit=20):
+    """최근 작업 목록"""
+    _ensure_db()
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT {_JOB_COLUMNS} FROM send_jobs ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+def release_job_pdfs(job_ids):
+    """끝난 작업의 저장된 PDF 비우기 (전달 완료 등, 다시 보낼 일이 없을 때)"""
+    _ensure_db()
+    conn = _connect()
+    try:
+        conn.executemany(
+            "UPDATE send_jobs SET pdf = zeroblob(0) WHERE id = ? AND status IN (?, ?)",
+            [(job_id, STATUS_DONE, STATUS_FAILED) for job_id in job_ids]
+        )
+    finally:
+        conn.close()
+
+def purge_jobs(now=None):
+    """보관 기간이 지난 작업 정리 → (PDF를 비운 작업 수, 지운 작업 수)
+
+    끝난 지 PDF_RETENTION이 지난 작업은 PDF를 비우고, JOB_RETENTION이 지난 작업은 지운다.
+    """
+    _ensure_db()
+    now = now or time.time()
+    pdf_before = datetime.fromtimestamp(now - PDF_RETENTION).strftime("%Y-%m-%d %H:%M:%S")
+    job_before = datetime.fromtimestamp(now - JOB_RETENTION).strftime("%Y-%m-%d %H:%M:%S")
+    conn = _connect()
+    try:
+        released = conn.execute(
+            "UPDATE send_jobs SET pdf = zeroblob(0) WHERE status IN (?, ?) AND updated_at < ? AND length(pdf) > 0",
+            (STATUS_DONE, STATUS_FAILED, pdf_before)
+        ).rowcount
+        deleted = conn.execute(
+            "DELETE FROM send_jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (STATUS_DONE, STATUS_FAILED, job_before)
+        ).rowcount
+        if released or deleted:
+            conn.execute("PRAGMA incremental_vacuum")
+    finally:
+        conn.close()
+    return released, deleted
+
+def _recover_stale_jobs(conn):
+    """생존 표시가 멈춘 작업 복구 (작업 도중 종료된 프로세스의 작업만) → 복구한 작업 수
+
+    업로드 중이던 작업은 다시 시도하고, API 호출 중이던 작업은 중복 전송을 막기 위해
+    다시 보내지 않고 '확인 불가'로 넘긴다.
+    """
+    stale_before = time.time() - JOB_STALE_AFTER
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE send_jobs SET status = ?, owner = '', updated_at = ? WHERE status = ? AND heartbeat_at < ?",
+            (STATUS_RETRY, _now(), STATUS_UPLOADING, stale_before)
+        )
+        retried = conn.execute("SELECT changes()").fetchone()[0]
+        interrupted = conn.execute(
+            "SELECT id, tab, filename, receiver, sender, receiver_org FROM send_jobs "
+            "WHERE status = ? AND heartbeat_at < ?",
+            (STATUS_SENDING, stale_before)
+        ).fetchall()
+        for job in interrupted:
+            _update_job(conn, job['id'], status=STATUS_FAILED, owner='',
+                        message=f"전송 요청 중 중단됨 - {UNKNOWN_OUTCOME_MESSAGE}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    for job in interrupted:
+        _track_unknown_outcome(job)
+    return retried + len(interrupted)
+
+def _heartbeat(conn):
+    """이 프로세스가 처리 중인 작업의 생존 표시 갱신"""
+    conn.execute(
+        "UPDATE send_jobs SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)",
+        (time.time(), _OWNER, STATUS_UPLOADING, STATUS_SENDING)
+    )
+
+def _claim_job(conn, job_ids=None):
+    """처리할 작업 하나를 골라 '업로드 중' 또는 '전송 중'으로 표시
+
+    다른 프로세스의 워커까지 합쳐 동시 작업이 SEND_CONCURRENCY개면 가져오지 않고,
+    같은 수신번호로 처리 중인 작업이 RECEIVER_CONCURRENCY개인 작업은 건너뛴다.
+    job_ids를 주면 그 작업들 중에서만 고른다.
+    """
+    only = f"AND id IN ({','.join('?' * len(job_ids))}) " if job_ids is not None else ""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        active = conn.execute(
+            "SELECT COUNT(*) FROM send_jobs WHERE status IN (?, ?)", (STATUS_UPLOADING, STATUS_SENDING)
+        ).fetchone()[0]
+        row = None
+        if active < SEND_CONCURRENCY:
+            row = conn.execute(
+                "SELECT id, tab, filename, receiver, sender, receiver_org, doctor, length(pdf) AS size, uploaded, "
+                "attempts, urgent FROM send_jobs AS job "
+                f"WHERE status IN (?, ?) AND next_attempt_at <= ? {only}AND ("
+                "    SELECT COUNT(*) FROM send_jobs AS other WHERE other.status IN (?, ?) AND other.receiver = job.receiver"
+                ") < ? ORDER BY urgent DESC, id LIMIT 1",
+                (STATUS_QUEUED, STATUS_RETRY, time.time(), *(job_ids or ()),
+                 STATUS_UPLOADING, STATUS_SENDING, RECEIVER_CONCURRENCY)
+            ).fetchone()
+        if row:
+            status = STATUS_SENDING if row['uploaded'] else STATUS_UPLOADING
+            conn.execute(
+                "UPDATE send_jobs SET status = ?, attempts = attempts + 1, owner = ?, heartbeat_at = ?, "
+                "updated_at = ? WHERE id = ?",
+                (status, _OWNER, time.time(), _now(), row['id'])
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row
+
+def _update_job(conn, job_id, **fields):
+    fields['updated_at'] = _now()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    conn.execute(f"UPDATE send_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+def _fail_or_retry(conn, job, message):
+    attempts = job['attempts'] + 1
+    if attempts >= MAX_ATTEMPTS:
+        _update_job(conn, job['id'], status=STATUS_FAILED, message=message)
+        update_job_filing(job['id'], STATUS_FAILED)
+        return
+    delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+    _update_job(
+        conn, job['id'], status=STATUS_RETRY, next_attempt_at=time.time() + delay,
+        message=f"{message} ({delay}초 후 재시도 {attempts}/{MAX_ATTEMPTS})"
+    )
+
+def _track_unknown_outcome(job):
+    """접수 여부를 알 수 없는 작업은 다시 보내지 않고 전달 결과 목록에 '확인 불가'로 올림"""
+    key = track_unknown(job['id'], job['filename'], job['receiver'], job['sender'],
+                        receiver_org=job['receiver_org'], tab=job['tab'])
+    update_job_filing(job['id'], STATE_UNKNOWN, key)
+
+def _process_job(conn, job):
+    with metric_tags(tab=job['tab'], org=job['receiver_org'], doctor=job['doctor'], job=job['id']):
+        with span("queue_job", bytes=job['size']) as record:
+            record['ok'] = _send_job(conn, job)
+
+def _planned_dials(conn, job_id):
+    """전송 요청을 마친 작업들의 걸 시각 [(수신번호, 시각), ...] (간격 계산에 필요한 범위만)"""
+    rows = conn.execute(
+        "SELECT receiver, dial_at FROM send_jobs WHERE dial_at > ? AND id != ?",
+        (time.time() - RECEIVER_INTERVAL, job_id)
+    ).fetchall()
+    return [(row['receiver'], row['dial_at']) for row in rows]
+
+def _send_job(conn, job):
+    """업로드 → 전송 요청, 접수 완료면 True"""
+    filename = job['filename']
+    if not job['uploaded']:
+        # 같은 내용이 이미 올라가 있으면 업로드를 건너뛰고, 이름이 겹치면 다른 이름으로 올라감
+        # PDF는 BLOB에서 FTP 데이터 연결로 블록 단위로 바로 보냄
+        with conn.blobopen("send_jobs", "pdf", job['id'], readonly=True) as blob:
+            ok, msg, filename = upload_file_to_ftp(blob, filename)
+        if not ok:
+            _fail_or_retry(conn, job, msg)
+            return False
+        _update_job(conn, job['id'], status=STATUS_SENDING, uploaded=1, filename=filename, message=msg)
+
+    dial_at, send_dt = plan_dial(job['receiver'], _planned_dials(conn, job['id']), job['urgent'])
+    result = submit_fax_from_ftp(filename, job['receiver'], job['sender'], send_dt)
+    if result['ok']:
+        _update_job(conn, job['id'], status=STATUS_DONE, message=result['message'], receipt=result['receipt'],
+                    dial_at=dial_at, send_dt=send_dt)
+        track_receipt(
+            result['receipt'], filename, job['receiver'], job['sender'],
+            receiver_org=job['receiver_org'], tab=job['tab'], job_id=job['id'], dial_ts=dial_at
+        )
+        update_job_filing(job['id'], STATE_ACCEPTED, result['receipt'])
+    elif result['unknown']:
+        # 응답 시간 초과/SOAP Fault: 바로빌이 받았을 수 있으므로 다시 보내지 않음
+        _update_job(conn, job['id'], status=STATUS_FAILED, message=result['message'], filename=filename,
+                    dial_at=dial_at, send_dt=send_dt)
+        _track_unknown_outcome(dict(job, filename=filename))
+    elif result['retryable']:
+        _fail_or_retry(conn, job, result['message'])
+    else:
+        _update_job(conn, job['id'], status=STATUS_FAILED, message=result['message'])
+        update_job_filing(job['id'], STATUS_FAILED)
+    return result['ok']
+
+def _worker_loop():
+    conn = _connect()
+    while True:
+        try:
+            job = _claim_job(conn)
+            if job is None:
+                _wake_event.wait(QUEUE_POLL_INTERVAL)
+                _wake_event.clear()
+                continue
+            _process_job(conn, job)
+        except Exception:
+            logger.exception("팩스 전송 작업 처리 오류")
+            time.sleep(QUEUE_POLL_INTERVAL)
+
+def _unfinished_count(conn, job_ids):
+    row = conn.execute(
+        f"SELECT COUNT(*) FROM send_jobs WHERE id IN ({','.join('?' * len(job_ids))}) AND status NOT IN (?, ?)",
+        (*job_ids, STATUS_DONE, STATUS_FAILED)
+    ).fetchone()
+    return row[0]
+
+def process_jobs(job_ids, workers=QUEUE_WORKERS):
+    """지정한 작업만 이 프로세스에서 처리하고, 모두 끝나면 반환 (일괄 전송 CLI 등 잠깐 실행되는 프로그램용)
+
+    다른 화면/API가 넣은 작업은 가져가지 않는다. Ctrl+C를 누르면 새 작업은 가져가지 않고
+    처리 중인 작업을 마친 뒤 KeyboardInterrupt를 다시 일으킨다.
+    다른 프로세스의 워커가 가져간 작업은 그쪽에서 끝날 때까지 기다린다.
+    """
+    job_ids = list(job_ids)
+    if not job_ids:
+        return
+    _ensure_db()
+    stop = threading.Event()
+
+    def work():
+        conn = _connect()
+        try:
+            while not stop.is_set():
+                try:
+                    job = _claim_job(conn, job_ids)
+                    if job is not None:
+                        _process_job(conn, job)
+                    elif _unfinished_count(conn, job_ids):
+                        stop.wait(1)
+                    else:
+                        stop.set()
+                except Exception:
+                    logger.exception("팩스 전송 작업 처리 오류")
+                    stop.wait(QUEUE_POLL_INTERVAL)
+        finally:
+            conn.close()
+
+    def heartbeat():
+        conn = _connect()
+        try:
+            while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+                _heartbeat(conn)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=work, name=f"fax-queue-run-{i}") for i in range(workers)]
+    threads.append(threading.Thread(target=heartbeat, name="fax-queue-run-heartbeat"))
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        raise
+
+def _maintenance_loop():
+    """생존 표시 갱신, 중단된 작업 복구, 보관 기간 정리"""
+    conn = _connect()
+    purged_at = 0.0
+    while True:
+        try:
+            _heartbeat(conn)
+            if _recover_stale_jobs(conn):
+                _wake_event.set()
+            if time.time() - purged_at >= PURGE_INTERVAL:
+                purge_jobs()
+                purged_at = time.time()
+        except Exception:
+            logger.exception("팩스 전송 대기열 관리 오류")
+        time.sleep(JOB_HEARTBEAT_INTERVAL)
+
+def start_dispatcher(workers=QUEUE_WORKERS):
+    """백그라운드 전송 워커와 대기열 관리 스레드 시작 (프로세스당 한 번)"""
+    _ensure_db()
+    with _dispatcher_lock:
+        if _dispatcher_threads:
+            return
+        thread = threading.Thread(target=_maintenance_loop, name="fax-queue-maintenance", daemon=True)
+        thread.start()
+        _dispatcher_threads.append(thread)
+        for i in range(workers):
+            thread = threading.Thread(target=_worker_loop, name=f"fax-queue-{i}", daemon=True)
+            thread.start()
+            _dispatcher_threads.append(thread)
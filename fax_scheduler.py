@@ -0,0 +1,114 @@
+"""팩스 전송 시각 조절 (전송 속도, 수신번호별 간격, 야간 예약 전송)
+
+월말처럼 전송이 몰릴 때 바로빌 API 호출이 제한에 걸리거나, 같은 보건소
+팩스로 동시에 여러 건을 걸어 통화 중으로 실패하지 않도록 전송 시각을 정한다.
+
+- 바로빌 전송 요청은 토큰 버킷으로 초당 SEND_RATE건(순간 SEND_BURST건)까지만 보낸다.
+- 같은 수신번호로는 RECEIVER_INTERVAL초 간격을 두고 건다. 간격이 남았으면
+  작업을 붙잡고 기다리지 않고 바로빌 예약 전송(SendDT)으로 그 시각에 걸게 한다.
+- 급하지 않은 전송은 야간(OFF_PEAK_START시~OFF_PEAK_END시)으로 예약하고,
+  예약은 분당 RESERVE_PER_MINUTE건을 넘지 않게 고르게 나눈다.
+
+동시 전송 수 제한(SEND_CONCURRENCY, RECEIVER_CONCURRENCY)은 전송 대기열이
+작업을 가져갈 때 적용한다 (fax_queue).
+"""
+import bisect
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# --- 설정 및 상수 ---
+SEND_RATE = 2.0            # 바로빌 전송 요청 초당 건수 (None이면 제한 없음)
+SEND_BURST = 5             # 몰릴 때 한 번에 보낼 수 있는 건수
+SEND_CONCURRENCY = 3       # 전체 동시 업로드/전송 작업 수 (대기열, 프로세스 합산)
+RECEIVER_CONCURRENCY = 1   # 수신번호 하나에 동시에 처리할 작업 수
+RECEIVER_INTERVAL = 120    # 같은 수신번호로 거는 최소 간격(초, 4쪽 팩스 한 건 전송 시간 정도)
+RESERVE_MIN_LEAD = 60      # 예약 전송은 지금부터 최소 이만큼 뒤로(초)
+RESERVE_PER_MINUTE = 20    # 1분 동안 걸리도록 예약하는 최대 건수 (예약끼리 60/이 값 초 간격)
+OFF_PEAK_START = 20        # 야간 시간대 시작(시)
+OFF_PEAK_END = 7           # 야간 시간대 끝(시, 다음날)
+SEND_DT_FORMAT = "%Y%m%d%H%M%S"   # 바로빌 SendDT 형식
+# SendDT와 야간 시간대는 한국 시각 기준 (서버 시간대와 무관)
+BAROBILL_TZ = ZoneInfo("Asia/Seoul")
+
+_bucket_lock = threading.Lock()
+_tokens = float(SEND_BURST)
+_refilled_at = time.monotonic()
+
+# --- 전송 속도 (토큰 버킷) ---
+def set_send_rate(rate, burst=SEND_BURST):
+    """전송 요청 속도 지정 (rate가 None이면 제한 없음, 로컬 대역 벤치마크용)"""
+    global SEND_RATE, SEND_BURST, _tokens
+    with _bucket_lock:
+        SEND_RATE, SEND_BURST = rate, burst
+        _tokens = float(burst)
+
+def acquire_send_token():
+    """전송 요청 한 건을 보내도 될 때까지 대기 → 기다린 시간(초)"""
+    global _tokens, _refilled_at
+    waited = 0.0
+    while True:
+        with _bucket_lock:
+            if SEND_RATE is None:
+                return waited
+            now = time.monotonic()
+            _tokens = min(SEND_BURST, _tokens + (now - _refilled_at) * SEND_RATE)
+            _refilled_at = now
+            if _tokens >= 1:
+                _tokens -= 1
+                return waited
+            wait = (1 - _tokens) / SEND_RATE
+        time.sleep(wait)
+        waited += wait
+
+# --- 전송 시각 ---
+def _local(ts):
+    return datetime.fromtimestamp(ts, BAROBILL_TZ)
+
+def is_off_peak(ts):
+    hour = _local(ts).hour
+    return hour >= OFF_PEAK_START or hour < OFF_PEAK_END
+
+def next_off_peak(ts):
+    """ts가 야간이면 ts, 아니면 그날 야간 시작 시각"""
+    if is_off_peak(ts):
+        return ts
+    start = _local(ts).replace(hour=OFF_PEAK_START, minute=0, second=0, microsecond=0)
+    return start.timestamp()
+
+def format_send_dt(ts):
+    return _local(ts).strftime(SEND_DT_FORMAT)
+
+def _digits(number):
+    return "".join(char for char in str(number) if char.isdigit())
+
+def plan_dial(receiver, planned, urgent=True, now=None):
+    """팩스를 걸 시각 정하기 → (시각 timestamp, SendDT: 바로 보내면 "")
+
+    planned: 이미 정해진 [(수신번호, 시각), ...] (대기열의 다른 작업, fax_queue._planned_dials)
+    같은 수신번호와는 RECEIVER_INTERVAL 간격을 두고, 급하지 않으면 야간으로 미룬다.
+    """
+    now = now or time.time()
+    receiver = _digits(receiver)
+    same = sorted(ts for number, ts in planned if _digits(number) == receiver)
+    reserved = sorted(ts for _, ts in planned if ts > now)
+    gap = 60 / RESERVE_PER_MINUTE
+
+    dial = now if urgent else next_off_peak(now)
+    while True:
+        previous = dial
+        for ts in same:
+            if abs(ts - dial) < RECEIVER_INTERVAL:
+                dial = ts + RECEIVER_INTERVAL
+        if dial > now:
+            dial = max(dial, now + RESERVE_MIN_LEAD)
+            # 다른 예약과 gap 안에 겹치면 그 뒤로
+            nearby = reserved[bisect.bisect_right(reserved, dial - gap):bisect.bisect_left(reserved, dial + gap)]
+            if nearby:
+                dial = nearby[-1] + gap
+        if not urgent and not is_off_peak(dial):
+            dial = next_off_peak(dial)
+        if dial == previous:
+            break
+    return dial, (format_send_dt(dial) if dial > now else "")
@@ -0,0 +1,150 @@
+"""생성 문서 임시 보관소 (디스크)
+
+생성한 PDF는 메모리(session_state)에 두지 않고 임시 폴더에 파일로 저장하고,
+화면에는 문서 ID(내용 sha256)와 메타데이터만 보관한다. 다운로드/업로드는
+파일에서 바로 읽는다. 오래 쓰지 않은 문서와 용량 초과분은 자동으로 지운다.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+# --- 설정 및 상수 ---
+STORE_DIR = os.path.join(tempfile.gettempdir(), "nkfax_documents")
+STORE_TTL = 2 * 3600                   # 마지막 사용 후 보관 시간(초)
+STORE_MAX_BYTES = 256 * 1024 * 1024    # 보관 용량 상한 (넘으면 오래 안 쓴 문서부터 삭제)
+EVICT_INTERVAL = 60                    # 정리 작업 최소 간격(초)
+
+_DOC_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+_evict_lock = threading.Lock()
+_last_evicted = 0.0
+
+def _path(doc_id):
+    if not doc_id or not _DOC_ID_PATTERN.match(doc_id):
+        return None
+    return os.path.join(STORE_DIR, f"{doc_id}.pdf")
+
+def put_document(pdf_bytes):
+    """PDF 저장 → 문서 ID (같은 내용은 같은 ID)"""
+    doc_id = hashlib.sha256(pdf_bytes).hexdigest()
+    path = _path(doc_id)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        os.makedirs(STORE_DIR, exist_ok=True)
+        # 다른 스레드가 쓰는 도중의 파일을 읽지 않도록 임시 이름으로 쓴 뒤 교체
+        fd, tmp_path = tempfile.mkstemp(dir=STORE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    evict_documents()
+    return doc_id
+
+def write_document(write):
+    """write(파일)로 내용을 보관소 파일에 바로 기록 → 문서 ID (write가 실패를 돌려주면 None)
+
+    PDF 전체를 메모리에 모으지 않고 파일로 쓴 뒤, 파일을 다시 읽어 ID(sha256)를 정한다.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=STORE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w+b") as f:
+            if not write(f):
+                os.remove(tmp_path)
+                return None
+            f.seek(0)
+            doc_id = hashlib.file_digest(f, "sha256").hexdigest()
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    path = _path(doc_id)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+        os.utime(path)
+    else:
+        os.replace(tmp_path, path)
+    evict_documents()
+    return doc_id
+
+def document_path(doc_id):
+    """문서 파일 경로 (없거나 정리된 경우 None), 사용 시각 갱신"""
+    path = _path(doc_id)
+    if path is None:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+def document_size(doc_id):
+    path = _path(doc_id)
+    try:
+        return os.path.getsize(path) if path else None
+    except OSError:
+        return None
+
+def open_document(doc_id):
+    """문서 파일 열기 (읽기 전용 바이너리, 없으면 None)"""
+    path = document_path(doc_id)
+    if path is None:
+        return None
+    try:
+        return open(path, "rb")
+    except OSError:
+        return None
+
+def read_document(doc_id):
+    """문서 전체 바이트 (없으면 None)"""
+    f = open_document(doc_id)
+    if f is None:
+        return None
+    with f:
+        return f.read()
+
+def evict_documents(force=False):
+    """보관 시간이 지난 문서와 용량 초과분 삭제 → 삭제한 수"""
+    global _last_evicted
+    now = time.time()
+    if not force and now - _last_evicted < EVICT_INTERVAL:
+        return 0
+    if not _evict_lock.acquire(blocking=False):
+        return 0
+    try:
+        _last_evicted = now
+        entries = []
+        try:
+            names = os.listdir(STORE_DIR)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            path = os.path.join(STORE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            # 쓰는 중인 임시 파일은 건너뜀 (중단되어 남은 것만 보관 시간 후 삭제)
+            if name.endswith(".tmp") and now - stat.st_mtime <= STORE_TTL:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        total = sum(size for _, size, _ in entries)
+        # 오래 안 쓴 순서로: 보관 시간이 지났거나 용량을 넘으면 삭제
+        for mtime, size, path in sorted(entries):
+            if now - mtime <= STORE_TTL and total <= STORE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+    finally:
+        _evict_lock.release()
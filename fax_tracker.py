@@ -0,0 +1,330 @@
+"""팩스 전달 결과 추적
+
+바로빌은 SendFaxFromFTP에서 접수번호만 돌려주므로, 받은 접수번호를
+SQLite에 저장해 두고 백그라운드 스레드 하나가 GetFaxSendStates로 여러 건을
+한 번에 조회해서 전달 결과(성공/실패/통화중)를 갱신한다. 조회 간격은 건별로
+점점 늘리고(적응형 백오프), API 오류가 나면 전체 조회를 잠시 쉰다.
+진행 중인 팩스가 많아도 API 호출 수는 일정하다.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from fax_archive import relink_resent, update_filing_states
+from fax_transport import call_barobill, get_secrets, submit_fax_from_ftp
+
+logger = logging.getLogger(__name__)
+
+# --- 설정 및 상수 ---
+TRACKER_DB_PATH = "fax_status.sqlite3"
+POLL_BATCH_SIZE = 100          # 한 번에 조회할 접수번호 수
+POLL_BASE_INTERVAL = 20        # 첫 조회까지 대기(초), 이후 건별로 2배씩: 20, 40, 80 ...
+POLL_MAX_INTERVAL = 600
+TRACK_MAX_AGE = 24 * 3600      # 이 시간이 지나도 결과가 없으면 추적 중단(초)
+
+# 바로빌 FaxMessage 값 (연동 문서의 전송상태/전송결과 코드표에 맞춰 관리)
+# 표에 없는 전송결과 코드는 전달 여부를 단정하지 않고 '확인 불가'로 둔다.
+# 실패로 잘못 분류하면 이미 전달된 팩스를 다시 보내게 되므로, 코드표에서 확인한 코드만 넣는다.
+BAROBILL_PENDING_STATES = (0, 1, 2)      # 전송 대기 / 전송 중
+BAROBILL_SUCCESS_RESULTS = ("802",)      # 전송 성공
+BAROBILL_BUSY_RESULTS = ("803",)         # 통화 중
+BAROBILL_FAILED_RESULTS = ()             # 전달 실패 (다시 보내도 되는 코드)
+
+# 전달 상태
+STATE_ACCEPTED = "accepted"    # 접수됨 (아직 조회 전)
+STATE_SENDING = "sending"      # 전송 중
+STATE_DELIVERED = "delivered"  # 전달 성공
+STATE_FAILED = "failed"        # 전달 실패
+STATE_BUSY = "busy"            # 통화 중
+STATE_UNKNOWN = "unknown"      # 결과 확인 불가 (추적 시간 초과)
+STATE_RESENT = "resent"        # 다시 보냄 (새 접수번호로 추적)
+
+STATE_LABELS = {
+    STATE_ACCEPTED: "접수",
+    STATE_SENDING: "전송 중",
+    STATE_DELIVERED: "전달 완료",
+    STATE_FAILED: "전달 실패",
+    STATE_BUSY: "통화 중",
+    STATE_UNKNOWN: "확인 불가",
+    STATE_RESENT: "재전송함",
+}
+
+ACTIVE_STATES = (STATE_ACCEPTED, STATE_SENDING)
+RESENDABLE_STATES = (STATE_FAILED, STATE_BUSY, STATE_UNKNOWN)
+# 전달됐을 수도 있는 상태: 바로빌에서 확인했다는 표시(confirmed)가 있어야 다시 보냄
+CONFIRM_RESEND_STATES = (STATE_UNKNOWN,)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fax_status (
+    receipt TEXT PRIMARY KEY,
+    job_id INTEGER,
+    tab TEXT NOT NULL DEFAULT '',
+    filename TEXT NOT NULL,
+    receiver TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    receiver_org TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL,
+    result_code TEXT NOT NULL DEFAULT '',
+    pages TEXT NOT NULL DEFAULT '',
+    polls INTEGER NOT NULL DEFAULT 0,
+    next_poll_at REAL NOT NULL DEFAULT 0,
+    resent_as TEXT,
+    submitted_at TEXT NOT NULL,
+    submitted_ts REAL NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fax_status_poll ON fax_status (state, next_poll_at);
+"""
+
+_init_lock = threading.Lock()
+_initialized = False
+_wake_event = threading.Event()
+_poller_lock = threading.Lock()
+_poller_thread = None
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _connect():
+    conn = sqlite3.connect(TRACKER_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _ensure_db():
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        _initialized = True
+
+def track_receipt(receipt, filename, receiver, sender, receiver_org="", tab="", job_id=None, dial_ts=None):
+    """접수번호를 추적 대상으로 등록 (예약 전송이면 dial_ts: 걸 시각 이후부터 조회)"""
+    if not receipt:
+        return
+    _ensure_db()
+    now = _now()
+    first_poll_at = max(dial_ts or 0, time.time()) + POLL_BASE_INTERVAL
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR IGNORE INTO fax_status (receipt, job_id, tab, filename, receiver, sender, receiver_org, "
+            "state, next_poll_at, submitted_at, submitted_ts, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(receipt), job_id, tab, filename, receiver, sender, receiver_org,
+             STATE_ACCEPTED, first_poll_at, now, time.time(), now)
+        )
+    finally:
+        conn.close()
+    _wake_event.set()
+
+def track_unknown(job_id, filename, receiver, sender, receiver_org="", tab=""):
+    """접수 여부를 알 수 없는 대기열 작업 등록 → 추적 키 ('job:<작업 번호>')
+
+    전송 요청 후 응답을 받지 못해 접수번호가 없으므로 조회하지 않고 바로 '확인 불가'로
+    둔다. 바로빌에서 접수 여부를 확인한 뒤 필요하면 다시 보낸다 (저장된 PDF로 새 작업).
+    """
+    key = f"job:{job_id}"
+    _ensure_db()
+    now = _now()
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR IGNORE INTO fax_status (receipt, job_id, tab, filename, receiver, sender, receiver_org, "
+            "state, submitted_at, submitted_ts, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, job_id, tab, filename, receiver, sender, receiver_org, STATE_UNKNOWN, now, time.time(), now)
+        )
+    finally:
+        conn.close()
+    return key
+
+def list_statuses(limit=20):
+    """최근 추적 목록"""
+    _ensure_db()
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM fax_status ORDER BY submitted_ts DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+def get_status(receipt):
+    """접수번호 하나의 추적 상태 (없으면 None)"""
+    _ensure_db()
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM fax_status WHERE receipt = ?", (str(receipt),)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+# --- 결과 조회 ---
+def _classify(message):
+    """FaxMessage → (상태, 결과 코드, 페이지 표시)"""
+    send_state = int(getattr(message, 'SendState', 0) or 0)
+    result_code = str(getattr(message, 'SendResult', '') or '')
+    total = getattr(message, 'TotalPageCount', None)
+    success = getattr(message, 'SuccessPageCount', None)
+    pages = f"{success or 0}/{total}" if total else ""
+
+    if send_state in BAROBILL_PENDING_STATES:
+        return STATE_SENDING, result_code, pages
+    if result_code in BAROBILL_SUCCESS_RESULTS:
+        return STATE_DELIVERED, result_code, pages
+    if result_code in BAROBILL_BUSY_RESULTS:
+        return STATE_BUSY, result_code, pages
+    if result_code in BAROBILL_FAILED_RESULTS:
+        return STATE_FAILED, result_code, pages
+    return STATE_UNKNOWN, result_code, pages
+
+def fetch_states(receipts):
+    """접수번호 여러 건의 현재 상태 조회 → {접수번호: FaxMessage}"""
+    secrets = get_secrets()
+    result = call_barobill(
+        "GetFaxSendStates",
+        CERTKEY=secrets["BAROBILL_CERT_KEY"],
+        CorpNum=secrets["BAROBILL_CORP_NUM"],
+        ID=secrets["BAROBILL_ID"],
+        SendKeyList={'string': list(receipts)}
+    )
+    # ArrayOfFaxMessage는 zeep에서 FaxMessage 목록을 감싼 객체로 옴
+    messages = getattr(result, 'FaxMessage', result) or []
+    return {str(message.SendKey): message for message in messages}
+
+def poll_once(now=None):
+    """조회할 때가 된 접수번호를 묶어서 한 번 조회 → 조회한 건수"""
+    _ensure_db()
+    now = now or time.time()
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT receipt, job_id, state, polls, submitted_ts FROM fax_status WHERE state IN ({','.join('?' * len(ACTIVE_STATES))}) "
+            "AND next_poll_at <= ? ORDER BY next_poll_at LIMIT ?",
+            (*ACTIVE_STATES, now, POLL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            return 0
+
+        messages = fetch_states(row['receipt'] for row in rows)
+        updated_at = _now()
+        changes = []
+        delivered_jobs = []
+        for row in rows:
+            message = messages.get(row['receipt'])
+            if message is not None:
+                state, result_code, pages = _classify(message)
+            else:
+                state, result_code, pages = STATE_SENDING, "", ""
+            if state == STATE_SENDING and now - row['submitted_ts'] > TRACK_MAX_AGE:
+                state = STATE_UNKNOWN
+            delay = min(POLL_BASE_INTERVAL * 2 ** (row['polls'] + 1), POLL_MAX_INTERVAL)
+            conn.execute(
+                "UPDATE fax_status SET state = ?, result_code = ?, pages = ?, polls = polls + 1, "
+                "next_poll_at = ?, updated_at = ? WHERE receipt = ?",
+                (state, result_code, pages, now + delay, updated_at, row['receipt'])
+            )
+            if state != row['state']:
+                changes.append((row['receipt'], state))
+            if state == STATE_DELIVERED and row['job_id'] is not None:
+                delivered_jobs.append(row['job_id'])
+        # 전송 기록(fax_archive)에도 바뀐 상태만 반영
+        update_filing_states(changes)
+        if delivered_jobs:
+            # 전달된 작업은 다시 보낼 일이 없으므로 대기열에 저장된 PDF를 비움
+            from fax_queue import release_job_pdfs
+            release_job_pdfs(delivered_jobs)
+        return len(rows)
+    finally:
+        conn.close()
+
+def _next_due_in():
+    conn = _connect()
+    try:
+        row = conn.execute(
+            f"SELECT MIN(next_poll_at) FROM fax_status WHERE state IN ({','.join('?' * len(ACTIVE_STATES))})",
+            ACTIVE_STATES
+        ).fetchone()
+    finally:
+        conn.close()
+    if row[0] is None:
+        return POLL_MAX_INTERVAL
+    return max(0.0, min(row[0] - time.time(), POLL_MAX_INTERVAL))
+
+def _poller_loop():
+    error_delay = POLL_BASE_INTERVAL
+    while True:
+        try:
+            while poll_once() == POLL_BATCH_SIZE:
+                pass
+            error_delay = POLL_BASE_INTERVAL
+            wait = _next_due_in()
+        except Exception:
+            # API 오류가 계속되면 조회 간격을 늘림
+            logger.exception("팩스 전달 결과 조회 오류")
+            wait = error_delay
+            error_delay = min(error_delay * 2, POLL_MAX_INTERVAL)
+        _wake_event.wait(wait)
+        _wake_event.clear()
+
+def start_tracker():
+    """백그라운드 결과 조회 스레드 시작 (프로세스당 한 번)"""
+    global _poller_thread
+    _ensure_db()
+    with _poller_lock:
+        if _poller_thread is None:
+            _poller_thread = threading.Thread(target=_poller_loop, name="fax-tracker", daemon=True)
+            _poller_thread.start()
+
+# --- 재전송 ---
+def resend(receipt, confirmed=False):
+    """실패한 팩스 다시 보내기 → (성공 여부, 메시지)
+
+    대기열 작업이면 저장된 PDF로 새 작업을 만들고, 아니면 FTP에 올려 둔
+    파일로 전송 요청만 다시 보낸다. '확인 불가' 건은 이미 전달됐을 수 있으므로
+    바로빌에서 전달되지 않은 것을 확인했을 때(confirmed)만 다시 보낸다.
+    """
+    _ensure_db()
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM fax_status WHERE receipt = ?", (receipt,)).fetchone()
+    finally:
+        conn.close()
+    if row is None or row['state'] not in RESENDABLE_STATES:
+        return False, "다시 보낼 수 없는 상태입니다."
+    if row['state'] in CONFIRM_RESEND_STATES and not confirmed:
+        return False, "전달 여부를 알 수 없습니다. 바로빌에서 전달되지 않은 것을 확인한 뒤 다시 보내세요."
+
+    if row['job_id'] is not None:
+        from fax_queue import requeue_job
+        new_job_id = requeue_job(row['job_id'])
+        if new_job_id is None:
+            return False, "원본 전송 작업의 PDF가 없습니다 (보관 기간 경과)."
+        _mark_resent(receipt, f"작업 #{new_job_id}")
+        relink_resent(receipt, STATE_RESENT, job_id=new_job_id)
+        return True, f"작업 #{new_job_id}로 다시 전송합니다."
+
+    result = submit_fax_from_ftp(row['filename'], row['receiver'], row['sender'])
+    if not result['ok']:
+        return False, result['message']
+    track_receipt(result['receipt'], row['filename'], row['receiver'], row['sender'], row['receiver_org'], row['tab'])
+    _mark_resent(receipt, result['receipt'])
+    relink_resent(receipt, STATE_ACCEPTED, new_receipt=result['receipt'])
+    return True, result['message']
+
+def _mark_resent(receipt, resent_as):
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE fax_status SET state = ?, resent_as = ?, updated_at = ? WHERE receipt = ?",
+            (STATE_RESENT, resent_as, _now(), receipt)
+        )
+    finally:
+        conn.close()
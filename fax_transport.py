@@ -0,0 +1,555 @@
+"""바로빌 FTP 업로드 및 팩스 전송 API 호출"""
+import ftplib
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+import tomllib
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from io import BytesIO
+
+from fax_metrics import span
+from fax_scheduler import SEND_DT_FORMAT, acquire_send_token
+
+# --- 바로빌 API 설정 ---
+BAROBILL_WSDL_URL = "https://testws.baroservice.com/FAX.asmx?WSDL"
+# 이 파일이 있으면 원격 WSDL 대신 로컬 사본을 읽음 (WSDL 서버가 느릴 때 대비)
+BAROBILL_WSDL_LOCAL_PATH = "barobill_fax.wsdl"
+
+SOAP_TIMEOUT = 30              # WSDL 로드 타임아웃(초)
+SOAP_OPERATION_TIMEOUT = 60    # API 호출 타임아웃(초)
+SOAP_POOL_SIZE = 8             # keep-alive 연결 수
+
+# --- 바로빌 FTP 설정 ---
+FTP_TIMEOUT = 30               # 접속/전송 타임아웃(초)
+FTP_POOL_SIZE = 4              # 계정별 유휴 세션 최대 보관 수
+FTP_KEEPALIVE_INTERVAL = 30    # 유휴 세션 NOOP 주기(초)
+FTP_IDLE_TIMEOUT = 300         # 이 시간 이상 쓰지 않은 세션은 종료(초)
+FTP_BLOCK_SIZE = 64 * 1024     # 업로드/해시 계산 시 한 번에 읽는 크기
+
+# 업로드 색인: 같은 내용의 PDF를 다시 올리지 않기 위한 로컬 기록
+UPLOAD_INDEX_PATH = "fax_uploads.sqlite3"
+UPLOAD_INDEX_TTL = 6 * 3600    # 이 시간이 지난 기록은 서버에서 지워졌을 수 있으므로 다시 업로드(초)
+
+# Streamlit 밖(일괄 생성 CLI 등)에서 실행할 때 읽는 비밀 설정 파일
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+_file_secrets = None
+_secrets_override = None
+
+def set_secrets_override(secrets):
+    """비밀 설정을 직접 지정 (로컬 FTP/SOAP 대역 테스트용, None이면 해제)"""
+    global _secrets_override
+    _secrets_override = secrets
+
+def get_secrets():
+    """Streamlit 실행 중이면 st.secrets, 아니면 .streamlit/secrets.toml 내용"""
+    global _file_secrets
+    if _secrets_override is not None:
+        return _secrets_override
+    st = sys.modules.get("streamlit")
+    if st is not None and st.runtime.exists():
+        return st.secrets
+    if _file_secrets is None:
+        try:
+            with open(SECRETS_PATH, "rb") as f:
+                _file_secrets = tomllib.load(f)
+        except FileNotFoundError:
+            _file_secrets = {}
+    return _file_secrets
+
+# --- 바로빌 SOAP 클라이언트 ---
+# WSDL 파싱과 TLS 연결은 프로세스당 한 번만 하고 이후 전송에서 재사용
+_client_lock = threading.Lock()
+_client = None
+_wsdl_override = None
+
+def set_wsdl_override(location):
+    """WSDL 위치를 직접 지정 (로컬 SOAP 대역 테스트용, None이면 해제)"""
+    global _wsdl_override
+    _wsdl_override = location
+    reset_barobill_client()
+
+def _wsdl_location():
+    if _wsdl_override is not None:
+        return _wsdl_override
+    if os.path.exists(BAROBILL_WSDL_LOCAL_PATH):
+        return BAROBILL_WSDL_LOCAL_PATH
+    return BAROBILL_WSDL_URL
+
+def _create_client():
+    # zeep/requests는 무거우므로 첫 API 호출 때 불러옴 (화면 시작 속도)
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    from zeep import Client
+    from zeep.cache import InMemoryCache
+    from zeep.transports import Transport
+
+    session = requests.Session()
+    # 연결 단계 오류만 재시도 (요청이 전달된 뒤의 재전송은 중복 팩스가 될 수 있음)
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=SOAP_POOL_SIZE,
+        max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.5)
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    transport = Transport(
+        session=session,
+        cache=InMemoryCache(),
+        timeout=SOAP_TIMEOUT,
+        operation_timeout=SOAP_OPERATION_TIMEOUT
+    )
+    return Client(_wsdl_location(), transport=transport)
+
+def get_barobill_client():
+    """공용 바로빌 SOAP 클라이언트 반환 (최초 호출 시 생성)"""
+    global _client
+    client = _client
+    if client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+            client = _client
+    return client
+
+def reset_barobill_client():
+    """통신 오류 후 다음 호출에서 클라이언트를 새로 만들도록 폐기"""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.transport.session.close()
+
+def call_barobill(operation, **params):
+    """바로빌 API 호출, 통신 오류가 나면 클라이언트를 폐기하고 예외를 그대로 전달"""
+    client = get_barobill_client()
+    # 클라이언트를 만들 때 이미 불러왔으므로 비용 없음
+    from requests import RequestException
+    from zeep.exceptions import TransportError
+    try:
+        return getattr(client.service, operation)(**params)
+    except (RequestException, TransportError):
+        reset_barobill_client()
+        raise
+
+def check_barobill_health():
+    """WSDL 로드 및 서비스 주소 응답 확인 → (성공 여부, 메시지)"""
+    try:
+        client = get_barobill_client()
+        address = client.service._binding_options["address"]
+        response = client.transport.session.get(address, timeout=SOAP_TIMEOUT)
+        if response.status_code >= 500:
+            reset_barobill_client()
+            return False, f"바로빌 서버 응답 오류 (HTTP {response.status_code})"
+        return True, f"바로빌 연결 정상 ({address})"
+    except Exception as e:
+        reset_barobill_client()
+        return False, f"바로빌 연결 실패: {e}"
+
+# --- 바로빌 FTP 세션 풀 ---
+# (호스트, 포트, 계정)별로 로그인된 세션을 보관하고 업로드마다 재사용
+_ftp_lock = threading.Lock()
+_ftp_idle = {}            # key -> [(ftp, 마지막 사용 시각), ...]
+_ftp_keepalive_thread = None
+
+# 세션이 끊겼을 때 나는 오류 (새 세션으로 한 번 더 시도)
+FTP_CONNECTION_ERRORS = (OSError, EOFError, ftplib.error_temp)
+
+def _ftp_config():
+    secrets = get_secrets()
+    return (
+        secrets["BAROBILL_FTP_HOST"],
+        int(secrets["BAROBILL_FTP_PORT"]),
+        secrets["BAROBILL_FTP_ID"],
+        secrets["BAROBILL_FTP_PWD"]
+    )
+
+def _open_ftp(host, port, user, pwd):
+    with span("ftp_login", host=host):
+        ftp = ftplib.FTP(timeout=FTP_TIMEOUT)
+        ftp.connect(host, port)
+
+        # [핵심 수정] 한글 파일명 전송을 위해 인코딩을 CP949(EUC-KR)로 강제 설정
+        ftp.encoding = "cp949"
+
+        ftp.login(user=user, passwd=pwd)
+        ftp.set_pasv(True)
+    return ftp
+
+def _close_ftp(ftp):
+    try:
+        ftp.quit()
+    except Exception:
+        ftp.close()
+
+def _ftp_alive(ftp):
+    try:
+        ftp.voidcmd("NOOP")
+        return True
+    except Exception:
+        return False
+
+def _ftp_keepalive_loop():
+    """유휴 세션에 주기적으로 NOOP을 보내고, 오래됐거나 끊긴 세션은 정리"""
+    while True:
+        time.sleep(FTP_KEEPALIVE_INTERVAL)
+        now = time.monotonic()
+        with _ftp_lock:
+            sessions = [(key, entry) for key, entries in _ftp_idle.items() for entry in entries]
+            for entries in _ftp_idle.values():
+                entries.clear()
+        for key, (ftp, last_used) in sessions:
+            if now - last_used > FTP_IDLE_TIMEOUT or not _ftp_alive(ftp):
+                _close_ftp(ftp)
+            else:
+                _release_ftp(key, ftp, last_used)
+
+def _release_ftp(key, ftp, last_used=None):
+    global _ftp_keepalive_thread
+    with _ftp_lock:
+        entries = _ftp_idle.setdefault(key, [])
+        if len(entries) < FTP_POOL_SIZE:
+            entries.append((ftp, last_used or time.monotonic()))
+            ftp = None
+        if _ftp_keepalive_thread is None:
+            _ftp_keepalive_thread = threading.Thread(
+                target=_ftp_keepalive_loop, name="ftp-keepalive", daemon=True
+            )
+            _ftp_keepalive_thread.start()
+    if ftp is not None:
+        _close_ftp(ftp)
+
+def _acquire_ftp(key):
+    """풀에서 살아 있는 세션을 꺼내고, 없으면 새로 로그인"""
+    while True:
+        with _ftp_lock:
+            entries = _ftp_idle.get(key)
+            if not entries:
+                break
+            ftp, last_used = entries.pop()
+        # 쉰 지 오래된 세션만 NOOP으로 확인
+        if time.monotonic() - last_used < FTP_KEEPALIVE_INTERVAL or _ftp_alive(ftp):
+            return ftp
+        _close_ftp(ftp)
+    return _open_ftp(*key)
+
+@contextmanager
+def ftp_session(config=None):
+    """풀에서 FTP 세션을 빌려 쓰고, 정상 종료 시 반납 (오류 시 폐기)"""
+    host, port, user, pwd = config or _ftp_config()
+    key = (host, port, user, pwd)
+    ftp = _acquire_ftp(key)
+    try:
+        yield ftp
+    except BaseException:
+        _close_ftp(ftp)
+        raise
+    _release_ftp(key, ftp)
+
+def close_ftp_sessions():
+    """보관 중인 FTP 세션 모두 종료"""
+    with _ftp_lock:
+        sessions = [ftp for entries in _ftp_idle.values() for ftp, _ in entries]
+        _ftp_idle.clear()
+    for ftp in sessions:
+        _close_ftp(ftp)
+
+def _open_source(source):
+    """업로드할 내용 → 처음부터 읽는 파일 객체 (bytes, 파일 경로, 읽기 가능한 파일 객체 허용)
+
+    파일 객체(보관소 파일, SQLite BLOB 등)는 호출한 쪽에서 닫는다.
+    """
+    if isinstance(source, bytes):
+        return nullcontext(BytesIO(source))
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb")
+    source.seek(0)
+    return nullcontext(source)
+
+def _digest_source(source):
+    """→ (sha256, 크기) 전체를 메모리에 올리지 않고 블록 단위로 계산"""
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest(), len(source)
+    digest = hashlib.sha256()
+    size = 0
+    with _open_source(source) as f:
+        for block in iter(lambda: f.read(FTP_BLOCK_SIZE), b""):
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+def _store(ftp, source, filename):
+    # 파일에서 데이터 연결로 블록 단위로 바로 보냄 (전체 복사본을 만들지 않음)
+    with _open_source(source) as f, span("ftp_stor", filename=filename) as record:
+        start = f.tell()
+        ftp.storbinary(f"STOR {filename}", f, blocksize=FTP_BLOCK_SIZE)
+        record['bytes'] = f.tell() - start
+
+# --- 업로드 색인 (내용 해시 → FTP에 올라가 있는 파일명) ---
+# 같은 내용은 다시 올리지 않고, 같은 이름에 다른 내용이면 해시를 붙인 이름으로 올림
+_index_lock = threading.Lock()
+_index_initialized = False
+# (계정, 해시) -> (원격 파일명, 끝나면 set 되는 Event): 같은 내용은 끝날 때까지 기다렸다가 그 파일을 쓰고,
+# 다른 내용은 업로드 중인 이름을 피함
+_uploads_in_flight = {}
+
+_UPLOAD_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ftp_uploads (
+    account TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    remote_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    uploaded_at REAL NOT NULL,
+    PRIMARY KEY (account, sha256)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ftp_uploads_name ON ftp_uploads (account, remote_name);
+"""
+
+def _index_connect():
+    global _index_initialized
+    conn = sqlite3.connect(UPLOAD_INDEX_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _index_initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_UPLOAD_INDEX_SCHEMA)
+        _index_initialized = True
+    return conn
+
+def _plan_upload(conn, account, digest, filename):
+    """→ (원격 파일명, 이미 올라가 있으면 True)"""
+    fresh_since = time.time() - UPLOAD_INDEX_TTL
+    row = conn.execute(
+        "SELECT remote_name FROM ftp_uploads WHERE account = ? AND sha256 = ? AND uploaded_at >= ?",
+        (account, digest, fresh_since)
+    ).fetchone()
+    if row:
+        return row['remote_name'], True
+
+    taken = conn.execute(
+        "SELECT 1 FROM ftp_uploads WHERE account = ? AND remote_name = ? AND sha256 != ? AND uploaded_at >= ?",
+        (account, filename, digest, fresh_since)
+    ).fetchone()
+    in_flight = any(
+        key[0] == account and key[1] != digest and name == filename
+        for key, (name, _) in _uploads_in_flight.items()
+    )
+    if taken or in_flight:
+        stem, ext = os.path.splitext(filename)
+        filename = f"{stem}_{digest[:12]}{ext}"
+    return filename, False
+
+def _record_upload(conn, account, digest, remote_name, size):
+    conn.execute("DELETE FROM ftp_uploads WHERE account = ? AND (remote_name = ? OR sha256 = ?)",
+                 (account, remote_name, digest))
+    conn.execute(
+        "INSERT INTO ftp_uploads (account, sha256, remote_name, size, uploaded_at) VALUES (?, ?, ?, ?, ?)",
+        (account, digest, remote_name, size, time.time())
+    )
+
+def _ftp_account(config):
+    host, port, user, _ = config
+    return f"{user}@{host}:{port}"
+
+def forget_upload(remote_name):
+    """현재 FTP 계정의 색인에서 파일 제거 (서버에서 파일을 찾지 못한 경우 다음에 다시 올리도록)"""
+    try:
+        account = _ftp_account(_ftp_config())
+    except (KeyError, ValueError):
+        return    # FTP 설정이 없으면 올린 기록도 없음
+    with _index_lock:
+        conn = _index_connect()
+        try:
+            conn.execute("DELETE FROM ftp_uploads WHERE account = ? AND remote_name = ?", (account, remote_name))
+        finally:
+            conn.close()
+
+def upload_file_to_ftp(pdf, filename, dedup=True):
+    """FTP 업로드 → (성공 여부, 메시지, 실제 올라간 파일명)"""
+    return upload_files_to_ftp([(pdf, filename)], dedup)[0]
+
+def upload_files_to_ftp(files, dedup=True):
+    """여러 PDF를 한 세션으로 업로드 → 파일별 (성공 여부, 메시지, 실제 올라간 파일명) 목록
+
+    files: (pdf, filename) 목록. pdf는 bytes, 파일 경로, 읽기 가능한 파일 객체 중
+    하나이며 파일은 블록 단위로 읽어서 그대로 올린다. dedup이면 같은 내용이 이미 올라가 있을 때
+    건너뛰고 그 파일명을 돌려주며, 같은 이름에 다른 내용이 있으면 해시를 붙인
+    이름으로 올린다. 보관 중이던 세션이 끊겨 있으면 새로 로그인해서 해당
+    파일부터 한 번 더 시도한다.
+    """
+    try:
+        config = _ftp_config()
+    except Exception as e:
+        return [(False, f"FTP 업로드 실패: {e}", filename) for _, filename in files]
+    account = _ftp_account(config)
+
+    results = [None] * len(files)
+    pending = []
+    waiting = []    # 다른 스레드가 같은 내용을 올리는 중인 파일 (위치, pdf, 파일명, Event)
+    repeats = {}    # 해시 -> (처음 나온 위치, 이번 목록 안에서 같은 내용이 또 나온 위치 목록)
+    with _index_lock:
+        conn = _index_connect() if dedup else None
+        try:
+            for i, (pdf, filename) in enumerate(files):
+                if conn is None:
+                    pending.append((i, pdf, filename, None, None))
+                    continue
+                digest, size = _digest_source(pdf)
+                if digest in repeats:
+                    repeats[digest][1].append(i)
+                    continue
+                if (account, digest) in _uploads_in_flight:
+                    waiting.append((i, pdf, filename, _uploads_in_flight[account, digest][1]))
+                    continue
+                remote_name, uploaded = _plan_upload(conn, account, digest, filename)
+                if uploaded:
+                    results[i] = (True, f"이미 업로드된 파일 사용 ({remote_name})", remote_name)
+                else:
+                    _uploads_in_flight[account, digest] = (remote_name, threading.Event())
+                    pending.append((i, pdf, remote_name, digest, size))
+                repeats[digest] = (i, [])
+        finally:
+            if conn is not None:
+                conn.close()
+
+    uploaded = []
+    try:
+        uploaded = _store_files(config, [(pdf, remote_name) for _, pdf, remote_name, _, _ in pending])
+    finally:
+        with _index_lock:
+            conn = _index_connect() if dedup else None
+            try:
+                for (i, _, remote_name, digest, size), (ok, msg) in zip(pending, uploaded):
+                    if ok and conn is not None:
+                        _record_upload(conn, account, digest, remote_name, size)
+                    results[i] = (ok, msg, remote_name)
+                for first, positions in repeats.values():
+                    for i in positions:
+                        ok, msg, remote_name = results[first]
+                        results[i] = (ok, f"이미 업로드된 파일 사용 ({remote_name})" if ok else msg, remote_name)
+            finally:
+                for _, _, _, digest, _ in pending:
+                    if digest is not None:
+                        _uploads_in_flight.pop((account, digest))[1].set()
+                if conn is not None:
+                    conn.close()
+
+    if waiting:
+        # 자기 업로드를 끝낸 뒤에 기다림 (서로 기다리며 멈추지 않도록)
+        # 앞선 업로드가 성공했으면 색인에서 그 파일명을 찾고, 실패했으면 여기서 올림
+        for _, _, _, done in waiting:
+            done.wait()
+        retried = upload_files_to_ftp([(pdf, filename) for _, pdf, filename, _ in waiting], dedup)
+        for (i, _, _, _), result in zip(waiting, retried):
+            results[i] = result
+    return results
+
+def _store_files(config, files):
+    """한 세션으로 순서대로 STOR → 파일별 (성공 여부, 메시지)"""
+    results = []
+    pending = list(files)
+    retried = False
+    while pending:
+        try:
+            with ftp_session(config) as ftp:
+                while pending:
+                    pdf, filename = pending[0]
+                    try:
+                        _store(ftp, pdf, filename)
+                    except ftplib.error_perm as e:
+                        # 파일 단위 오류 (권한, 파일명 등): 세션은 계속 사용
+                        results.append((False, f"FTP 업로드 실패: {e}"))
+                    else:
+                        results.append((True, "FTP 업로드 성공"))
+                    pending.pop(0)
+        except FTP_CONNECTION_ERRORS as e:
+            if retried:
+                results.extend((False, f"FTP 업로드 실패: {e}") for _ in pending)
+                break
+            retried = True
+        except Exception as e:
+            results.extend((False, f"FTP 업로드 실패: {e}") for _ in pending)
+            break
+    return results
+
+def _send_result(ok, message, receipt=None, retryable=False, unknown=False):
+    return {'ok': ok, 'message': message, 'receipt': receipt, 'retryable': retryable, 'unknown': unknown}
+
+def _request_not_sent(error):
+    """바로빌 서버에 연결조차 못 해서 요청이 전달되지 않은 오류인지"""
+    from requests.exceptions import ConnectionError, ConnectTimeout
+    from urllib3.exceptions import MaxRetryError, NewConnectionError
+    if isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, ConnectionError):
+        # 연결이 끊기거나 응답 도중 실패한 경우(ProtocolError 등)는 요청이 이미 전달됐을 수 있음
+        reason = error.args[0] if error.args else None
+        return isinstance(reason, MaxRetryError) and isinstance(reason.reason, NewConnectionError)
+    return False
+
+def submit_fax_from_ftp(filename, receiver_num, sender_num, send_dt=""):
+    """바로빌 전송 요청 → {'ok', 'message', 'receipt', 'retryable', 'unknown'}
+
+    send_dt: 예약 전송 시각(yyyyMMddHHmmss, fax_scheduler.plan_dial), 빈 값이면 바로 전송
+    retryable은 요청이 바로빌에 전달되기 전의 실패(연결 불가 등)라 다시 보내도 될 때 True.
+    unknown은 요청을 보낸 뒤 응답 시간 초과/SOAP Fault 등으로 접수 여부를 알 수 없을 때 True
+    (다시 보내면 중복 팩스가 될 수 있으므로 바로빌에서 확인해야 함).
+    """
+    try:
+        secrets = get_secrets()
+        if "BAROBILL_CERT_KEY" not in secrets:
+            return _send_result(False, "API 키(Secrets)가 설정되지 않았습니다.")
+
+        cert_key = secrets["BAROBILL_CERT_KEY"]
+        corp_num = secrets["BAROBILL_CORP_NUM"]
+        sender_id = secrets["BAROBILL_ID"]
+        # WSDL 로드는 전송 요청 전이므로 실패해도 다시 시도해도 됨
+        get_barobill_client()
+    except Exception as e:
+        return _send_result(False, f"API 통신 오류: {str(e)}", retryable=True)
+
+    # 바로빌 호출 제한에 걸리지 않도록 속도 조절 (기다린 시간은 호출 시간과 따로 기록)
+    paced = acquire_send_token()
+    try:
+        with span("soap_send", filename=filename, send_dt=send_dt, paced=round(paced, 3)) as record:
+            result = call_barobill(
+                "SendFaxFromFTP",
+                CERTKEY=cert_key,
+                CorpNum=corp_num,
+                SenderID=sender_id,
+                FileName=filename,
+                FromNumber=sender_num.replace("-", ""),
+                ToNumber=receiver_num.replace("-", ""),
+                ReceiveCorp="보건소",
+                ReceiveName="담당자",
+                SendDT=send_dt,
+                RefKey=""
+            )
+            record['result'] = str(result)
+    except Exception as e:
+        if _request_not_sent(e):
+            return _send_result(False, f"API 통신 오류: {str(e)}", retryable=True)
+        return _send_result(False, f"전송 결과 확인 불가 ({str(e)}) - 바로빌에서 접수 여부 확인 필요",
+                            unknown=True)
+
+    try:
+        if int(result) < 0:
+            # 서버에 파일이 없어서 실패했을 수 있으므로 다음 업로드 때는 다시 올림
+            forget_upload(filename)
+            return _send_result(False, f"전송 실패 (에러코드: {result})")
+    except ValueError:
+        pass
+
+    if send_dt:
+        reserved_at = datetime.strptime(send_dt, SEND_DT_FORMAT).strftime("%m-%d %H:%M")
+        return _send_result(True, f"예약 접수 완료 ({reserved_at} 전송, 접수번호: {result})", str(result))
+    return _send_result(True, f"전송 접수 완료 (접수번호: {result})", str(result))
+
+def send_fax_from_ftp_real(filename, receiver_num, sender_num, send_dt=""):
+    """바로빌 전송 (send_dt를 주면 예약 전송)"""
+    result = submit_fax_from_ftp(filename, receiver_num, sender_num, send_dt)
+    return result['ok'], result['message']
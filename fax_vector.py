@@ -0,0 +1,125 @@
+"""벡터 표지 엔진
+
+배경 이미지는 프로필별로 한 번만 PDF 페이지로 만들어 두고,
+입력값은 NanumGothic 글꼴(사용한 글자만 포함)로 작은 벡터 레이어를 만들어
+그 페이지 위에 pypdf로 덧씌운다. 글자 좌표는 래스터 엔진과 같은
+1240 x 1754 픽셀 기준을 그대로 사용한다.
+"""
+import os
+import threading
+from io import BytesIO
+
+from PIL import Image
+
+from fax_assets import FONT_PATH, PAGE_SIZE, PROFILE_FAX, get_font, save_page_pdf
+
+# 표지 생성 방식
+ENGINE_RASTER = "raster"   # 배경 이미지에 글자를 그려 통째로 이미지 PDF로 저장 (기존 방식)
+ENGINE_VECTOR = "vector"   # 캐시한 배경 페이지 위에 벡터 글자 레이어를 덧씌움
+COVER_ENGINES = (ENGINE_RASTER, ENGINE_VECTOR)
+
+VECTOR_FONT_NAME = "NanumGothic"
+
+_font_lock = threading.Lock()
+_font_registered = False
+_page_lock = threading.Lock()
+_page_cache = {}    # (배경 경로, 프로필) -> (mtime, 파일크기, 배경 페이지 PDF 바이트)
+
+def _register_font():
+    """reportlab에 TTF 등록 (프로세스당 한 번, 저장 시 사용한 글자만 포함됨)"""
+    global _font_registered
+    if _font_registered:
+        return
+    with _font_lock:
+        if not _font_registered:
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+            pdfmetrics.registerFont(TTFont(VECTOR_FONT_NAME, FONT_PATH))
+            _font_registered = True
+
+def get_template_page(template_path, profile):
+    """배경 이미지를 한 장짜리 PDF로 변환한 결과 (파일이 바뀌면 다시 변환)
+
+    글자는 벡터로 올리므로 배경은 원본 해상도 그대로 넣는다 (1240 x 1754로
+    키우지 않아 용량이 작음). 페이지 크기는 래스터 엔진과 같다.
+    """
+    stat = os.stat(template_path)
+    key = (template_path, profile)
+    with _page_lock:
+        entry = _page_cache.get(key)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        with Image.open(template_path) as src:
+            image = src.convert("RGB")
+        dpi = image.width * 150.0 / PAGE_SIZE[0]
+        pdf_buffer = BytesIO()
+        save_page_pdf(image, pdf_buffer, profile, src_dpi=(dpi, dpi))
+        _page_cache[key] = (stat.st_mtime_ns, stat.st_size, pdf_buffer.getvalue())
+        return _page_cache[key][2]
+
+def render_overlay(page_width, page_height, recipient, fields, profile):
+    """입력값만 담은 투명 벡터 레이어 PDF 생성
+
+    recipient: (문구, 지울 영역, 위치, 글자 크기) / fields: [(글자, 위치, 크기, 색), ...]
+    """
+    from reportlab.pdfgen.canvas import Canvas
+
+    _register_font()
+    scale_x = page_width / PAGE_SIZE[0]
+    scale_y = page_height / PAGE_SIZE[1]
+
+    buffer = BytesIO()
+    canvas = Canvas(buffer, pagesize=(page_width, page_height), invariant=1)
+
+    def draw_text(text, position, font_size, color):
+        # PIL은 위치를 글자 윗선(ascender) 기준으로, PDF는 기준선(baseline) 기준으로 그림
+        ascent = get_font(font_size).getmetrics()[0]
+        canvas.setFillColor("black" if profile == PROFILE_FAX else color)
+        canvas.setFont(VECTOR_FONT_NAME, font_size * scale_y)
+        canvas.drawString(
+            position[0] * scale_x,
+            page_height - (position[1] + ascent) * scale_y,
+            text
+        )
+
+    # 배경의 기존 수신처 문구를 흰색으로 덮고 선택된 수신처명을 입력
+    title, clear_box, text_position, title_font_size = recipient
+    canvas.setFillColor("white")
+    canvas.rect(
+        clear_box[0] * scale_x,
+        page_height - (clear_box[3] + 1) * scale_y,
+        (clear_box[2] - clear_box[0] + 1) * scale_x,
+        (clear_box[3] - clear_box[1] + 1) * scale_y,
+        stroke=0, fill=1
+    )
+    draw_text(title, text_position, title_font_size, "black")
+
+    for text, position, font_size, color in fields:
+        draw_text(text, position, font_size, color)
+
+    canvas.showPage()
+    canvas.save()
+    return buffer.getvalue()
+
+def stamp_cover(template_path, recipient, fields, profile, output=None):
+    """캐시한 배경 페이지에 벡터 레이어를 덧씌운 표지 PDF 바이트
+
+    output(쓰기 가능한 스트림)을 주면 바이트를 만들지 않고 그 스트림에 바로 기록한다.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    page = PdfReader(BytesIO(get_template_page(template_path, profile))).pages[0]
+    page_width = float(page.mediabox.width)
+    page_height = float(page.mediabox.height)
+
+    overlay = render_overlay(page_width, page_height, recipient, fields, profile)
+    page.merge_page(PdfReader(BytesIO(overlay)).pages[0])
+
+    writer = PdfWriter()
+    writer.add_page(page)
+    if output is not None:
+        writer.write(output)
+        return None
+    output_buffer = BytesIO()
+    writer.write(output_buffer)
+    return output_buffer.getvalue()
@@ -1,392 +1,242 @@
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
-from io import BytesIO
-from datetime import datetime
-from pypdf import PdfWriter, PdfReader
-import base64
+import logging
 import os
-import ftplib
-from zeep import Client
-
-# --- 설정 및 상수 ---
-FONT_PATH = "NanumGothic.ttf"
-TEMPLATE_PATH = "background-001.png"             # 건강검진 신고서 배경
-TEMPLATE_FIX_PATH = "background_fix001-001.png"  # 변경/취소 신청서 배경
-
-# 배경 이미지에 고정 인쇄된 '김포시 보건소장 귀하'를 지우고
-# 선택된 수신처명을 입력할 영역(이미지 리사이즈 후 1240 x 1754 기준)
-REPORT_RECIPIENT_CLEAR_BOX = (115, 1190, 700, 1229)
-REPORT_RECIPIENT_TEXT_POS = (130, 1191)
-FIX_RECIPIENT_CLEAR_BOX = (115, 1510, 800, 1553)
-FIX_RECIPIENT_TEXT_POS = (250, 1512)
-RECIPIENT_FONT_SIZE = 26
-RECIPIENT_MIN_FONT_SIZE = 18
-
-# 고정 첨부 파일
-FILE_LICENSE = "개설허가증.pdf"
-FILE_SPECIAL_CERT = "특수의료기관지정서.jpg"
-
-# 의사별 면허증 매칭
-DOCTOR_MAP = {
-    "선택안함": None,
-    "김우진": "김우진.pdf",
-    "최윤범": "최윤범.pdf",
-    "안형숙": "안형숙.pdf"
-}
-
-# --- 바로빌 API 설정 ---
-BAROBILL_WSDL_URL = "https://testws.baroservice.com/FAX.asmx?WSDL"
-
-# --- 주소록 데이터 ---
-FAX_BOOK = {
-    "직접 입력": "",
-    "김포시 보건소": "031-5186-4129",
-    "인천 강화군": "032-930-3642",
-    "인천 서구": "032-718-0790",
-    "인천시 중구": "032-760-6018",
-    "인천시 동구": "032-770-5709",
-    "인천시 미추홀구": "032-770-5790",
-    "인천시 옹진군": "032-899-3129",
-    "인천시 부평구": "032-509-8290",
-    "인천시 남동구": "032-453-5079",
-    "인천시 계양구": "032-551-5772",
-    "인천 연수구": "032-749-8049",
-    "파주시": "031-940-4889",
-    "파주 운정": "031-820-7309",
-    "부천시": "0502-4002-4214",
-    "부천시 오정구": "032-625-4359",
-    "안양 동안구": "031-8045-6577",
-    "서울 강서구": "02-2620-0507",
-    "서울 영등포": "02-2670-4877",
-    "서울 구로": "02-860-2653",
-    "서울 종로": "02-2148-5840",
-    "서울 서대문": "02-330-1854",
-    "서울 동대문": "02-3299-2643",
-    "서울 마포구": "02-3153-9159",
-    "서울 중구": "02-3396-8910",
-    "서울 양천구": "02-6948-5571",
-    "서울 강남": "02-3423-8903",
-    "서울 용산구": "02-2199-5830",
-    "서울 성동구": "02-2286-7062",
-    "고양 일산 서구": "031-976-2040",
-    "고양 일산 동구": "031-8075-4885",
-    "고양시 덕양구": "031-968-0217",
-    "군포시": "031-461-5466",
-    "양주시": "0505-041-1924"
-}
+import threading
+from datetime import date, datetime
+from fax_archive import record_filing, regenerate_filing, search_filings
+from fax_assets import PROFILE_COLOR, PROFILE_FAX, warm_up_attachments, warm_up_fonts, warm_up_templates
+from fax_book import DIRECT_INPUT, lookup_fax, org_names, search_orgs
+from fax_broadcast import build_broadcast, send_broadcast
+from fax_documents import (
+    DOCTOR_MAP, PURPOSE_OPTIONS, TEMPLATE_FIX_PATH, TEMPLATE_PATH,
+    build_document, create_cover_preview, get_attachment_paths,
+    make_fix_filename, make_report_filename, set_error_reporter, warm_up_recipient_layouts
+)
+from fax_metrics import configure_metrics_log, metric_tags, stage_summary, start_metrics_server
+from fax_queue import STATUS_DONE, STATUS_FAILED, STATUS_LABELS, enqueue_send, get_job, list_jobs, start_dispatcher
+from fax_scheduler import OFF_PEAK_END, OFF_PEAK_START
+from fax_store import document_path, read_document
+from fax_tracker import (
+    CONFIRM_RESEND_STATES, RESENDABLE_STATES, STATE_DELIVERED, STATE_LABELS, list_statuses, resend, start_tracker
+)
+from fax_transport import check_barobill_health
+from fax_vector import ENGINE_RASTER, ENGINE_VECTOR
+import fax_batch
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+logger = logging.getLogger(__name__)
 
 # --- 팩스 번호 업데이트 콜백 ---
 def update_fax_tab1():
-    if st.session_state.tab1_org in FAX_BOOK:
-        st.session_state.tab1_fax = FAX_BOOK[st.session_state.tab1_org]
+    fax = lookup_fax(st.session_state.tab1_org)
+    if fax is not None:
+        st.session_state.tab1_fax = fax
 
 def update_fax_tab2():
-    if st.session_state.tab2_org in FAX_BOOK:
-        st.session_state.tab2_fax = FAX_BOOK[st.session_state.tab2_org]
-
-def format_recipient_title(org_name):
-    """선택된 수신처를 'OO 보건소장 귀하' 형식으로 변환"""
-    if not org_name or org_name == "직접 입력":
-        return "보건소장 귀하"
-
-    org_name = str(org_name).strip()
-    if org_name.endswith("보건소"):
-        return f"{org_name}장 귀하"
-    return f"{org_name} 보건소장 귀하"
-
-def draw_recipient_title(draw, org_name, clear_box, text_position):
-    """배경의 기존 수신처 문구를 지우고 선택된 수신처명을 입력"""
-    title = format_recipient_title(org_name)
-    draw.rectangle(clear_box, fill="white")
-
-    max_width = clear_box[2] - text_position[0] - 10
-    font = None
-    for font_size in range(RECIPIENT_FONT_SIZE, RECIPIENT_MIN_FONT_SIZE - 1, -1):
-        try:
-            candidate_font = ImageFont.truetype(FONT_PATH, font_size)
-        except Exception:
-            candidate_font = ImageFont.load_default()
-
-        text_box = draw.textbbox((0, 0), title, font=candidate_font)
-        text_width = text_box[2] - text_box[0]
-        font = candidate_font
-        if text_width <= max_width:
-            break
-
-    draw.text(text_position, title, fill="black", font=font)
-
-def add_text_to_image(draw, text, position, font_size=20, color="black"):
-    if not text: return
-    try:
-        font = ImageFont.truetype(FONT_PATH, font_size)
-    except:
-        font = ImageFont.load_default()
-    draw.text(position, str(text), fill=color, font=font)
-
-def create_report_pdf(data):
-    """(탭1) 건강검진 신고서 생성"""
-    try:
-        image = Image.open(TEMPLATE_PATH).convert("RGB")
-        image = image.resize((1240, 1754))
-        draw = ImageDraw.Draw(image)
-
-        # 선택된 수신처 보건소장 문구 적용
-        draw_recipient_title(
-            draw,
-            data.get('receiver_org', ''),
-            REPORT_RECIPIENT_CLEAR_BOX,
-            REPORT_RECIPIENT_TEXT_POS
-        )
-        
-        # 1. 목적 (일시 바로 위)
-        add_text_to_image(draw, data['purpose'], (320, 455))
-
-        # 2. 일시/시간/장소/대상/인원/의사
-        target_date_str = data['checkup_date'].strftime("%Y년 %m월 %d일")
-        add_text_to_image(draw, target_date_str, (320, 490))
-        time_str = f"{data['start_time'].strftime('%H:%M')} ~ {data['end_time'].strftime('%H:%M')}"
-        add_text_to_image(draw, time_str, (320, 530))
-        add_text_to_image(draw, data['location'], (750, 490))
-        add_text_to_image(draw, data['target'], (320, 565))
-        add_text_to_image(draw, f"{data['count']}명", (930, 565))
-        add_text_to_image(draw, data['doctor_name'], (620, 755))
-        
-        # 3. 체크박스 자동화
-        purpose = data['purpose']
-        check_national = False
-        check_other = False
-        
-        if purpose == "출장 일반검진":
-            check_national = True
-        elif purpose == "출장 일반검진+특수검진":
-            check_national = True
-            check_other = True
-        else: # 특수검진 or 보건예방
-            check_other = True
-            
-        if check_national:
-            add_text_to_image(draw, "V", (252, 665), font_size=22, color="red")
-        if check_other:
-            add_text_to_image(draw, "V", (252, 695), font_size=22, color="red")
-
-        # 4. 하단 날짜 (유태전 서명 위)
-        today = datetime.now()
-        add_text_to_image(draw, str(today.year), (870, 1032), font_size=18)
-        add_text_to_image(draw, str(today.month), (980, 1032), font_size=18)
-        add_text_to_image(draw, str(today.day), (1070, 1032), font_size=18)
-
-        pdf_buffer = BytesIO()
-        image.save(pdf_buffer, format="PDF", resolution=150.0)
-        return pdf_buffer.getvalue()
-    except Exception as e:
-        st.error(f"신고서 표지 생성 오류: {e}")
-        return None
-
-def create_fix_pdf(data):
-    """(탭2) 변경/취소 신청서 생성"""
-    try:
-        image = Image.open(TEMPLATE_FIX_PATH).convert("RGB")
-        image = image.resize((1240, 1754))
-        draw = ImageDraw.Draw(image)
-
-        # 선택된 수신처 보건소장 문구 적용
-        draw_recipient_title(
-            draw,
-            data.get('receiver_org', ''),
-            FIX_RECIPIENT_CLEAR_BOX,
-            FIX_RECIPIENT_TEXT_POS
-        )
-        
-        # [체크박스] - 위치 수정하려면 여기 좌표를 변경하세요
-        if data['type'] == 'change':
-            add_text_to_image(draw, "V", (685, 165), font_size=30, color="red")
-        else:
-            add_text_to_image(draw, "V", (685, 218), font_size=30, color="red")
-
-        # [테이블 행 좌표]
-        rows_y = {
-            'date': 700,
-            'place': 775,
-            'target': 845,
-            'count': 905,
-            'staff': 970,
-            'items': 1050,
-            'etc': 1120
-        }
-        
-        col_before_x = 400
-        col_after_x = 850
-        
-        # 일반 항목 입력
-        items = ['date', 'place', 'target', 'count', 'items', 'etc']
-        for item in items:
-            y_pos = rows_y[item]
-            before_val = data.get(f'{item}_before', '')
-            after_val = data.get(f'{item}_after', '')
-            if before_val: add_text_to_image(draw, before_val, (col_before_x, y_pos))
-            if after_val: add_text_to_image(draw, after_val, (col_after_x, y_pos))
-
-        # 수행 인력 (Staff)
-        staff_y = rows_y['staff']
-        if data['staff_before'] and data['staff_before'] != "선택안함":
-             add_text_to_image(draw, data['staff_before'], (col_before_x, staff_y))
-        
-        if data['staff_after'] and data['staff_after'] != "선택안함":
-             add_text_to_image(draw, data['staff_after'], (col_after_x, staff_y))
-
-        # 취소 사유
-        if data['type'] == 'cancel':
-            add_text_to_image(draw, data['cancel_reason'], (300, 1260))
-
-        # [하단 날짜]
-        today = datetime.now()
-        add_text_to_image(draw, str(today.year), (870, 1430), font_size=22)
-        add_text_to_image(draw, str(today.month), (990, 1430), font_size=22)
-        add_text_to_image(draw, str(today.day), (1060, 1430), font_size=22)
-
-        pdf_buffer = BytesIO()
-        image.save(pdf_buffer, format="PDF", resolution=150.0)
-        return pdf_buffer.getvalue()
-    except Exception as e:
-        st.error(f"변경신청서 생성 오류: {e}")
-        return None
-
-def merge_documents_report(cover_pdf_bytes, doctor_name):
-    """(탭1) 신고서용 병합"""
-    merger = PdfWriter()
-    try:
-        merger.append(PdfReader(BytesIO(cover_pdf_bytes)))
-        
-        doc_file = DOCTOR_MAP.get(doctor_name)
-        if doc_file and os.path.exists(doc_file):
-            merger.append(PdfReader(doc_file))
-        
-        if os.path.exists(FILE_LICENSE):
-            merger.append(PdfReader(FILE_LICENSE))
-
-        if os.path.exists(FILE_SPECIAL_CERT):
-            img_pdf_buffer = BytesIO()
-            Image.open(FILE_SPECIAL_CERT).convert('RGB').save(img_pdf_buffer, format="PDF")
-            merger.append(PdfReader(img_pdf_buffer))
-
-        output_buffer = BytesIO()
-        merger.write(output_buffer)
-        return output_buffer.getvalue()
-    except Exception as e:
-        st.error(f"문서 병합 오류: {e}")
-        return None
-
-def merge_documents_fix(cover_pdf_bytes, doctor_name_after):
-    """(탭2) 변경신청서용 병합"""
-    merger = PdfWriter()
-    try:
-        merger.append(PdfReader(BytesIO(cover_pdf_bytes)))
-        
-        if doctor_name_after and doctor_name_after != "선택안함":
-            doc_file = DOCTOR_MAP.get(doctor_name_after)
-            if doc_file and os.path.exists(doc_file):
-                merger.append(PdfReader(doc_file))
-        
-        if os.path.exists(FILE_LICENSE):
-            merger.append(PdfReader(FILE_LICENSE))
-
-        if os.path.exists(FILE_SPECIAL_CERT):
-            img_pdf_buffer = BytesIO()
-            Image.open(FILE_SPECIAL_CERT).convert('RGB').save(img_pdf_buffer, format="PDF")
-            merger.append(PdfReader(img_pdf_buffer))
-        
-        output_buffer = BytesIO()
-        merger.write(output_buffer)
-        return output_buffer.getvalue()
-    except Exception as e:
-        st.error(f"문서 병합 오류(변경신청): {e}")
-        return None
-
-def upload_file_to_ftp(pdf_bytes, filename):
-    """FTP 업로드"""
-    try:
-        ftp_host = st.secrets["BAROBILL_FTP_HOST"]
-        ftp_port = int(st.secrets["BAROBILL_FTP_PORT"])
-        ftp_id = st.secrets["BAROBILL_FTP_ID"]
-        ftp_pwd = st.secrets["BAROBILL_FTP_PWD"]
-        
-        ftp = ftplib.FTP()
-        ftp.connect(ftp_host, ftp_port)
-        
-        # [핵심 수정] 한글 파일명 전송을 위해 인코딩을 CP949(EUC-KR)로 강제 설정
-        ftp.encoding = "cp949"
-        
-        ftp.login(user=ftp_id, passwd=ftp_pwd)
-        ftp.set_pasv(True)
-        ftp.storbinary(f"STOR {filename}", BytesIO(pdf_bytes))
-        ftp.quit()
-        return True, "FTP 업로드 성공"
-    except Exception as e:
-        return False, f"FTP 업로드 실패: {e}"
-
-def send_fax_from_ftp_real(filename, receiver_num, sender_num):
-    """바로빌 전송"""
-    try:
-        if "BAROBILL_CERT_KEY" not in st.secrets:
-            return False, "API 키(Secrets)가 설정되지 않았습니다."
-            
-        cert_key = st.secrets["BAROBILL_CERT_KEY"]
-        corp_num = st.secrets["BAROBILL_CORP_NUM"]
-        sender_id = st.secrets["BAROBILL_ID"]
-
-        client = Client(BAROBILL_WSDL_URL)
-        
-        result = client.service.SendFaxFromFTP(
-            CERTKEY=cert_key,
-            CorpNum=corp_num,
-            SenderID=sender_id,
-            FileName=filename,
-            FromNumber=sender_num.replace("-", ""),
-            ToNumber=receiver_num.replace("-", ""),
-            ReceiveCorp="보건소",
-            ReceiveName="담당자",
-            SendDT="",
-            RefKey=""
-        )
-        
-        try:
-            if int(result) < 0:
-                return False, f"전송 실패 (에러코드: {result})"
-        except ValueError:
-            pass
-            
-        return True, f"전송 접수 완료 (접수번호: {result})"
+    fax = lookup_fax(st.session_state.tab2_org)
+    if fax is not None:
+        st.session_state.tab2_fax = fax
+
+# --- 수신처 검색 ---
+def select_org(tab, on_change):
+    """이름/초성으로 좁혀서 수신처 선택 (검색어가 없으면 전체 목록)"""
+    query = st.text_input("수신처 검색 (이름 또는 초성, 예: ㄱㅍ)", key=f"{tab}_org_query")
+    options = org_names()
+    if query:
+        options = [DIRECT_INPUT, *search_orgs(query)]
+        # 검색 결과에 없는 기존 선택은 유지 (선택이 초기화되지 않도록)
+        current = st.session_state.get(f"{tab}_org")
+        if current and current not in options:
+            options.append(current)
+    return st.selectbox("수신처(보건소)", options, key=f"{tab}_org", on_change=on_change)
+
+# 출력 형식 선택지 (팩스망은 어차피 흑백이므로 팩스용 흑백을 기본으로)
+OUTPUT_PROFILE_LABELS = {
+    "팩스용 흑백 (권장)": PROFILE_FAX,
+    "컬러": PROFILE_COLOR
+}
 
-    except Exception as e:
-        return False, f"API 통신 오류: {str(e)}"
+# 표지 생성 방식 선택지
+COVER_ENGINE_LABELS = {
+    "이미지 (기존 방식)": ENGINE_RASTER,
+    "벡터 글자 (빠르고 선명)": ENGINE_VECTOR
+}
+
+# --- 전송 상태 표시 (2초마다 갱신) ---
+@st.fragment(run_every=2)
+def show_job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return
+    label = f"[작업 #{job['id']}] {job['filename']} → {job['receiver']}: {STATUS_LABELS[job['status']]}"
+    if job['status'] == STATUS_DONE:
+        st.success(f"{label} - {job['message']}")
+    elif job['status'] == STATUS_FAILED:
+        st.error(f"{label} - {job['message']}")
+    else:
+        st.info(f"{label} {job['message']}")
+
+def build_tab_document(tab, doc):
+    """탭 태그를 붙여 최종 PDF 생성 → 문서 ID (다운로드 버튼은 별도 스레드에서 호출)"""
+    with metric_tags(tab=tab):
+        return build_document(*doc)
+
+def archive_tab_filing(tab, doc, doc_id, meta, job_id):
+    """대기열에 넣은 문서를 전송 기록에 남김 (접수번호/상태는 전송 후 갱신)"""
+    kind, data, profile, engine = doc
+    record_filing(kind, data, doc_id, meta['filename'], meta['receiver'], meta['sender'], profile, engine,
+                  tab=tab, job_id=job_id, receiver_org=meta['org'])
+
+# --- 여러 보건소 동시 발송 ---
+def select_broadcast_recipients(tab):
+    """동시 발송할 보건소 선택 → [(기관명, 팩스번호), ...]"""
+    orgs = st.multiselect("수신처(보건소) 여러 곳", org_names(dialable_only=True), key=f"{tab}_orgs")
+    return [(org, lookup_fax(org)) for org in orgs if lookup_fax(org)]
+
+def run_broadcast(tab, doc, meta):
+    """수신처별 표지로 문서를 만들어 수신처마다 전송 대기열에 등록 → 수신처별 작업 번호"""
+    kind, data, profile, engine = doc
+    with st.spinner("문서 생성 중..."), metric_tags(tab=tab):
+        groups = build_broadcast(kind, data, meta['recipients'], meta['filename'], profile, engine)
+        return send_broadcast(groups, meta['sender'], tab=tab)
+
+@st.fragment(run_every=2)
+def show_broadcast_results(results):
+    jobs = {result['job_id']: get_job(result['job_id']) for result in results if result['job_id']}
+    done = sum(1 for job in jobs.values() if job and job['status'] == STATUS_DONE)
+    failed = len(results) - len(jobs) + sum(1 for job in jobs.values() if job and job['status'] == STATUS_FAILED)
+    text = f"동시 발송 접수 {done}/{len(results)}곳" + (f", 실패 {failed}곳" if failed else "")
+    (st.success if done == len(results) else st.warning if failed else st.info)(text)
+    rows = []
+    for result in results:
+        job = jobs.get(result['job_id'])
+        rows.append({
+            '수신처': result['org'],
+            '팩스번호': result['receiver'],
+            '작업': f"#{result['job_id']}" if result['job_id'] else "",
+            '파일명': job['filename'] if job else result['filename'],
+            '결과': STATUS_LABELS[job['status']] if job else "실패",
+            '메시지': job['message'] if job else result['message'],
+        })
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+@st.fragment(run_every=5)
+def show_recent_jobs():
+    jobs = list_jobs(limit=10)
+    if not jobs:
+        st.caption("전송 기록이 없습니다.")
+        return
+    for job in jobs:
+        st.caption(f"#{job['id']} {job['created_at'][5:16]} {job['receiver_org'] or job['receiver']} · {STATUS_LABELS[job['status']]}")
+
+# --- 전달 결과 (15초마다 갱신, 실패 건은 바로 재전송) ---
+@st.fragment(run_every=15)
+def show_delivery_status():
+    statuses = list_statuses(limit=10)
+    if not statuses:
+        st.caption("추적 중인 팩스가 없습니다.")
+        return
+    for status in statuses:
+        icon = "✅" if status['state'] == STATE_DELIVERED else "⚠️" if status['state'] in RESENDABLE_STATES else "⏳"
+        pages = f" ({status['pages']}쪽)" if status['pages'] else ""
+        st.caption(f"{icon} {status['submitted_at'][5:16]} {status['receiver_org'] or status['receiver']} · "
+                   f"{STATE_LABELS[status['state']]}{pages}")
+        if status['state'] in RESENDABLE_STATES:
+            confirmed = True
+            if status['state'] in CONFIRM_RESEND_STATES:
+                code = f" (결과 코드 {status['result_code']})" if status['result_code'] else ""
+                st.warning(f"전달됐을 수 있습니다{code}. 바로빌에서 전달 여부를 확인한 뒤 다시 보내세요.")
+                confirmed = st.checkbox("바로빌에서 전달되지 않은 것을 확인함", key=f"resend_ok_{status['receipt']}")
+            if st.button("↻ 다시 보내기", key=f"resend_{status['receipt']}", disabled=not confirmed):
+                ok, msg = resend(status['receipt'], confirmed=confirmed)
+                (st.success if ok else st.error)(msg)
+
+# --- 단계별 소요 시간 (최근 1시간, 10초마다 갱신) ---
+@st.fragment(run_every=10)
+def show_stage_timings():
+    rows = stage_summary()
+    if not rows:
+        st.caption("측정 기록이 없습니다.")
+        return
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+# --- 프로세스 공용 자원 (재실행/세션과 관계없이 프로세스당 한 번) ---
+def warm_up_assets():
+    """폰트/배경/첨부 묶음/수신처 문구 미리 로드"""
+    warm_up_fonts()
+    warm_up_templates([TEMPLATE_PATH, TEMPLATE_FIX_PATH])
+    warm_up_attachments(get_attachment_paths(name) for name in DOCTOR_MAP)
+    warm_up_recipient_layouts(org_names())
+
+@st.cache_resource
+def start_services():
+    """백그라운드 전송 워커, 전달 결과 조회, 지표 로그/엔드포인트 시작
+
+    미리 로드는 별도 스레드에서 하므로 첫 화면이 기다리지 않는다.
+    """
+    start_dispatcher()
+    start_tracker()
+    configure_metrics_log()
+    start_metrics_server()
+    warm_up_thread = threading.Thread(target=warm_up_assets, name="fax-warm-up", daemon=True)
+    warm_up_thread.start()
+    return warm_up_thread
 
 # --- UI 메인 ---
 st.set_page_config(page_title="출장검진 팩스 시스템", layout="wide")
 st.title("🏥 뉴고려병원 출장검진 팩스 시스템")
 
+# 문서 생성/병합 오류는 화면에 표시
+# (전송 대기열 스레드나 다운로드 콜백처럼 화면 실행 밖에서 난 오류는 st.error가 표시되지 않으므로 로그로)
+def report_document_error(message):
+    if get_script_run_ctx(suppress_warning=True) is None:
+        logger.error(message)
+    else:
+        st.error(message)
+
+set_error_reporter(report_document_error)
+
+start_services()
+
+# 표지 생성 방식, 바로빌 연결 상태 확인 및 최근 전송 현황
+with st.sidebar:
+    cover_engine = COVER_ENGINE_LABELS[st.selectbox("표지 생성 방식", list(COVER_ENGINE_LABELS), key="cover_engine")]
+    if st.button("🔌 바로빌 연결 확인", key="btn_health"):
+        healthy, health_msg = check_barobill_health()
+        (st.success if healthy else st.error)(health_msg)
+    st.markdown("#### 📨 최근 전송 현황")
+    show_recent_jobs()
+    with st.expander("📬 전달 결과"):
+        show_delivery_status()
+    with st.expander("⏱ 단계별 소요 시간"):
+        show_stage_timings()
+
 # Session State 초기화
-if 't1_pdf' not in st.session_state: st.session_state['t1_pdf'] = None
+if 't1_doc' not in st.session_state: st.session_state['t1_doc'] = None
 if 't1_meta' not in st.session_state: st.session_state['t1_meta'] = {}
-if 't2_pdf' not in st.session_state: st.session_state['t2_pdf'] = None
+if 't1_job' not in st.session_state: st.session_state['t1_job'] = None
+if 't1_broadcast' not in st.session_state: st.session_state['t1_broadcast'] = None
+if 't2_doc' not in st.session_state: st.session_state['t2_doc'] = None
 if 't2_meta' not in st.session_state: st.session_state['t2_meta'] = {}
+if 't2_job' not in st.session_state: st.session_state['t2_job'] = None
+if 't2_broadcast' not in st.session_state: st.session_state['t2_broadcast'] = None
 
 # 팩스번호 상태 초기화
 if 'tab1_fax' not in st.session_state: st.session_state.tab1_fax = ""
 if 'tab2_fax' not in st.session_state: st.session_state.tab2_fax = ""
 
-tab1, tab2 = st.tabs(["📑 출장검진 신고서", "📝 변경/취소 신청서"])
+if 't3_jobs' not in st.session_state: st.session_state['t3_jobs'] = []
+if 't3_stats' not in st.session_state: st.session_state['t3_stats'] = None
+
+tab1, tab2, tab3, tab4 = st.tabs(["📑 출장검진 신고서", "📝 변경/취소 신청서", "📦 일괄 생성", "🗂️ 전송 기록"])
 
 # 탭 1 (일반 버튼 사용, on_change 적용)
-with tab1:
+# 탭마다 fragment로 분리해서 입력할 때 그 탭만 다시 실행
+@st.fragment
+def report_tab(cover_engine):
     st.subheader("1. 신고서 내용 작성")
     
-    purpose_options = [
-        "출장 일반검진+특수검진", 
-        "출장 일반검진", 
-        "출장 특수검진", 
-        "보건예방사업검진(초음파,골밀도,맥파,심전도)"
-    ]
-    purpose = st.selectbox("검진 목적", purpose_options)
+    purpose = st.selectbox("검진 목적", PURPOSE_OPTIONS)
 
     c1, c2 = st.columns(2)
     with c1:
@@ -401,12 +251,20 @@ with tab1:
 
     st.markdown("---")
     st.subheader("2. 발송 정보")
-    rc1, rc2 = st.columns(2)
-    with rc1:
-        selected_org = st.selectbox("수신처(보건소)", list(FAX_BOOK.keys()), key="tab1_org", on_change=update_fax_tab1)
-    with rc2:
-        receiver_fax = st.text_input("수신 팩스번호", key="tab1_fax")
+    broadcast_1 = st.toggle("여러 보건소에 동시 발송", key="tab1_broadcast")
+    if broadcast_1:
+        recipients_1 = select_broadcast_recipients("tab1")
+        selected_org = recipients_1[0][0] if recipients_1 else ""
+        receiver_fax = ", ".join(fax for _, fax in recipients_1)
+    else:
+        recipients_1 = None
+        rc1, rc2 = st.columns(2)
+        with rc1:
+            selected_org = select_org("tab1", update_fax_tab1)
+        with rc2:
+            receiver_fax = st.text_input("수신 팩스번호", key="tab1_fax")
     sender_fax = st.text_input("발신 팩스번호", "031-987-7777", key="tab1_sender")
+    profile = OUTPUT_PROFILE_LABELS[st.radio("출력 형식", list(OUTPUT_PROFILE_LABELS), horizontal=True, key="tab1_profile")]
     
     submit_preview = st.button("1단계: 문서 생성 및 미리보기", key="btn_preview_1")
 
@@ -420,52 +278,63 @@ with tab1:
                 'start_time': start_time, 'end_time': end_time,
                 'location': location, 'target': target,
                 'count': count, 'doctor_name': doctor_name,
-                'receiver_org': selected_org
+                'receiver_org': selected_org,
+                'issue_date': date.today()
             }
-            cover_bytes = create_report_pdf(data)
-            if cover_bytes:
-                merged_bytes = merge_documents_report(cover_bytes, doctor_name)
-                if merged_bytes:
-                    target_name = data['target'].replace(" ", "_") if data['target'] else "Unknown"
-                    filename = f"{target_name}_출장신고서_{datetime.now().strftime('%Y%m%d')}.pdf"
-                    
-                    st.session_state['t1_pdf'] = merged_bytes
-                    st.session_state['t1_meta'] = {
-                        'receiver': receiver_fax,
-                        'sender': sender_fax,
-                        'filename': filename
-                    }
-                    st.success("문서가 생성되었습니다. 아래에서 내용을 확인하고 전송하세요.")
-    
-    if st.session_state['t1_pdf']:
+            # 미리보기는 표지만 축소 이미지로 그리고, 첨부 병합은 다운로드/전송 시점으로 미룸
+            with metric_tags(tab="tab1"):
+                preview_ok = create_cover_preview('report', data)
+            if preview_ok:
+                st.session_state['t1_broadcast'] = None
+                st.session_state['t1_doc'] = ('report', data, profile, cover_engine)
+                st.session_state['t1_meta'] = {
+                    'receiver': receiver_fax,
+                    'sender': sender_fax,
+                    'org': selected_org,
+                    'recipients': recipients_1,
+                    'filename': make_report_filename(data['target'])
+                }
+
+    if st.session_state['t1_doc']:
         st.markdown("### 3. 미리보기 및 전송")
+        st.image(create_cover_preview(*st.session_state['t1_doc'][:2]), caption="표지 미리보기 (첨부 제외)")
         col_view, col_send = st.columns([1, 1])
         with col_view:
             st.download_button(
-                label="📥 생성된 PDF 다운로드 (미리보기)",
-                data=st.session_state['t1_pdf'],
+                label="📥 전체 PDF 다운로드 (첨부 포함)",
+                data=lambda doc=st.session_state['t1_doc']: read_document(build_tab_document("tab1", doc)) or b"",
                 file_name=st.session_state['t1_meta']['filename'],
                 mime="application/pdf",
                 use_container_width=True
             )
         with col_send:
-            if st.button("🚀 팩스 전송하기 (최종)", key="send_btn_tab1", use_container_width=True):
+            recipients = st.session_state['t1_meta'].get('recipients')
+            if recipients:
+                if st.button(f"🚀 {len(recipients)}곳 동시 전송하기 (최종)", key="broadcast_btn_tab1", use_container_width=True):
+                    st.session_state['t1_broadcast'] = run_broadcast(
+                        "tab1", st.session_state['t1_doc'], st.session_state['t1_meta']
+                    )
+            elif st.button("🚀 팩스 전송하기 (최종)", key="send_btn_tab1", use_container_width=True):
                 meta = st.session_state['t1_meta']
-                pdf_bytes = st.session_state['t1_pdf']
-                with st.spinner(f"전송 진행 중... ({meta['filename']})"):
-                    ftp_success, ftp_msg = upload_file_to_ftp(pdf_bytes, meta['filename'])
-                    if ftp_success:
-                        success, msg = send_fax_from_ftp_real(meta['filename'], meta['receiver'], meta['sender'])
-                        if success:
-                            st.balloons()
-                            st.success(msg)
-                        else:
-                            st.error(msg)
-                    else:
-                        st.error(ftp_msg)
+                doc_id = build_tab_document("tab1", st.session_state['t1_doc'])
+                merged_path = document_path(doc_id)
+                if merged_path:
+                    st.session_state['t1_job'] = enqueue_send(
+                        merged_path, meta['filename'], meta['receiver'], meta['sender'],
+                        tab="tab1", receiver_org=meta['org'], doctor=st.session_state['t1_doc'][1]['doctor_name']
+                    )
+                    archive_tab_filing("tab1", st.session_state['t1_doc'], doc_id, meta, st.session_state['t1_job'])
+        if st.session_state['t1_broadcast']:
+            show_broadcast_results(st.session_state['t1_broadcast'])
+        elif st.session_state['t1_job']:
+            show_job_status(st.session_state['t1_job'])
+
+with tab1:
+    report_tab(cover_engine)
 
 # 탭 2 (일반 버튼 사용, on_change 적용)
-with tab2:
+@st.fragment
+def fix_tab(cover_engine):
     st.info("💡 변경 사항이 있는 항목만 입력하세요.")
     
     apply_type = st.radio("신청 구분", ["변경 신청", "취소 신청"], horizontal=True)
@@ -509,12 +378,20 @@ with tab2:
     cancel_reason = st.text_area("취소 사유 (취소 신청 시 작성)")
 
     st.subheader("발송 정보")
-    fc1, fc2 = st.columns(2)
-    with fc1:
-        fix_org = st.selectbox("수신처(보건소)", list(FAX_BOOK.keys()), key="tab2_org", on_change=update_fax_tab2)
-    with fc2:
-        fix_fax = st.text_input("수신 팩스번호", key="tab2_fax")
+    broadcast_2 = st.toggle("여러 보건소에 동시 발송", key="tab2_broadcast")
+    if broadcast_2:
+        recipients_2 = select_broadcast_recipients("tab2")
+        fix_org = recipients_2[0][0] if recipients_2 else ""
+        fix_fax = ", ".join(fax for _, fax in recipients_2)
+    else:
+        recipients_2 = None
+        fc1, fc2 = st.columns(2)
+        with fc1:
+            fix_org = select_org("tab2", update_fax_tab2)
+        with fc2:
+            fix_fax = st.text_input("수신 팩스번호", key="tab2_fax")
     fix_sender = st.text_input("발신 팩스번호", "031-987-7777", key="tab2_sender")
+    fix_profile = OUTPUT_PROFILE_LABELS[st.radio("출력 형식", list(OUTPUT_PROFILE_LABELS), horizontal=True, key="tab2_profile")]
 
     submit_fix_preview = st.button("1단계: 문서 생성 및 미리보기", key="btn_preview_2")
 
@@ -532,48 +409,151 @@ with tab2:
                 'items_before': items_before, 'items_after': items_after,
                 'etc_before': etc_before, 'etc_after': etc_after,
                 'cancel_reason': cancel_reason,
-                'receiver_org': fix_org
+                'receiver_org': fix_org,
+                'issue_date': date.today()
             }
             
-            fix_pdf_bytes = create_fix_pdf(fix_data)
-            
-            if fix_pdf_bytes:
-                merged_bytes = merge_documents_fix(fix_pdf_bytes, staff_after)
-                if merged_bytes:
-                    target_name = fix_data['target_before'].replace(" ", "_") if fix_data['target_before'] else "Unknown"
-                    filename = f"{target_name}_변경취소신청서_{datetime.now().strftime('%Y%m%d')}.pdf"
-
-                    st.session_state['t2_pdf'] = merged_bytes
-                    st.session_state['t2_meta'] = {
-                        'receiver': fix_fax,
-                        'sender': fix_sender,
-                        'filename': filename
-                    }
-                    st.success("문서가 생성되었습니다. 아래에서 내용을 확인하고 전송하세요.")
-
-    if st.session_state['t2_pdf']:
+            with metric_tags(tab="tab2"):
+                preview_ok = create_cover_preview('fix', fix_data)
+            if preview_ok:
+                st.session_state['t2_broadcast'] = None
+                st.session_state['t2_doc'] = ('fix', fix_data, fix_profile, cover_engine)
+                st.session_state['t2_meta'] = {
+                    'receiver': fix_fax,
+                    'sender': fix_sender,
+                    'org': fix_org,
+                    'recipients': recipients_2,
+                    'filename': make_fix_filename(fix_data['target_before'])
+                }
+
+    if st.session_state['t2_doc']:
         st.markdown("### 3. 미리보기 및 전송")
+        st.image(create_cover_preview(*st.session_state['t2_doc'][:2]), caption="표지 미리보기 (첨부 제외)")
         col_view2, col_send2 = st.columns([1, 1])
         with col_view2:
             st.download_button(
-                label="📥 생성된 PDF 다운로드 (미리보기)",
-                data=st.session_state['t2_pdf'],
+                label="📥 전체 PDF 다운로드 (첨부 포함)",
+                data=lambda doc=st.session_state['t2_doc']: read_document(build_tab_document("tab2", doc)) or b"",
                 file_name=st.session_state['t2_meta']['filename'],
                 mime="application/pdf",
                 use_container_width=True
             )
         with col_send2:
-            if st.button("🚀 팩스 전송하기 (최종)", key="send_btn_tab2", use_container_width=True):
+            recipients = st.session_state['t2_meta'].get('recipients')
+            if recipients:
+                if st.button(f"🚀 {len(recipients)}곳 동시 전송하기 (최종)", key="broadcast_btn_tab2", use_container_width=True):
+                    st.session_state['t2_broadcast'] = run_broadcast(
+                        "tab2", st.session_state['t2_doc'], st.session_state['t2_meta']
+                    )
+            elif st.button("🚀 팩스 전송하기 (최종)", key="send_btn_tab2", use_container_width=True):
                 meta = st.session_state['t2_meta']
-                pdf_bytes = st.session_state['t2_pdf']
-                with st.spinner(f"전송 진행 중... ({meta['filename']})"):
-                    ftp_success, ftp_msg = upload_file_to_ftp(pdf_bytes, meta['filename'])
-                    if ftp_success:
-                        success, msg = send_fax_from_ftp_real(meta['filename'], meta['receiver'], meta['sender'])
-                        if success:
-                            st.balloons()
-                            st.success(msg)
-                        else:
-                            st.error(msg)
-                    else:
-                        st.error(ftp_msg)
+                doc_id = build_tab_document("tab2", st.session_state['t2_doc'])
+                merged_path = document_path(doc_id)
+                if merged_path:
+                    st.session_state['t2_job'] = enqueue_send(
+                        merged_path, meta['filename'], meta['receiver'], meta['sender'],
+                        tab="tab2", receiver_org=meta['org'], doctor=st.session_state['t2_doc'][1]['staff_after']
+                    )
+                    archive_tab_filing("tab2", st.session_state['t2_doc'], doc_id, meta, st.session_state['t2_job'])
+        if st.session_state['t2_broadcast']:
+            show_broadcast_results(st.session_state['t2_broadcast'])
+        elif st.session_state['t2_job']:
+            show_job_status(st.session_state['t2_job'])
+
+with tab2:
+    fix_tab(cover_engine)
+
+# 탭 3 (일정 파일로 신고서 일괄 생성/전송)
+@st.fragment(run_every=5)
+def show_batch_table(jobs):
+    # 전송 대기열에 넣은 건은 작업 상태를 반영
+    fax_batch.sync_job_results(jobs)
+    st.dataframe(fax_batch.job_table(jobs), use_container_width=True, hide_index=True)
+
+@st.fragment
+def batch_tab(cover_engine):
+    st.info("💡 한 행에 한 건씩 적은 일정 파일(CSV/Excel)을 올리면 출장검진 신고서를 한꺼번에 만듭니다.")
+    st.caption(
+        "필수 열: " + ", ".join(names[0] for names in fax_batch.SCHEDULE_COLUMNS.values())
+        + " / 선택 열: " + ", ".join(names[0] for names in fax_batch.OPTIONAL_COLUMNS.values())
+    )
+
+    schedule_file = st.file_uploader("일정 파일", type=["csv", "xlsx"], key="t3_file")
+    workers = st.number_input("생성 워커 수", min_value=1, max_value=os.cpu_count() or 1,
+                              value=fax_batch.DEFAULT_WORKERS, key="t3_workers")
+    batch_profile = OUTPUT_PROFILE_LABELS[st.radio("출력 형식", list(OUTPUT_PROFILE_LABELS), horizontal=True, key="tab3_profile")]
+
+    if st.button("1단계: 일괄 생성", key="btn_batch_render"):
+        if schedule_file is None:
+            st.warning("일정 파일을 선택하세요.")
+        else:
+            try:
+                jobs = fax_batch.build_jobs(fax_batch.load_schedule(schedule_file, schedule_file.name))
+            except Exception as e:
+                st.error(f"일정 파일 읽기 오류: {e}")
+            else:
+                with st.spinner(f"{len(jobs)}건 생성 중..."):
+                    st.session_state['t3_stats'] = fax_batch.render_jobs(jobs, workers=int(workers), profile=batch_profile, engine=cover_engine)
+                st.session_state['t3_jobs'] = jobs
+
+    jobs = st.session_state['t3_jobs']
+    if jobs:
+        stats = st.session_state['t3_stats']
+        m1, m2, m3 = st.columns(3)
+        m1.metric("생성", f"{stats['rendered']} / {len(jobs)}건")
+        m2.metric("소요 시간", f"{stats['seconds']:.2f}초")
+        m3.metric("처리량", f"{stats['docs_per_second']:.2f}건/초", help=f"워커 {stats['workers']}개")
+
+        show_batch_table(jobs)
+
+        ready = [job for job in jobs if job['doc_id'] and not job['job_id']]
+        if ready:
+            off_peak = st.checkbox(
+                f"🌙 야간 예약 전송 ({OFF_PEAK_START}시~{OFF_PEAK_END}시, 급하지 않은 신고서)", key="t3_off_peak",
+                help="바로빌 예약 전송으로 야간에 나눠서 보냅니다. 같은 보건소로 가는 건은 간격을 두고 보냅니다."
+            )
+            if st.button(f"🚀 {len(ready)}건 팩스 전송하기 (최종)", key="send_btn_tab3"):
+                fax_batch.send_jobs(ready, urgent=not off_peak)
+                st.rerun(scope="fragment")
+
+with tab3:
+    batch_tab(cover_engine)
+
+# 탭 4 (보낸 문서 기록 검색, 필요할 때 같은 문서를 다시 만들어 내려받기)
+@st.fragment
+def archive_tab():
+    col_query, col_from, col_to = st.columns([2, 1, 1])
+    query = col_query.text_input("대상/장소/수신처 검색", key="t4_query")
+    date_from = col_from.date_input("작성일 시작", value=None, key="t4_from")
+    date_to = col_to.date_input("작성일 끝", value=None, key="t4_to")
+
+    filings = search_filings(query, date_from, date_to)
+    if not filings:
+        st.caption("전송 기록이 없습니다.")
+        return
+    labels = {**STATUS_LABELS, **STATE_LABELS}
+    st.dataframe([
+        {
+            '번호': filing['id'],
+            '작성일': filing['issue_date'],
+            '대상': filing['target'],
+            '장소': filing['location'],
+            '수신처': filing['receiver_org'] or filing['receiver'],
+            '파일명': filing['filename'],
+            '접수번호': filing['receipt'] or "",
+            '상태': labels.get(filing['status'], filing['status']),
+        }
+        for filing in filings
+    ], hide_index=True, use_container_width=True)
+
+    filing_id = st.selectbox("다시 만들 기록", [filing['id'] for filing in filings], key="t4_filing")
+    if st.button("📄 문서 다시 만들기", key="t4_regenerate"):
+        ok, msg, doc_id = regenerate_filing(filing_id)
+        (st.success if ok else st.warning)(msg)
+        if doc_id:
+            filename = next(filing['filename'] for filing in filings if filing['id'] == filing_id)
+            st.download_button("📥 PDF 다운로드", data=read_document(doc_id) or b"", file_name=filename,
+                               mime="application/pdf", key="t4_download")
+
+with tab4:
+    archive_tab()
@@ -0,0 +1,25 @@
+"""테스트 공통 설정: 저장소 최상위 모듈 import, 임시 폴더 DB 사용"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fax_archive  # noqa: E402
+import fax_queue  # noqa: E402
+import fax_tracker  # noqa: E402
+import fax_transport  # noqa: E402
+
+
+@pytest.fixture
+def local_data(tmp_path, monkeypatch):
+    """대기열/추적/기록/업로드 색인 DB를 임시 폴더로 (fax_api --local-stubs와 같은 구성)"""
+    monkeypatch.setattr(fax_queue, "QUEUE_DB_PATH", str(tmp_path / "fax_queue.sqlite3"))
+    monkeypatch.setattr(fax_tracker, "TRACKER_DB_PATH", str(tmp_path / "fax_status.sqlite3"))
+    monkeypatch.setattr(fax_archive, "ARCHIVE_DB_PATH", str(tmp_path / "fax_archive.sqlite3"))
+    monkeypatch.setattr(fax_transport, "UPLOAD_INDEX_PATH", str(tmp_path / "fax_uploads.sqlite3"))
+    for module in (fax_queue, fax_tracker, fax_archive):
+        monkeypatch.setattr(module, "_initialized", False)
+    monkeypatch.setattr(fax_transport, "_index_initialized", False)
+    return tmp_path
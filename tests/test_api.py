@@ -0,0 +1,136 @@
+"""HTTP API 요청 검증 (fax_api --local-stubs로 띄운 서버에 요청)"""
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+for package in ("PIL", "pypdf", "reportlab", "requests", "zeep", "pyftpdlib"):
+    pytest.importorskip(package)
+
+import fax_api  # noqa: E402
+from fax_api import API_MAX_BODY, ApiError, parse_filename  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+START_TIMEOUT = 60
+
+REPORT = {
+    'purpose': "출장 일반검진+특수검진", 'checkup_date': "2026-03-02",
+    'start_time': "07:30", 'end_time': "12:00", 'location': "경기도 김포시 대곶면 대명항로 123",
+    'target': "가나상사", 'count': 50, 'doctor_name': "김우진",
+    'receiver_org': "김포시 보건소", 'receiver_fax': "031-000-0000",
+}
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", None),
+    ("가나상사_출장검진", "가나상사_출장검진.pdf"),
+    ("report (2).PDF", "report (2).PDF"),
+])
+def test_parse_filename(value, expected):
+    assert parse_filename(value) == expected
+
+
+@pytest.mark.parametrize("value", [
+    "../report.pdf", "a/b.pdf", "a\\b.pdf", ".hidden.pdf", "a;b.pdf", "a\nb.pdf", "x" * 200, 123, "😀.pdf",
+])
+def test_parse_filename_rejects(value):
+    with pytest.raises(ApiError) as e:
+        parse_filename(value)
+    assert e.value.status == 400
+
+
+@pytest.fixture(scope="module")
+def api_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "fax_api.py", "--local-stubs", "--port", str(port), "--workers", "1"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.time() + START_TIMEOUT
+        while True:
+            try:
+                if _request(port, "GET", "/health")[0] == 200:
+                    break
+            except OSError:
+                pass
+            if process.poll() is not None or time.time() > deadline:
+                pytest.fail("fax_api --local-stubs 서버가 시작되지 않았습니다.")
+            time.sleep(0.5)
+        yield port
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _request(port, method, path, body=None, content_length=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=fax_api.API_REQUEST_TIMEOUT + 10)
+    try:
+        conn.putrequest(method, path)
+        if body is not None or content_length is not None:
+            conn.putheader("Content-Type", "application/json")
+            conn.putheader("Content-Length", content_length if content_length is not None else str(len(body)))
+        conn.endheaders()
+        if body is not None:
+            conn.send(body)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+
+
+def _send(port, payload):
+    return _request(port, "POST", "/send", json.dumps(payload).encode("utf-8"))
+
+
+@pytest.mark.parametrize("payload", [
+    {'kind': "report"},
+    {'kind': "letter", 'data': REPORT},
+    {'kind': "report", 'data': {**REPORT, 'doctor_name': "홍길동"}},
+    {'kind': "report", 'data': {**REPORT, 'checkup_date': "내일"}},
+    {'kind': "report", 'data': REPORT, 'profile': "neon"},
+    {'kind': "report", 'data': REPORT, 'filename': "../../etc/passwd"},
+    {'kind': "report", 'data': REPORT, 'filename': "a/b.pdf"},
+])
+def test_send_rejects_invalid_request(api_port, payload):
+    status, body = _send(api_port, payload)
+    assert status == 400
+    assert body['error']
+
+
+@pytest.mark.parametrize("content_length, expected", [
+    ("abc", 400),
+    ("-1", 400),
+    (str(API_MAX_BODY + 1), 413),
+])
+def test_send_rejects_bad_content_length(api_port, content_length, expected):
+    assert _request(api_port, "POST", "/send", content_length=content_length)[0] == expected
+
+
+def test_send_rejects_malformed_json(api_port):
+    assert _request(api_port, "POST", "/send", b"{not json")[0] == 400
+    assert _request(api_port, "POST", "/send", b"[1, 2]")[0] == 400
+
+
+def test_send_enqueues_job(api_port):
+    status, body = _send(api_port, {'kind': "report", 'data': REPORT, 'filename': "가나상사_출장검진"})
+    assert status == 202
+    assert body['filename'] == "가나상사_출장검진.pdf"
+    assert body['receiver'] == REPORT['receiver_fax']
+
+    status, job = _request(api_port, "GET", body['job'])
+    assert status == 200
+    assert job['id'] == body['job_id']
@@ -0,0 +1,121 @@
+"""전송 대기열: 작업 가져오기와 중단된 작업 복구"""
+import time
+
+import fax_queue
+from fax_queue import (
+    STATUS_FAILED, STATUS_QUEUED, STATUS_RETRY, STATUS_SENDING, STATUS_UPLOADING,
+    UNKNOWN_OUTCOME_MESSAGE, enqueue_send, get_job
+)
+from fax_tracker import STATE_UNKNOWN, get_status
+
+PDF = b"%PDF-1.4 test"
+
+
+def _enqueue(receiver, urgent=True):
+    return enqueue_send(PDF, f"{receiver}.pdf", receiver, "031-987-7777", tab="test", urgent=urgent)
+
+
+def _claim(job_ids=None):
+    conn = fax_queue._connect()
+    try:
+        row = fax_queue._claim_job(conn, job_ids)
+    finally:
+        conn.close()
+    return row['id'] if row else None
+
+
+def _set(job_id, **fields):
+    conn = fax_queue._connect()
+    try:
+        fax_queue._update_job(conn, job_id, **fields)
+    finally:
+        conn.close()
+
+
+def _recover():
+    conn = fax_queue._connect()
+    try:
+        return fax_queue._recover_stale_jobs(conn)
+    finally:
+        conn.close()
+
+
+def test_claim_takes_urgent_first_and_one_per_receiver(local_data):
+    later = _enqueue("031-111-1111", urgent=False)
+    urgent = _enqueue("031-111-1111")
+    other = _enqueue("031-222-2222")
+
+    assert _claim() == urgent
+    assert _claim() == other
+    # 같은 수신번호 작업이 처리 중이면 건너뜀
+    assert _claim() is None
+
+    job = get_job(urgent)
+    assert job['status'] == STATUS_UPLOADING
+    assert job['attempts'] == 1
+    assert get_job(later)['status'] == STATUS_QUEUED
+
+
+def test_claim_respects_total_concurrency(local_data, monkeypatch):
+    monkeypatch.setattr(fax_queue, "SEND_CONCURRENCY", 2)
+    jobs = [_enqueue(f"031-000-000{i}") for i in range(3)]
+
+    assert [_claim(), _claim(), _claim()] == [jobs[0], jobs[1], None]
+
+
+def test_claim_only_given_jobs(local_data):
+    _enqueue("031-111-1111")
+    mine = _enqueue("031-222-2222")
+
+    assert _claim([mine]) == mine
+    assert _claim([mine]) is None
+
+
+def test_claim_skips_retry_until_due(local_data):
+    job_id = _enqueue("031-111-1111")
+    _set(job_id, status=STATUS_RETRY, next_attempt_at=time.time() + 60)
+    assert _claim() is None
+
+    _set(job_id, next_attempt_at=0)
+    assert _claim() == job_id
+
+
+def test_recover_stale_jobs(local_data):
+    uploading = _enqueue("031-111-1111")
+    sending = _enqueue("031-222-2222")
+    alive = _enqueue("031-333-3333")
+    for job_id in (uploading, sending, alive):
+        assert _claim([job_id]) == job_id
+    stale = time.time() - fax_queue.JOB_STALE_AFTER - 1
+    _set(uploading, heartbeat_at=stale)
+    _set(sending, status=STATUS_SENDING, heartbeat_at=stale)
+
+    assert _recover() == 2
+
+    # 업로드 중이던 작업은 다시 시도
+    assert get_job(uploading)['status'] == STATUS_RETRY
+    # 전송 요청 중이던 작업은 다시 보내지 않고 '확인 불가'로 추적
+    job = get_job(sending)
+    assert job['status'] == STATUS_FAILED
+    assert UNKNOWN_OUTCOME_MESSAGE in job['message']
+    status = get_status(f"job:{sending}")
+    assert status['state'] == STATE_UNKNOWN
+    assert status['job_id'] == sending
+    # 생존 표시가 갱신되는 작업은 그대로
+    assert get_job(alive)['status'] == STATUS_UPLOADING
+    assert _recover() == 0
+
+
+def test_heartbeat_keeps_own_jobs_alive(local_data):
+    job_id = _enqueue("031-111-1111")
+    assert _claim() == job_id
+    _set(job_id, heartbeat_at=time.time() - fax_queue.JOB_STALE_AFTER - 1)
+
+    conn = fax_queue._connect()
+    try:
+        fax_queue._heartbeat(conn)
+    finally:
+        conn.close()
+
+    assert _recover() == 0
+    assert get_job(job_id)['status'] == STATUS_UPLOADING
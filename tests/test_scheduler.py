@@ -0,0 +1,69 @@
+"""전송 시각 정하기: 같은 수신번호 간격, 예약 간격, 야간 예약"""
+from datetime import datetime, timezone
+
+from fax_scheduler import (
+    BAROBILL_TZ, RECEIVER_INTERVAL, RESERVE_MIN_LEAD, RESERVE_PER_MINUTE,
+    format_send_dt, is_off_peak, plan_dial
+)
+
+RECEIVER = "031-111-1111"
+OTHER = "031-222-2222"
+
+
+def _ts(hour, minute=0, second=0, day=2):
+    return datetime(2026, 3, day, hour, minute, second, tzinfo=BAROBILL_TZ).timestamp()
+
+
+def test_urgent_without_other_jobs_dials_now():
+    now = _ts(10)
+    assert plan_dial(RECEIVER, [], now=now) == (now, "")
+    # 다른 수신번호가 지금 걸고 있어도 바로 보냄
+    assert plan_dial(RECEIVER, [(OTHER, now)], now=now) == (now, "")
+
+
+def test_same_receiver_is_spaced():
+    now = _ts(10)
+    # 수신번호 표기가 달라도 같은 번호로 봄
+    dial, send_dt = plan_dial(RECEIVER, [("0311111111", now - 30)], now=now)
+    assert dial == now - 30 + RECEIVER_INTERVAL
+    assert send_dt == format_send_dt(dial) == "20260302100130"
+
+
+def test_spacing_keeps_minimum_lead():
+    now = _ts(10)
+    dial, _ = plan_dial(RECEIVER, [(RECEIVER, now - RECEIVER_INTERVAL + 10)], now=now)
+    assert dial == now + RESERVE_MIN_LEAD
+
+
+def test_reservations_do_not_overlap():
+    now = _ts(10)
+    gap = 60 / RESERVE_PER_MINUTE
+    spaced = now - 30 + RECEIVER_INTERVAL
+    dial, _ = plan_dial(RECEIVER, [(RECEIVER, now - 30), (OTHER, spaced)], now=now)
+    assert dial == spaced + gap
+
+
+def test_not_urgent_waits_for_off_peak():
+    dial, send_dt = plan_dial(RECEIVER, [], urgent=False, now=_ts(10))
+    assert dial == _ts(20)
+    assert send_dt == "20260302200000"
+
+    # 이미 야간이면 바로 보냄
+    now = _ts(23)
+    assert plan_dial(RECEIVER, [], urgent=False, now=now) == (now, "")
+
+
+def test_not_urgent_spacing_past_off_peak_moves_to_next_evening():
+    now = _ts(6, 59)
+    dial, send_dt = plan_dial(RECEIVER, [(RECEIVER, _ts(6, 58, 30))], urgent=False, now=now)
+    assert dial == _ts(20)
+    assert send_dt == "20260302200000"
+
+
+def test_off_peak_uses_barobill_time_zone():
+    # UTC 11시는 한국 시각 20시
+    ts = datetime(2026, 3, 2, 11, 0, tzinfo=timezone.utc).timestamp()
+    assert is_off_peak(ts)
+    assert format_send_dt(ts) == "20260302200000"
+    assert not is_off_peak(_ts(7))
+    assert is_off_peak(_ts(6, 59, 59))
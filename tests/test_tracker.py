@@ -0,0 +1,96 @@
+"""전달 결과 추적: 결과 코드 해석, 묶음 조회, 재전송 확인"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import fax_queue
+import fax_tracker
+from fax_queue import STATUS_DONE, STATUS_QUEUED, enqueue_send, get_job, requeue_job
+from fax_tracker import (
+    BAROBILL_BUSY_RESULTS, BAROBILL_PENDING_STATES, BAROBILL_SUCCESS_RESULTS, POLL_BASE_INTERVAL,
+    STATE_BUSY, STATE_DELIVERED, STATE_RESENT, STATE_SENDING, STATE_UNKNOWN, TRACK_MAX_AGE,
+    get_status, poll_once, resend, track_receipt, track_unknown
+)
+
+
+def _message(receipt="R1", state=3, result="", total=4, success=4):
+    return SimpleNamespace(SendKey=receipt, SendState=state, SendResult=result,
+                           TotalPageCount=total, SuccessPageCount=success)
+
+
+@pytest.mark.parametrize("message, expected", [
+    (_message(state=BAROBILL_PENDING_STATES[0]), STATE_SENDING),
+    (_message(state=BAROBILL_PENDING_STATES[-1], result=BAROBILL_SUCCESS_RESULTS[0]), STATE_SENDING),
+    (_message(result=BAROBILL_SUCCESS_RESULTS[0]), STATE_DELIVERED),
+    (_message(result=BAROBILL_BUSY_RESULTS[0], success=0), STATE_BUSY),
+    # 표에 없는 코드는 실패로 단정하지 않음 (전달됐을 수 있으므로 바로 다시 보내지 않게)
+    (_message(result="999"), STATE_UNKNOWN),
+    (_message(result=""), STATE_UNKNOWN),
+])
+def test_classify(message, expected):
+    assert fax_tracker._classify(message)[0] == expected
+
+
+def test_classify_pages():
+    assert fax_tracker._classify(_message(result=BAROBILL_BUSY_RESULTS[0], success=1)) == \
+        (STATE_BUSY, BAROBILL_BUSY_RESULTS[0], "1/4")
+    assert fax_tracker._classify(_message(state=0, total=None))[2] == ""
+
+
+def test_poll_once(local_data, monkeypatch):
+    job_id = enqueue_send(b"%PDF-1.4 test", "a.pdf", "031-111-1111", "031-987-7777")
+    conn = fax_queue._connect()
+    try:
+        fax_queue._update_job(conn, job_id, status=STATUS_DONE, receipt="R1")
+    finally:
+        conn.close()
+    track_receipt("R1", "a.pdf", "031-111-1111", "031-987-7777", job_id=job_id)
+    track_receipt("R2", "b.pdf", "031-222-2222", "031-987-7777")
+    track_receipt("R3", "c.pdf", "031-333-3333", "031-987-7777")
+    messages = {
+        "R1": _message("R1", result=BAROBILL_SUCCESS_RESULTS[0]),
+        "R2": _message("R2", result="999"),
+    }
+    requested = []
+
+    def fetch_states(receipts):
+        requested.append(list(receipts))
+        return messages
+
+    monkeypatch.setattr(fax_tracker, "fetch_states", fetch_states)
+
+    # 첫 조회 시각 전에는 조회하지 않음
+    assert poll_once() == 0
+    now = time.time() + POLL_BASE_INTERVAL + 1
+    assert poll_once(now=now) == 3
+    assert sorted(requested[0]) == ["R1", "R2", "R3"]
+
+    assert get_status("R1")['state'] == STATE_DELIVERED
+    assert get_status("R2")['state'] == STATE_UNKNOWN
+    assert get_status("R3")['state'] == STATE_SENDING
+    # 전달된 작업의 PDF는 비워서 다시 보낼 수 없음
+    assert requeue_job(job_id) is None
+
+    # 결과 없이 추적 시간이 지나면 '확인 불가'
+    assert poll_once(now=now + TRACK_MAX_AGE) == 1
+    assert get_status("R3")['state'] == STATE_UNKNOWN
+
+
+def test_resend_unknown_requires_confirmation(local_data):
+    job_id = enqueue_send(b"%PDF-1.4 test", "a.pdf", "031-111-1111", "031-987-7777")
+    key = track_unknown(job_id, "a.pdf", "031-111-1111", "031-987-7777")
+
+    ok, _ = resend(key)
+    assert not ok
+    assert get_status(key)['state'] == STATE_UNKNOWN
+
+    ok, _ = resend(key, confirmed=True)
+    assert ok
+    status = get_status(key)
+    assert status['state'] == STATE_RESENT
+    new_job_id = int(status['resent_as'].removeprefix("작업 #"))
+    assert new_job_id != job_id
+    assert get_job(new_job_id)['status'] == STATUS_QUEUED
+    # 다시 보낸 건은 또 보낼 수 없음
+    assert not resend(key, confirmed=True)[0]